@@ -1,107 +1,140 @@
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import render
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from foglalas.models import Appointment, Business, Service
-from datetime import time
+from foglalas.models import Business, Service
+from foglalas.booking import SlotAlreadyBooked, acreate_appointment, create_appointment
+from foglalas.availability import (
+    aavailable_times_range_response, aavailable_times_response, available_times_range_response,
+    available_times_response,
+)
+from foglalas.metrics import count_booking
+from foglalas.pages import cached_page
+from foglalas.events import aslot_events_response, slot_events_response
+from foglalas.registry import aget_business, aget_service, find_business, get_business, get_service
 import json
-from datetime import time, datetime
+from datetime import datetime
 
+@cached_page
 def index(request):
     """Barber shop homepage"""
     return render(request, 'barber/index.html')
 
+@cached_page
 def services(request):
     """Services and pricing page"""
     return render(request, 'barber/services.html')
 
+@cached_page
 def gallery(request):
     """Gallery of work examples"""
     return render(request, 'barber/gallery.html')
 
+@cached_page
 def contact(request):
     """Contact and location information"""
     return render(request, 'barber/contact.html')
 
+@cached_page
 def about(request):
     """About the barber shop"""
     return render(request, 'barber/about.html')
 
 def book(request):
     """Booking form for barber shop"""
-    business = Business.objects.filter(slug='barber').first()
+    business = find_business('barber')
     return render(request, 'barber/book.html', {
         'business': business
     })
 
 # 📅 Időpont foglalása - Barber specific
+def _booking_fields(data):
+    """create_appointment fields of a request body, besides business and duration - ValueError on a bad date or time"""
+    return {
+        'service_type': 'barber',  # Force barber type
+        'date': datetime.strptime(data['date'], '%Y-%m-%d').date(),
+        'time': datetime.strptime(data['time'], '%H:%M').time(),
+        'name': data['name'],
+        'phone': data['phone'],
+        'email': data['email'],
+    }
+
+def _booking_failure(error, business):
+    """Error response (and count) for what a booking request raised - shared by the sync and async view"""
+    if isinstance(error, Business.DoesNotExist):
+        count_booking('validation_error', None, 'barber')
+        return JsonResponse({'status': 'error', 'message': 'Nincs ilyen vállalkozás'}, status=400)
+    if isinstance(error, Service.DoesNotExist):
+        count_booking('validation_error', business, 'barber')
+        return JsonResponse({'status': 'error', 'message': 'Ismeretlen szolgáltatás'}, status=400)
+    if isinstance(error, SlotAlreadyBooked):
+        count_booking('conflict', business, 'barber')
+        return JsonResponse({'status': 'error', 'message': 'Ez az időpont már foglalt'}, status=400)
+    if isinstance(error, ValueError):
+        count_booking('validation_error', business, 'barber')
+        return JsonResponse({'status': 'error', 'message': 'Érvénytelen dátum vagy idő formátum'}, status=400)
+    count_booking('server_error', business, 'barber')
+    return JsonResponse({'status': 'error', 'message': str(error)}, status=500)
+
+def _booking_created(business):
+    count_booking('success', business, 'barber')
+    return JsonResponse({'status': 'success'})
+
+def _not_allowed():
+    return JsonResponse({'status': 'error', 'message': 'Csak POST kérés engedélyezett'}, status=405)
+
 @csrf_exempt
 def book_appointment(request):
-    if request.method == 'POST':
-        try:
-            data = json.loads(request.body)
-            slug = data.get('business')
-
-            # 🔍 Lekérjük a Business példányt slug alapján
-            business = Business.objects.get(slug=slug)
-
-            # 📝 Létrehozzuk a foglalást barber service típussal
-            Appointment.objects.create(
-                business=business,
-                service_type='barber',  # Force barber type
-                name=data['name'],
-                phone=data['phone'],
-                email=data['email'],
-                date=data['date'],
-                time=data['time']
-            )
-            return JsonResponse({'status': 'success'})
-        except Business.DoesNotExist:
-            return JsonResponse({'status': 'error', 'message': 'Nincs ilyen vállalkozás'}, status=400)
-        except Exception as e:
-            return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
-
-    return JsonResponse({'status': 'error', 'message': 'Csak POST kérés engedélyezett'}, status=400)
+    if request.method != 'POST':
+        return _not_allowed()
+    business = None
+    try:
+        data = json.loads(request.body)
+        # 🔍 Lekérjük a Business példányt slug alapján
+        business = get_business(data.get('business'))
+        fields = _booking_fields(data)
+        duration = get_service(business, data['service']).duration if data.get('service') else None
+        # 📝 Létrehozzuk a foglalást barber service típussal
+        create_appointment(business=business, duration=duration, **fields)
+    except Exception as e:
+        return _booking_failure(e, business)
+    return _booking_created(business)
+
+@csrf_exempt
+async def abook_appointment(request):
+    """book_appointment for ASGI - only the INSERT transaction leaves the event loop"""
+    if request.method != 'POST':
+        return _not_allowed()
+    business = None
+    try:
+        data = json.loads(request.body)
+        business = await aget_business(data.get('business'))
+        fields = _booking_fields(data)
+        duration = (await aget_service(business, data['service'])).duration if data.get('service') else None
+        await acreate_appointment(business=business, duration=duration, **fields)
+    except Exception as e:
+        return _booking_failure(e, business)
+    return _booking_created(business)
 
 def get_available_times(request):
     """API endpoint to get available appointment times - Simple 9-18 half-hour slots for barber"""
-    slug = request.GET.get('business')
-    date_str = request.GET.get('date')
+    return available_times_response(request, 9, 18, service_type='barber')
 
-    if not slug or not date_str:
-        return JsonResponse({'error': 'Missing parameters'}, status=400)
+async def aget_available_times(request):
+    """get_available_times for ASGI"""
+    return await aavailable_times_response(request, 9, 18, service_type='barber')
 
-    try:
-        business = Business.objects.get(slug=slug)
-        target_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-    except (Business.DoesNotExist, ValueError):
-        return JsonResponse({'error': 'Invalid parameters'}, status=400)
-
-    # Generate time slots from 9-18 (9:00 to 18:00) with business time interval (30 min for barber)
-    start_hour = 9
-    end_hour = 18
-    interval_minutes = business.time_interval
-    
-    all_times = []
-    current_hour = start_hour
-    current_minute = 0
-    
-    while current_hour < end_hour or (current_hour == end_hour and current_minute == 0):
-        all_times.append(time(hour=current_hour, minute=current_minute))
-        
-        # Add interval
-        current_minute += interval_minutes
-        if current_minute >= 60:
-            current_hour += 1
-            current_minute = 0
-
-    # Get booked times for this business and date - only barber appointments
-    booked_times = set(
-        Appointment.objects
-        .filter(business=business, date=target_date, service_type='barber')
-        .values_list('time', flat=True)
-    )
-
-    # Filter out booked times
-    available = [t.strftime('%H:%M') for t in all_times if t not in booked_times]
-    
-    return JsonResponse({'times': available})
+def get_available_times_range(request):
+    """API endpoint to get available times for every day of a date range - only barber appointments"""
+    return available_times_range_response(request, 9, 18, service_type='barber')
+
+async def aget_available_times_range(request):
+    """get_available_times_range for ASGI"""
+    return await aavailable_times_range_response(request, 9, 18, service_type='barber')
+
+def slot_events(request):
+    """Server-Sent Events of the barber slots taken and freed on ?business=&date="""
+    return slot_events_response(request, service_type='barber')
+
+async def aslot_events(request):
+    """slot_events for ASGI"""
+    return await aslot_events_response(request, service_type='barber')
@@ -1,6 +1,8 @@
 from django.contrib import admin
-from .models import Business, Service, Appointment
+from .models import ArchivedAppointment, Business, Resource, Service, Appointment
 
 admin.site.register(Business)
 admin.site.register(Service)
+admin.site.register(Resource)
 admin.site.register(Appointment)
+admin.site.register(ArchivedAppointment)
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class FoglalasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'foglalas'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from . import checks, signals  # noqa: F401
+        from .middleware import install_query_counter
+        from .sqlite import apply_sqlite_pragmas
+        connection_created.connect(install_query_counter)
+        connection_created.connect(apply_sqlite_pragmas)
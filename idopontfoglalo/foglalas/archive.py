@@ -0,0 +1,79 @@
+"""Archival of past appointments, and reads over the live and archived ones together.
+
+Availability only reads today and later, so appointments of past days are
+moved to ArchivedAppointment (keeping their ids) and the Appointment table
+and its indexes stay the size of the upcoming bookings. Exports and
+reports read both through appointment_history().
+"""
+from django.db import connection, transaction
+from .availability import invalidate_availability
+from .models import Appointment, ArchivedAppointment
+from .occupancy import rebuild_occupancy
+
+ARCHIVE_FIELDS = [
+    'id', 'business_id', 'service_type', 'name', 'phone', 'email', 'date', 'time', 'duration', 'resource_id', 'created_at',
+]
+
+
+def delete_appointments(field, values):
+    """DELETE the appointments whose field is one of values in one statement - no signals are sent.
+
+    For bulk removals where the post_delete receiver's per-row rebuild and
+    slot-freed events are unwanted; the caller rebuilds the occupancy of
+    the days (or deletes their rows) itself. Returns the number deleted.
+    """
+    if not values:
+        return 0
+    table = connection.ops.quote_name(Appointment._meta.db_table)
+    column = connection.ops.quote_name(Appointment._meta.get_field(field).column)
+    placeholders = ', '.join(['%s'] * len(values))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {column} IN ({placeholders})', list(values))
+        return cursor.rowcount
+
+
+def archive_batch(before, batch_size=1000):
+    """Move up to batch_size appointments dated before `before` (lowest ids first) into the archive.
+
+    One transaction per batch, so an interrupted run loses nothing and the
+    next one carries on. Returns the number moved - 0 when nothing is left.
+    """
+    with transaction.atomic():
+        rows = list(
+            Appointment.objects.filter(date__lt=before).order_by('pk').values(*ARCHIVE_FIELDS)[:batch_size]
+        )
+        if not rows:
+            return 0
+        ArchivedAppointment.objects.bulk_create(
+            [ArchivedAppointment(**row) for row in rows], ignore_conflicts=True,
+        )
+        # Without the post_delete receiver: it would rebuild every day once per
+        # row and announce the slots of the past as freed
+        delete_appointments('id', [row['id'] for row in rows])
+        keys = {(row['business_id'], row['date'], row['service_type']) for row in rows}
+        rebuild_occupancy(keys)
+    for key in keys:
+        invalidate_availability(*key)
+    return len(rows)
+
+
+def _filter(queryset, business, date_from, date_to, service_type):
+    if business:
+        queryset = queryset.filter(business__slug=business)
+    if date_from:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(date__lte=date_to)
+    if service_type:
+        queryset = queryset.filter(service_type=service_type)
+    return queryset
+
+
+def appointment_history(fields, business=None, date_from=None, date_to=None, service_type=None):
+    """values_list(*fields) rows of live and archived appointments in one query (UNION ALL), by id.
+
+    fields are lookups both models share ('business__slug', 'date', ...) and must include 'id'.
+    """
+    live = _filter(Appointment.objects.all(), business, date_from, date_to, service_type)
+    archived = _filter(ArchivedAppointment.objects.all(), business, date_from, date_to, service_type)
+    return live.values_list(*fields).union(archived.values_list(*fields), all=True).order_by('id')
@@ -0,0 +1,479 @@
+import hashlib
+import logging
+import threading
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import Count
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from .models import Appointment, Business, DayOccupancy, Service
+from .occupancy import capacity_mask, mask_bookings
+from .registry import aget_business, aget_capacity, aget_service, get_business, get_capacity, get_service
+from .slots import get_slot_grid, minutes_label
+
+logger = logging.getLogger(__name__)
+
+# Longest window the range endpoint answers (the booking page allows 90 days ahead)
+MAX_RANGE_DAYS = 92
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def _cache():
+    return caches[getattr(settings, 'AVAILABILITY_CACHE_ALIAS', 'default')]
+
+
+def availability_cache_key(business_id, day, service_type=None):
+    return f"availability:{business_id}:{day}:{service_type or '*'}"
+
+
+def availability_cache_stats():
+    """Hit/miss counters of the availability cache since process start"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _count(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+async def _acache_get(cache, key):
+    # LocMemCache never blocks - skip the worker thread hop of its aget()
+    if isinstance(cache, LocMemCache):
+        return cache.get(key)
+    return await cache.aget(key)
+
+
+async def _acache_set(cache, key, value, timeout):
+    if isinstance(cache, LocMemCache):
+        cache.set(key, value, timeout)
+    else:
+        await cache.aset(key, value, timeout)
+
+
+class DayAvailability:
+    """The booked intervals of one day as sorted, merged [start, end) minute ranges.
+
+    Built once per (business, date, service_type); every candidate start is
+    then checked with a bisect instead of a scan over the day's bookings.
+    """
+    __slots__ = ('starts', 'ends')
+
+    def __init__(self, bookings=()):
+        starts, ends = [], []
+        for start, length in sorted(bookings):
+            end = start + length
+            if ends and start < ends[-1]:
+                # Overlaps the previous interval - extend it instead
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        self.starts = starts
+        self.ends = ends
+
+    def is_free(self, start, length):
+        """Whether [start, start + length) touches no booked interval"""
+        i = bisect_right(self.starts, start)
+        if i and self.ends[i - 1] > start:
+            return False
+        return i == len(self.starts) or self.starts[i] >= start + length
+
+    def free_starts(self, grid, length, latest_end=None):
+        """Start labels of the grid slots where `length` minutes fit (ending by latest_end if given)"""
+        return [
+            label for minutes, label in zip(grid.minutes, grid.labels)
+            if (latest_end is None or minutes + length <= latest_end) and self.is_free(minutes, length)
+        ]
+
+    def version(self):
+        """Hashable summary of the booked intervals - equal for days with the same bookings"""
+        return tuple(self.starts), tuple(self.ends)
+
+    def free_slots(self, grid, length, latest_end=None):
+        """{'start', 'end'} dicts of the grid slots where `length` minutes fit"""
+        return [
+            {"start": label, "end": minutes_label(minutes + length)}
+            for minutes, label in zip(grid.minutes, grid.labels)
+            if (latest_end is None or minutes + length <= latest_end) and self.is_free(minutes, length)
+        ]
+
+
+def _bookings(rows, default_length):
+    """(start minute, length) pairs from (time, duration) rows - no duration means one slot"""
+    return tuple(sorted(
+        (slot.hour * 60 + slot.minute, duration or default_length)
+        for slot, duration in rows
+    ))
+
+
+def _occupancy_rows(business, start, end, service_type=None):
+    rows = DayOccupancy.objects.filter(business=business, date__range=(start, end))
+    if service_type:
+        rows = rows.filter(service_type=service_type)
+    return rows.values_list('date', 'interval', 'mask')
+
+
+def _appointment_rows(business, start, end, service_type=None):
+    # Bookings counted per slot in the GROUP BY - a business with resources takes several
+    appointments = Appointment.objects.filter(business=business, date__range=(start, end))
+    if service_type:
+        appointments = appointments.filter(service_type=service_type)
+    return appointments.values_list('date', 'service_type', 'time', 'duration').annotate(n=Count('pk')).order_by()
+
+
+def _masks(rows, interval):
+    """{date: mask} of DayOccupancy rows, service types OR-ed together.
+
+    None if a row was built with another time_interval than the business
+    has now (the caller then reads the appointments instead).
+    """
+    masks = defaultdict(int)
+    for day, row_interval, mask in rows:
+        if row_interval != interval:
+            return None
+        masks[day] |= mask
+    return masks
+
+
+def _bookings_by_day(rows, interval, capacity=1):
+    """{date: (start minute, length) pairs} of the full slots in grouped appointment rows"""
+    if capacity <= 1:
+        by_day = defaultdict(list)
+        for day, _, slot, duration, _ in rows:
+            by_day[day].append((slot, duration))
+        return {day: _bookings(day_rows, interval) for day, day_rows in by_day.items()}
+    # Service types are counted apart, like on their DayOccupancy rows
+    by_key = defaultdict(list)
+    for day, service_type, slot, duration, count in rows:
+        by_key[day, service_type].append((slot, duration, count))
+    masks = defaultdict(int)
+    for (day, _), bookings in by_key.items():
+        masks[day] |= capacity_mask(bookings, interval, capacity)
+    return {day: mask_bookings(mask, interval) for day, mask in masks.items()}
+
+
+def _day_bookings(business, day, service_type=None):
+    """Sorted (start minute, length) pairs booked for the business on a day, cached.
+
+    Read from the day's DayOccupancy row(s) - one indexed lookup - and only
+    from the appointments while the rows are being rebuilt for a new interval.
+
+    Cached per (business, date, service_type) - the entry is dropped by the
+    Appointment signals in foglalas.signals whenever a booking for that key
+    changes, so the timeout only bounds how long a lost race can linger.
+    """
+    cache = _cache()
+    key = availability_cache_key(business.pk, day, service_type)
+    bookings = cache.get(key)
+    if bookings is not None:
+        _count('hits')
+        return bookings
+
+    _count('misses')
+    masks = _masks(_occupancy_rows(business, day, day, service_type), business.time_interval)
+    if masks is not None:
+        bookings = mask_bookings(masks.get(day, 0), business.time_interval)
+    else:
+        by_day = _bookings_by_day(
+            _appointment_rows(business, day, day, service_type), business.time_interval, get_capacity(business),
+        )
+        bookings = by_day.get(day, ())
+    cache.set(key, bookings, getattr(settings, 'AVAILABILITY_CACHE_TIMEOUT', 300))
+    return bookings
+
+
+async def _aday_bookings(business, day, service_type=None):
+    """_day_bookings for async views - a cache hit never leaves the event loop"""
+    cache = _cache()
+    key = availability_cache_key(business.pk, day, service_type)
+    bookings = await _acache_get(cache, key)
+    if bookings is not None:
+        _count('hits')
+        return bookings
+
+    _count('misses')
+    rows = [row async for row in _occupancy_rows(business, day, day, service_type)]
+    masks = _masks(rows, business.time_interval)
+    if masks is not None:
+        bookings = mask_bookings(masks.get(day, 0), business.time_interval)
+    else:
+        rows = [row async for row in _appointment_rows(business, day, day, service_type)]
+        capacity = await aget_capacity(business)
+        bookings = _bookings_by_day(rows, business.time_interval, capacity).get(day, ())
+    await _acache_set(cache, key, bookings, getattr(settings, 'AVAILABILITY_CACHE_TIMEOUT', 300))
+    return bookings
+
+
+def get_day_availability(business, day, service_type=None):
+    """DayAvailability of a business on a day (optionally one service_type only)"""
+    return DayAvailability(_day_bookings(business, day, service_type))
+
+
+async def aget_day_availability(business, day, service_type=None):
+    """get_day_availability for async views"""
+    return DayAvailability(await _aday_bookings(business, day, service_type))
+
+
+def service_length(business, service_id):
+    """Minutes a booking of the given service takes, or one slot without a service.
+
+    Raises Service.DoesNotExist for ids that aren't services of the business.
+    """
+    if not service_id:
+        return business.time_interval
+    return get_service(business, service_id).duration
+
+
+async def aservice_length(business, service_id):
+    """service_length for async views"""
+    if not service_id:
+        return business.time_interval
+    return (await aget_service(business, service_id)).duration
+
+
+def invalidate_availability(business_id, day, service_type):
+    """Drop the cached availability of the given slot's day, for its service_type and for all types"""
+    keys = [
+        availability_cache_key(business_id, day, service_type),
+        availability_cache_key(business_id, day),
+    ]
+    cache = _cache()
+    cache.delete_many(keys)
+    # Again after commit, in case a reader re-cached the pre-commit state meanwhile
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _availability_by_day(business, masks, appointment_rows=(), capacity=1):
+    """DayAvailability per day from the occupancy masks, or from appointment rows if there are none"""
+    if masks is not None:
+        return {day: DayAvailability(mask_bookings(mask, business.time_interval)) for day, mask in masks.items()}
+    return {
+        day: DayAvailability(bookings)
+        for day, bookings in _bookings_by_day(appointment_rows, business.time_interval, capacity).items()
+    }
+
+
+def availability_by_day(business, start, end, service_type=None):
+    """DayAvailability of every day between start and end (inclusive) with one query"""
+    masks = _masks(_occupancy_rows(business, start, end, service_type), business.time_interval)
+    if masks is not None:
+        return _availability_by_day(business, masks)
+    rows = _appointment_rows(business, start, end, service_type)
+    return _availability_by_day(business, None, rows, get_capacity(business))
+
+
+async def aavailability_by_day(business, start, end, service_type=None):
+    """availability_by_day for async views"""
+    masks = _masks([row async for row in _occupancy_rows(business, start, end, service_type)], business.time_interval)
+    if masks is not None:
+        return _availability_by_day(business, masks)
+    rows = [row async for row in _appointment_rows(business, start, end, service_type)]
+    return _availability_by_day(business, None, rows, await aget_capacity(business))
+
+
+def availability_etag(business, day, *params):
+    """Strong ETag of an availability answer: the day's booked intervals plus whatever shapes the response.
+
+    Any booking change alters the intervals, so a matching tag means an
+    identical body - no separate change counter has to be kept in step.
+    """
+    key = repr((business.pk, business.time_interval, day.version(), params)).encode()
+    return f'"{hashlib.blake2b(key, digest_size=12).hexdigest()}"'
+
+
+def conditional_response(request, etag, build):
+    """304 if the client's If-None-Match has etag, otherwise build() - the slot list and JSON are skipped on a hit"""
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = build()
+    response.headers['ETag'] = etag
+    # Stored, but revalidated on every use
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _times_error(error, message, status=400):
+    return JsonResponse({'times': [], 'error': error, 'message': message}, status=status)
+
+
+def _times_params(request):
+    """(slug, date, service id) of a ?business=&date=[&service=] request, or the error response"""
+    logger.info("get_available_times called with params: %s", request.GET)
+
+    slug = request.GET.get('business')
+    date_str = request.GET.get('date')
+
+    if not slug or not date_str:
+        logger.warning("Missing parameters - business: %s, date: %s", slug, date_str)
+        return _times_error('missing-params', 'Hiányozó paraméterek')
+
+    try:
+        target_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError as e:
+        logger.warning("Invalid date format: %s, error: %s", date_str, e)
+        return _times_error('bad-date', 'Érvénytelen dátum formátum')
+    if target_date < datetime.now().date():
+        logger.warning("Past date requested: %s", date_str)
+        return _times_error('past-date', 'Múltbeli dátumra nem lehet időpontot foglalni')
+
+    return slug, target_date, request.GET.get('service')
+
+
+def _times_result(business, day, target_date, length, service_id, start_hour, end_hour):
+    grid = get_slot_grid(business.time_interval, start_hour, end_hour)
+    available = day.free_starts(grid, length, latest_end=end_hour * 60 if service_id else None)
+
+    logger.info("Returning %s available times for %s", len(available), target_date)
+    return JsonResponse({
+        'times': available,
+        'message': f'{len(available)} szabad időpont található'
+    })
+
+
+def available_times_response(request, start_hour, end_hour, service_type=None):
+    """Free start times for ?business=&date=[&service=], shared by the get_available_times views.
+
+    Without a service every free slot is listed, as before. With one, only
+    the starts where the whole service fits before closing time are.
+    """
+    params = _times_params(request)
+    if isinstance(params, JsonResponse):
+        return params
+    slug, target_date, service_id = params
+
+    try:
+        business = get_business(slug)
+        length = service_length(business, service_id)
+    except Business.DoesNotExist:
+        logger.warning("Business not found with slug: %s", slug)
+        return _times_error('unknown-business', 'Ismeretlen vállalkozás', status=404)
+    except Service.DoesNotExist:
+        logger.warning("Unknown service %s for business %s", service_id, slug)
+        return _times_error('unknown-service', 'Ismeretlen szolgáltatás')
+
+    day = get_day_availability(business, target_date, service_type)
+    return conditional_response(
+        request, availability_etag(business, day, 'times', start_hour, end_hour, length, bool(service_id)),
+        lambda: _times_result(business, day, target_date, length, service_id, start_hour, end_hour),
+    )
+
+
+async def aavailable_times_response(request, start_hour, end_hour, service_type=None):
+    """available_times_response for async views (ASGI)"""
+    params = _times_params(request)
+    if isinstance(params, JsonResponse):
+        return params
+    slug, target_date, service_id = params
+
+    try:
+        business = await aget_business(slug)
+        length = await aservice_length(business, service_id)
+    except Business.DoesNotExist:
+        logger.warning("Business not found with slug: %s", slug)
+        return _times_error('unknown-business', 'Ismeretlen vállalkozás', status=404)
+    except Service.DoesNotExist:
+        logger.warning("Unknown service %s for business %s", service_id, slug)
+        return _times_error('unknown-service', 'Ismeretlen szolgáltatás')
+
+    day = await aget_day_availability(business, target_date, service_type)
+    return conditional_response(
+        request, availability_etag(business, day, 'times', start_hour, end_hour, length, bool(service_id)),
+        lambda: _times_result(business, day, target_date, length, service_id, start_hour, end_hour),
+    )
+
+
+def _range_error(error, message, status=400):
+    return JsonResponse({'days': {}, 'full_days': [], 'error': error, 'message': message}, status=status)
+
+
+def _range_params(request):
+    """(slug, first day, last day, service id) of a ?business=&from=&to=[&service=] request, or the response"""
+    slug = request.GET.get('business')
+    from_str = request.GET.get('from')
+    to_str = request.GET.get('to')
+
+    if not slug or not from_str or not to_str:
+        return _range_error('missing-params', 'Hiányozó paraméterek')
+
+    try:
+        start = datetime.strptime(from_str, '%Y-%m-%d').date()
+        end = datetime.strptime(to_str, '%Y-%m-%d').date()
+    except ValueError:
+        return _range_error('bad-date', 'Érvénytelen dátum formátum')
+
+    # Past days can't be booked anyway
+    start = max(start, datetime.now().date())
+    if end < start:
+        return JsonResponse({'days': {}, 'full_days': []})
+    if (end - start).days >= MAX_RANGE_DAYS:
+        return _range_error('range-too-long', f'Legfeljebb {MAX_RANGE_DAYS} nap kérhető le egyszerre')
+
+    return slug, start, end, request.GET.get('service')
+
+
+def _range_result(business, availability, start, end, length, service_id, start_hour, end_hour):
+    grid = get_slot_grid(business.time_interval, start_hour, end_hour)
+    latest_end = end_hour * 60 if service_id else None
+    empty = DayAvailability()
+
+    days = {}
+    full_days = []
+    day = start
+    while day <= end:
+        free = availability.get(day, empty).free_starts(grid, length, latest_end)
+        days[day.isoformat()] = free
+        if not free:
+            full_days.append(day.isoformat())
+        day += timedelta(days=1)
+
+    return JsonResponse({'days': days, 'full_days': full_days})
+
+
+def available_times_range_response(request, start_hour, end_hour, service_type=None):
+    """Free times for each day of ?business=&from=&to=[&service=], plus the fully booked days.
+
+    Shared by the foglalas, barber and massage range endpoints so the date
+    picker can load a whole month at once instead of one request per click.
+    """
+    params = _range_params(request)
+    if isinstance(params, JsonResponse):
+        return params
+    slug, start, end, service_id = params
+
+    try:
+        business = get_business(slug)
+        length = service_length(business, service_id)
+    except Business.DoesNotExist:
+        return _range_error('unknown-business', 'Ismeretlen vállalkozás', status=404)
+    except Service.DoesNotExist:
+        return _range_error('unknown-service', 'Ismeretlen szolgáltatás')
+
+    availability = availability_by_day(business, start, end, service_type)
+    return _range_result(business, availability, start, end, length, service_id, start_hour, end_hour)
+
+
+async def aavailable_times_range_response(request, start_hour, end_hour, service_type=None):
+    """available_times_range_response for async views (ASGI)"""
+    params = _range_params(request)
+    if isinstance(params, JsonResponse):
+        return params
+    slug, start, end, service_id = params
+
+    try:
+        business = await aget_business(slug)
+        length = await aservice_length(business, service_id)
+    except Business.DoesNotExist:
+        return _range_error('unknown-business', 'Ismeretlen vállalkozás', status=404)
+    except Service.DoesNotExist:
+        return _range_error('unknown-service', 'Ismeretlen szolgáltatás')
+
+    availability = await aavailability_by_day(business, start, end, service_type)
+    return _range_result(business, availability, start, end, length, service_id, start_hour, end_hour)
@@ -0,0 +1,172 @@
+"""Shared pieces of the benchmark commands: seeding, latency summaries, baseline checks."""
+import random
+import time as time_module
+from datetime import date, time, timedelta
+from django.db import connections, transaction
+from django.db.utils import load_backend
+from django.db.backends.signals import connection_created
+from .archive import delete_appointments
+from .models import Appointment, Business, DayOccupancy
+from .occupancy import rebuild_occupancy
+
+# Seeded businesses are recognised (and removed) by this slug prefix
+BENCHMARK_SLUG_PREFIX = 'benchmark-'
+# App URL prefix -> the service type its booking view stores
+APP_SERVICE_TYPES = {
+    'foglalas': 'personal',
+    'barber': 'barber',
+    'massage': 'massage',
+}
+OPENING_HOURS = (9, 17)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def summarize(outcomes, elapsed):
+    """Throughput and latency of (latency seconds, status) pairs that took elapsed seconds in total"""
+    latencies = sorted(latency for latency, _ in outcomes)
+    statuses = {}
+    for _, status in outcomes:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(outcomes),
+        'rps': len(outcomes) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        # Booking conflicts answer 400, that's expected work
+        'errors': sum(n for status, n in statuses.items() if int(status) >= 500),
+        'statuses': statuses,
+    }
+
+
+def regressions(results, baseline, threshold):
+    """Messages for every run whose rps fell or p95 rose by more than threshold (0.2 = 20%) against baseline.
+
+    Both are {driver: {name: summary}}; runs missing from either side are skipped.
+    """
+    messages = []
+    for driver, runs in results.items():
+        for name, summary in runs.items():
+            base = baseline.get(driver, {}).get(name)
+            if not base:
+                continue
+            if base['rps'] and summary['rps'] < base['rps'] * (1 - threshold):
+                messages.append(f"{driver} {name}: {summary['rps']:.0f} req/s, baseline {base['rps']:.0f}")
+            if base['p95_ms'] and summary['p95_ms'] > base['p95_ms'] * (1 + threshold):
+                messages.append(f"{driver} {name}: p95 {summary['p95_ms']:.2f} ms, baseline {base['p95_ms']:.2f}")
+            if summary['errors'] > base.get('errors', 0):
+                messages.append(f"{driver} {name}: {summary['errors']} errors, baseline {base.get('errors', 0)}")
+    return messages
+
+
+def seed_benchmark_data(businesses, days, per_day, seed=0):
+    """Create `businesses` businesses with per_day appointments on each of the next `days` days.
+
+    Deterministic for a seed. Earlier benchmark data is removed first.
+    Returns the businesses.
+    """
+    remove_benchmark_data()
+    rng = random.Random(seed)
+    first_day = date.today() + timedelta(days=1)
+    created = []
+    with transaction.atomic():
+        for number in range(1, businesses + 1):
+            business = Business.objects.create(
+                name=f'Benchmark Üzlet {number}',
+                slug=f'{BENCHMARK_SLUG_PREFIX}{number}',
+                address='1000 Budapest, Teszt utca 1.',
+                phone='+36 1 000 0000',
+                email='benchmark@example.com',
+                time_interval=30 if number % 2 else 60,
+            )
+            created.append(business)
+            start, end = (hour * 60 for hour in OPENING_HOURS)
+            starts = list(range(start, end, business.time_interval))
+            appointments = []
+            for offset in range(days):
+                day = first_day + timedelta(days=offset)
+                # Distinct slots per service type, so the unique constraint holds
+                for service_type in APP_SERVICE_TYPES.values():
+                    for minutes in rng.sample(starts, min(per_day, len(starts))):
+                        appointments.append(Appointment(
+                            business=business, service_type=service_type, name='Benchmark Foglalás',
+                            phone='+36 30 000 0000', email='benchmark@example.com', date=day,
+                            time=time(minutes // 60, minutes % 60),
+                        ))
+            # bulk_create skips the signals, the occupancy is rebuilt per business instead
+            Appointment.objects.bulk_create(appointments, batch_size=1000)
+            rebuild_occupancy(business_id=business.pk)
+    return created
+
+
+def remove_benchmark_data():
+    """Delete the seeded businesses with their appointments - returns the number of businesses"""
+    businesses = Business.objects.filter(slug__startswith=BENCHMARK_SLUG_PREFIX)
+    ids = list(businesses.values_list('pk', flat=True))
+    if ids:
+        with transaction.atomic():
+            # In bulk: the cascade would send post_delete, and rebuild a day, per appointment
+            delete_appointments('business', ids)
+            DayOccupancy.objects.filter(business_id__in=ids).delete()
+            businesses.delete()
+    return len(ids)
+
+
+# How a request gets its database connection
+CONNECTION_MODES = ('fresh', 'persistent', 'pooled')
+
+
+def connection_mode_settings(database, mode):
+    """Copy of a DATABASES entry set up for one connection mode ('pooled' is PostgreSQL only)"""
+    options = {key: value for key, value in database.get('OPTIONS', {}).items() if key != 'pool'}
+    settings_dict = {**database, 'OPTIONS': options}
+    if mode == 'fresh':
+        settings_dict.update(CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False)
+    elif mode == 'persistent':
+        settings_dict.update(CONN_MAX_AGE=None, CONN_HEALTH_CHECKS=True)
+    else:
+        settings_dict['CONN_MAX_AGE'] = 0
+        options['pool'] = database.get('OPTIONS', {}).get('pool') or True
+    return settings_dict
+
+
+def benchmark_connections(database, mode, requests):
+    """Run `requests` request cycles (open or reuse a connection, SELECT 1, request_finished) in one mode.
+
+    database is a DATABASES entry; it gets a connection wrapper of its own.
+    Returns (summary, number of connections opened).
+    """
+    # configure_settings() fills in the defaults (and insists on a 'default' key)
+    settings_dict = connections.configure_settings({'default': connection_mode_settings(database, mode)})['default']
+    wrapper = load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, f'benchmark_{mode}')
+    opened = []
+
+    def count(sender, connection, **kwargs):
+        if connection is wrapper:
+            opened.append(connection)
+
+    connection_created.connect(count)
+    outcomes = []
+    try:
+        started = time_module.perf_counter()
+        for _ in range(requests):
+            request_started = time_module.perf_counter()
+            # What close_old_connections does on request_started / request_finished
+            wrapper.close_if_unusable_or_obsolete()
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+            wrapper.close_if_unusable_or_obsolete()
+            outcomes.append((time_module.perf_counter() - request_started, 200))
+        elapsed = time_module.perf_counter() - started
+    finally:
+        connection_created.disconnect(count)
+        wrapper.close()
+        if mode == 'pooled':
+            wrapper.close_pool()
+    return summarize(outcomes, elapsed), len(opened)
@@ -0,0 +1,347 @@
+from collections import defaultdict
+from datetime import datetime
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+from .availability import invalidate_availability
+from .events import SLOT_TAKEN, publish_slot_change
+from .models import Appointment, Business, DayOccupancy, Service
+from .occupancy import appointment_mask, capacity_mask, occupy, rebuild_changes, record
+from .registry import get_business, get_resources, get_service
+
+# Largest batch book_appointments_batch accepts in one request
+MAX_BATCH_SIZE = 200
+
+REQUIRED_FIELDS = ['business', 'name', 'phone', 'email', 'date', 'time']
+SERVICE_TYPES = {choice for choice, _ in Appointment.SERVICE_TYPE_CHOICES}
+
+
+class SlotAlreadyBooked(Exception):
+    """The requested (business, date, time, service_type) slot is already taken"""
+
+
+def create_appointment(business, service_type, name, phone, email, date, time, duration=None):
+    """Book a slot, shared by the foglalas, barber and massage apps.
+
+    The slots the booking covers are claimed on the day's DayOccupancy row
+    with one conditional UPDATE, then the appointment is inserted in the same
+    transaction - concurrent requests for overlapping slots cannot both
+    succeed, and the ``unique_appointment_slot`` constraint stays the last
+    line of defence. At a business with resources a free one is assigned
+    instead (see _claim_resource). Raises SlotAlreadyBooked on a conflict.
+    duration (minutes) defaults to one business.time_interval slot.
+    """
+    appointment = Appointment(
+        business=business,
+        service_type=service_type,
+        name=name,
+        phone=phone,
+        email=email,
+        date=date,
+        time=time,
+        duration=duration,
+    )
+    resources = get_resources(business)
+    try:
+        with transaction.atomic():
+            if resources:
+                appointment.resource, appointment._filled_slots = _claim_resource(
+                    business, date, service_type, time, duration, resources,
+                )
+                claimed = appointment.resource is not None
+            else:
+                claimed = occupy(business, date, service_type, appointment_mask(time, duration, business.time_interval))
+            if not claimed:
+                raise SlotAlreadyBooked(f"{business.slug} {date} {time} ({service_type})")
+            # Tells the post_save signal the occupancy is already recorded
+            appointment._occupancy_recorded = True
+            appointment.save(force_insert=True)
+            return appointment
+    except IntegrityError as e:
+        raise SlotAlreadyBooked(f"{business.slug} {date} {time} ({service_type})") from e
+
+
+def _pick_resource(resources, rows, interval, slot, duration):
+    """First of resources free for the whole booking, given the day's (resource_id, time, duration, count) rows.
+
+    None if the booking doesn't fit: a slot it covers is full, or no one
+    resource is free for all of it.
+    """
+    bits = appointment_mask(slot, duration, interval)
+    bookings = [(start, length, count) for _, start, length, count in rows]
+    if capacity_mask(bookings, interval, len(resources)) & bits:
+        return None
+    taken = defaultdict(int)
+    for resource_id, start, length, _ in rows:
+        taken[resource_id] |= appointment_mask(start, length, interval)
+    return next((resource for resource in resources if not taken[resource.pk] & bits), None)
+
+
+def _claim_resource(business, day, service_type, slot, duration, resources):
+    """(resource, bits of the slots the booking fills up) at a business with resources - (None, 0) if it doesn't fit.
+
+    Run it in the INSERT's transaction. The day's DayOccupancy row is
+    written first, which locks it until the transaction ends, so bookings
+    of the same day assign one after the other. Then one GROUP BY query
+    reads the day's bookings per resource and slot, and the row gets the
+    slots the booking fills up. Four queries, however many resources the
+    business has.
+    """
+    interval = business.time_interval
+    # Setting no bits creates or locks the row
+    record(business, day, service_type, 0)
+    rows = list(
+        Appointment.objects.filter(business=business, date=day, service_type=service_type)
+        .values_list('resource_id', 'time', 'duration').annotate(n=Count('pk')).order_by()
+    )
+    resource = _pick_resource(resources, rows, interval, slot, duration)
+    if resource is None:
+        return None, 0
+    bookings = [(start, length, count) for _, start, length, count in rows]
+    full = capacity_mask(bookings, interval, len(resources))
+    mask = capacity_mask(bookings + [(slot, duration, 1)], interval, len(resources))
+    DayOccupancy.objects.filter(business=business, date=day, service_type=service_type).update(mask=mask)
+    return resource, mask & ~full
+
+
+async def acreate_appointment(**fields):
+    """create_appointment for async views.
+
+    Django has no async transactions, so the claim and the INSERT run in
+    the sync worker thread as one unit.
+    """
+    return await sync_to_async(create_appointment)(**fields)
+
+
+def _build_appointment(data, default_service_type):
+    """Validate one batch item in memory - returns (Appointment, None) or (None, error message)"""
+    if not isinstance(data, dict):
+        return None, 'Érvénytelen foglalás'
+    for field in REQUIRED_FIELDS:
+        if not data.get(field):
+            return None, f'A {field} mező kitöltése kötelező'
+
+    service_type = data.get('service_type') or default_service_type
+    if service_type not in SERVICE_TYPES:
+        return None, 'Ismeretlen szolgáltatás típus'
+    try:
+        appointment_date = datetime.strptime(data['date'], '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None, 'Érvénytelen dátum formátum'
+    if appointment_date < datetime.now().date():
+        return None, 'Múltbeli dátumra nem lehet időpontot foglalni'
+    try:
+        appointment_time = datetime.strptime(data['time'], '%H:%M').time()
+    except (TypeError, ValueError):
+        return None, 'Érvénytelen idő formátum'
+    try:
+        business = get_business(data['business'])
+    except Business.DoesNotExist:
+        return None, 'Nincs ilyen vállalkozás'
+    duration = None
+    if data.get('service'):
+        try:
+            duration = get_service(business, data['service']).duration
+        except Service.DoesNotExist:
+            return None, 'Ismeretlen szolgáltatás'
+
+    return Appointment(
+        business=business,
+        service_type=service_type,
+        name=str(data['name']).strip(),
+        phone=str(data['phone']).strip(),
+        email=str(data['email']).strip(),
+        date=appointment_date,
+        time=appointment_time,
+        duration=duration,
+    ), None
+
+
+def _slot(appointment):
+    return (appointment.business_id, appointment.date, appointment.time, appointment.service_type)
+
+
+def create_appointments_batch(items, atomic=True, default_service_type='personal'):
+    """Book many slots with one conflict query and one bulk INSERT.
+
+    Every item is validated in memory first. With atomic (all-or-nothing)
+    nothing is written unless every item can be booked; otherwise the valid,
+    free items are booked and the rest reported. Returns one result dict per
+    item, in input order, with status 'created', 'conflict', 'invalid' or
+    'skipped' (valid, but not written because another item failed). Items
+    for businesses with resources get theirs assigned from one more query,
+    and checked again with their days locked before the INSERT.
+    """
+    results = [None] * len(items)
+    pending = {}  # index -> Appointment
+    seen = set()
+    for index, data in enumerate(items):
+        appointment, error = _build_appointment(data, default_service_type)
+        if error:
+            results[index] = {'index': index, 'status': 'invalid', 'message': error}
+        elif get_resources(appointment.business):
+            # Can share a slot with other items - checked by _assign_resources
+            pending[index] = appointment
+        elif _slot(appointment) in seen:
+            results[index] = {'index': index, 'status': 'conflict', 'message': 'Az időpont ebben a kérésben már szerepel'}
+        else:
+            seen.add(_slot(appointment))
+            pending[index] = appointment
+
+    shared = {index: a for index, a in pending.items() if get_resources(a.business)}
+    for index in _assign_resources(shared):
+        del pending[index]
+        results[index] = {'index': index, 'status': 'conflict', 'message': 'Ez az időpont már foglalt'}
+
+    appointments = [a for index, a in pending.items() if index not in shared]
+    if appointments:
+        # One query over the bounding set, exact matches are picked in Python
+        taken = set(
+            Appointment.objects.filter(
+                business_id__in={a.business_id for a in appointments},
+                date__in={a.date for a in appointments},
+                time__in={a.time for a in appointments},
+                service_type__in={a.service_type for a in appointments},
+            ).values_list('business_id', 'date', 'time', 'service_type')
+        )
+        for index in [i for i, a in pending.items() if i not in shared and _slot(a) in taken]:
+            del pending[index]
+            results[index] = {'index': index, 'status': 'conflict', 'message': 'Ez az időpont már foglalt'}
+
+    if atomic and len(pending) != len(items):
+        for index in pending:
+            results[index] = {'index': index, 'status': 'skipped', 'message': 'A csomag más tételei miatt nem jött létre'}
+        return results
+
+    created = []
+    if pending:
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    clashes = _claim_slots(pending, shared)
+                    if clashes and atomic:
+                        raise _BatchConflict(clashes)
+                    for index in clashes:
+                        del pending[index]
+                        results[index] = {'index': index, 'status': 'conflict', 'message': 'Ez az időpont már foglalt'}
+                    created = Appointment.objects.bulk_create(pending.values())
+                    changed = _record_batch(created)
+                    for appointment in created:
+                        key = (appointment.business_id, appointment.date, appointment.service_type)
+                        bits = appointment_mask(appointment.time, appointment.duration, appointment.business.time_interval)
+                        # At businesses with resources only a filled up slot is news, announced once
+                        if key in changed:
+                            if not changed[key] & bits:
+                                continue
+                            changed[key] &= ~bits
+                        publish_slot_change(SLOT_TAKEN, appointment.business, appointment.date,
+                                            appointment.service_type, appointment.time, appointment.duration)
+                for index, appointment in zip(pending, created):
+                    results[index] = {'index': index, 'status': 'created', 'id': appointment.pk}
+            except _BatchConflict as conflict:
+                # An item overlaps a booking (or an earlier item) - nothing was written
+                for index in pending:
+                    if index in conflict.indexes:
+                        results[index] = {'index': index, 'status': 'conflict', 'message': 'Ez az időpont már foglalt'}
+                    else:
+                        results[index] = {'index': index, 'status': 'skipped', 'message': 'A csomag más tételei miatt nem jött létre'}
+                return results
+            except IntegrityError:
+                # Someone booked one of the slots since the conflict query
+                if atomic:
+                    for index in pending:
+                        results[index] = {'index': index, 'status': 'conflict', 'message': 'A foglalás közben ütközés történt, próbálja újra'}
+                    return results
+                created = []
+                for index, appointment in pending.items():
+                    try:
+                        with transaction.atomic():
+                            if _claim_slots({index: appointment}, shared):
+                                raise _BatchConflict([index])
+                            # The post_save signal recounts the days with resources
+                            appointment._occupancy_recorded = index not in shared
+                            appointment.save(force_insert=True)
+                        created.append(appointment)
+                        results[index] = {'index': index, 'status': 'created', 'id': appointment.pk}
+                    except (IntegrityError, _BatchConflict):
+                        appointment.pk = None
+                        results[index] = {'index': index, 'status': 'conflict', 'message': 'Ez az időpont már foglalt'}
+
+    # bulk_create sends no post_save signals
+    for business_id, day, service_type in {(a.business_id, a.date, a.service_type) for a in created}:
+        invalidate_availability(business_id, day, service_type)
+    return results
+
+
+def _assign_resources(pending):
+    """Give the batch items of businesses with resources a free one - returns the indexes that don't fit.
+
+    The bookings of all their days are counted with one GROUP BY query;
+    earlier items of the batch take their resource before later ones.
+    """
+    if not pending:
+        return []
+    appointments = pending.values()
+    rows = defaultdict(list)
+    for business_id, day, service_type, *row in (
+        Appointment.objects.filter(
+            business_id__in={a.business_id for a in appointments},
+            date__in={a.date for a in appointments},
+            service_type__in={a.service_type for a in appointments},
+        ).values_list('business_id', 'date', 'service_type', 'resource_id', 'time', 'duration')
+        .annotate(n=Count('pk')).order_by()
+    ):
+        rows[business_id, day, service_type].append(tuple(row))
+
+    full = []
+    for index, a in pending.items():
+        day_rows = rows[a.business_id, a.date, a.service_type]
+        resource = _pick_resource(get_resources(a.business), day_rows, a.business.time_interval, a.time, a.duration)
+        if resource is None:
+            full.append(index)
+        else:
+            a.resource = resource
+            day_rows.append((resource.pk, a.time, a.duration, 1))
+    return full
+
+
+class _BatchConflict(Exception):
+    """Rolls back an all-or-nothing batch whose items (indexes) clash with other bookings"""
+
+    def __init__(self, indexes):
+        super().__init__(indexes)
+        self.indexes = set(indexes)
+
+
+def _claim_slots(pending, shared):
+    """Claim the slots of the batch items on the DayOccupancy rows - returns the indexes that clash.
+
+    One conditional UPDATE per item without resources, as in
+    create_appointment, so an item overlapping a longer booking, or an
+    earlier item of the batch, is caught. For the items in shared
+    (businesses with resources) the days' rows are locked as in
+    _claim_resource and the resources assigned again from a fresh count, so
+    a booking made since the first pick is seen; _record_batch recounts
+    their rows. Run it in the INSERT's transaction.
+    """
+    clashes = [
+        index for index, a in pending.items()
+        if index not in shared
+        and not occupy(a.business, a.date, a.service_type, appointment_mask(a.time, a.duration, a.business.time_interval))
+    ]
+    items = {index: a for index, a in pending.items() if index in shared}
+    days = {(a.business_id, a.date, a.service_type): a.business for a in items.values()}
+    # In a fixed order, so two batches lock the same days one after the other
+    for key in sorted(days):
+        record(days[key], key[1], key[2], 0)
+    return clashes + _assign_resources(items)
+
+
+def _record_batch(appointments):
+    """Recount DayOccupancy for the days bulk-created appointments with resources went to.
+
+    Returns {key: bits of the slots that became full} of those days. The
+    others' slots were already claimed by _claim_slots.
+    """
+    # Full slots depend on the counts
+    return rebuild_changes({(a.business_id, a.date, a.service_type) for a in appointments if get_resources(a.business)})
@@ -0,0 +1,26 @@
+from django.core.checks import Error, Tags, register
+from django.db import DatabaseError
+
+
+@register(Tags.database, deploy=True)
+def check_initial_businesses(app_configs, databases=None, **kwargs):
+    """Ready check: `manage.py check --deploy --database default` fails until the businesses are seeded"""
+    if not databases or 'default' not in databases:
+        return []
+
+    from .seed import missing_business_slugs
+    try:
+        missing = missing_business_slugs()
+    except DatabaseError as e:
+        return [Error(
+            f'Could not check the initial businesses: {e}',
+            hint='Run "python manage.py migrate".',
+            id='foglalas.E002',
+        )]
+    if missing:
+        return [Error(
+            f'Initial businesses missing: {", ".join(missing)}',
+            hint='Run "python manage.py migrate" or "python manage.py setup_businesses".',
+            id='foglalas.E001',
+        )]
+    return []
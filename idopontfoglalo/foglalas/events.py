@@ -0,0 +1,273 @@
+"""Slot changes pushed to the booking pages as Server-Sent Events.
+
+Appointment signals publish a slot-taken or slot-freed event on the
+(business, date) channel once the transaction commits; every open
+/api/slot-events/ stream of that day receives it. LocalBroker fans the
+events out inside one process, which is all a single runserver, gunicorn
+worker or uvicorn process needs. With several worker processes a shared
+broker with the same publish/subscribe interface has to be configured in
+settings.SLOT_EVENTS_BROKER.
+"""
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time as time_module
+from datetime import datetime
+from django.conf import settings
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+from .models import Business
+from .registry import aget_business, get_business
+from .slots import minutes_label
+
+logger = logging.getLogger(__name__)
+
+SLOT_TAKEN = 'slot-taken'
+SLOT_FREED = 'slot-freed'
+# Sent instead of the events a slow client's full queue had to drop
+RESYNC = 'resync'
+# How long EventSource waits before reconnecting a closed stream
+RETRY_MS = 3000
+
+
+def channel_name(business_id, day):
+    return f'{business_id}:{day.isoformat()}'
+
+
+class Subscription:
+    """Events of one channel for one stream, buffered up to maxsize.
+
+    With a loop the events are handed to that event loop (async streams),
+    otherwise they go to a thread-safe queue (sync streams).
+    """
+
+    def __init__(self, channel, maxsize, loop=None):
+        self.channel = channel
+        self.loop = loop
+        self.overflowed = False
+        self._queue = asyncio.Queue(maxsize) if loop else queue.Queue(maxsize)
+
+    def deliver(self, event):
+        if self.loop:
+            self.loop.call_soon_threadsafe(self._put, event)
+        else:
+            self._put(event)
+
+    def _put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except (asyncio.QueueFull, queue.Full):
+            self.overflowed = True
+
+    def get(self, timeout):
+        """Next event, or None after timeout seconds"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def aget(self, timeout):
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroker:
+    """In-process pub/sub - stand-in for a shared broker when one process serves every stream"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def subscribe(self, channel, loop=None):
+        subscription = Subscription(channel, getattr(settings, 'SLOT_EVENTS_QUEUE_SIZE', 100), loop)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def publish(self, channel, event):
+        """Deliver to every subscriber of the channel - callable from any thread; returns how many got it"""
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.deliver(event)
+            except RuntimeError:
+                # The stream's event loop is gone
+                self.unsubscribe(subscription)
+        return len(subscribers)
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._channels.get(channel, ()))
+            return sum(len(subscribers) for subscribers in self._channels.values())
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """The broker configured in settings.SLOT_EVENTS_BROKER, one per process"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(getattr(settings, 'SLOT_EVENTS_BROKER', 'foglalas.events.LocalBroker'))()
+    return _broker
+
+
+def slot_event(kind, business_id, day, service_type, slot, length):
+    """The event dict of a booking of `length` minutes at `slot` (datetime.time)"""
+    start = slot.hour * 60 + slot.minute
+    return {
+        'type': kind,
+        'business': business_id,
+        'date': day.isoformat(),
+        'service_type': service_type,
+        'start': minutes_label(start),
+        'end': minutes_label(start + length),
+    }
+
+
+def publish_slot_change(kind, business, day, service_type, slot, duration=None):
+    """Announce a taken or freed slot once the current transaction commits (never for a rollback)"""
+    event = slot_event(kind, business.pk, day, service_type, slot, duration or business.time_interval)
+    channel = channel_name(business.pk, day)
+    transaction.on_commit(lambda: get_broker().publish(channel, event))
+
+
+def _format(kind, data):
+    return f'event: {kind}\ndata: {json.dumps(data)}\n\n'
+
+
+def _stream_settings(sync=False):
+    """(heartbeat, max age) - a sync stream ends much sooner, it holds a worker thread"""
+    if sync:
+        max_age = getattr(settings, 'SLOT_EVENTS_SYNC_MAX_AGE', 20)
+    else:
+        max_age = getattr(settings, 'SLOT_EVENTS_MAX_AGE', 300)
+    return getattr(settings, 'SLOT_EVENTS_HEARTBEAT', 15), max_age
+
+
+def _wanted(event, service_type):
+    return service_type is None or event['service_type'] == service_type
+
+
+def _stream(broker, channel, service_type):
+    """Sync stream: holds a worker thread until the client leaves or the sync max age is reached.
+
+    Subscribes only once iterated, so a response that is never sent leaves
+    no subscription behind.
+    """
+    heartbeat, max_age = _stream_settings(sync=True)
+    deadline = time_module.monotonic() + max_age
+    subscription = None
+    try:
+        subscription = broker.subscribe(channel)
+        # The stream ends at max age; EventSource reconnects after RETRY_MS
+        yield f'retry: {RETRY_MS}\n\n'
+        while time_module.monotonic() < deadline:
+            event = subscription.get(min(heartbeat, max(deadline - time_module.monotonic(), 0)))
+            if subscription.overflowed:
+                subscription.overflowed = False
+                yield _format(RESYNC, {})
+            elif event is None:
+                yield ': keepalive\n\n'
+            elif _wanted(event, service_type):
+                yield _format(event['type'], event)
+    finally:
+        if subscription is not None:
+            broker.unsubscribe(subscription)
+
+
+async def _astream(broker, channel, service_type):
+    """Async stream: one coroutine per client on the event loop, subscribed once iterated"""
+    heartbeat, max_age = _stream_settings()
+    deadline = time_module.monotonic() + max_age
+    subscription = None
+    try:
+        subscription = broker.subscribe(channel, asyncio.get_running_loop())
+        yield f'retry: {RETRY_MS}\n\n'
+        while time_module.monotonic() < deadline:
+            event = await subscription.aget(min(heartbeat, max(deadline - time_module.monotonic(), 0)))
+            if subscription.overflowed:
+                subscription.overflowed = False
+                yield _format(RESYNC, {})
+            elif event is None:
+                yield ': keepalive\n\n'
+            elif _wanted(event, service_type):
+                yield _format(event['type'], event)
+    finally:
+        if subscription is not None:
+            broker.unsubscribe(subscription)
+
+
+def _events_error(error, message, status=400):
+    return JsonResponse({'error': error, 'message': message}, status=status)
+
+
+def _events_params(request):
+    """(slug, date) of a ?business=&date= request, or the error response"""
+    slug = request.GET.get('business')
+    date_str = request.GET.get('date')
+    if not slug or not date_str:
+        return _events_error('missing-params', 'Hiányozó paraméterek')
+    try:
+        target_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        return _events_error('bad-date', 'Érvénytelen dátum formátum')
+    if target_date < datetime.now().date():
+        return _events_error('past-date', 'Múltbeli dátumra nem lehet időpontot foglalni')
+    return slug, target_date
+
+
+def _event_stream_response(stream):
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def slot_events_response(request, service_type=None):
+    """text/event-stream of the slot changes of ?business=&date=, only service_type's if given"""
+    params = _events_params(request)
+    if isinstance(params, JsonResponse):
+        return params
+    slug, target_date = params
+    try:
+        business = get_business(slug)
+    except Business.DoesNotExist:
+        return _events_error('unknown-business', 'Ismeretlen vállalkozás', status=404)
+
+    logger.info("Slot event stream opened for %s %s", slug, target_date)
+    return _event_stream_response(_stream(get_broker(), channel_name(business.pk, target_date), service_type))
+
+
+async def aslot_events_response(request, service_type=None):
+    """slot_events_response for async views - no thread is held while the stream is idle"""
+    params = _events_params(request)
+    if isinstance(params, JsonResponse):
+        return params
+    slug, target_date = params
+    try:
+        business = await aget_business(slug)
+    except Business.DoesNotExist:
+        return _events_error('unknown-business', 'Ismeretlen vállalkozás', status=404)
+
+    logger.info("Slot event stream opened for %s %s", slug, target_date)
+    return _event_stream_response(_astream(get_broker(), channel_name(business.pk, target_date), service_type))
@@ -0,0 +1,67 @@
+import csv
+import json
+from .archive import appointment_history
+
+EXPORT_FIELDS = ['id', 'business__slug', 'service_type', 'name', 'phone', 'email', 'date', 'time', 'duration', 'created_at']
+EXPORT_HEADER = ['id', 'business', 'service_type', 'name', 'phone', 'email', 'date', 'time', 'duration', 'created_at']
+# Rows fetched per database round-trip (server-side cursor on PostgreSQL)
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+
+def export_rows(business=None, date_from=None, date_to=None, service_type=None):
+    """Appointment rows as plain tuples (EXPORT_HEADER order), streamed from the database.
+
+    Archived appointments are included. values_list() joins the business
+    slug in the same query, so no model instances are built and
+    Appointment.__str__ never runs per row.
+    """
+    rows = appointment_history(
+        EXPORT_FIELDS, business=business, date_from=date_from, date_to=date_to, service_type=service_type,
+    )
+    return rows.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def export_values(row):
+    """An export_rows() tuple as written by both formats - dates in ISO format, times as HH:MM"""
+    pk, business, service_type, name, phone, email, day, slot, duration, created_at = row
+    return (
+        pk, business, service_type, name, phone, email,
+        day.isoformat(), slot.strftime('%H:%M'), duration, created_at.isoformat(),
+    )
+
+
+class _Echo:
+    """File-like object whose write() hands the line back instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows, chunk_rows=500):
+    """CSV text in chunks of chunk_rows lines (fewer, larger writes to the client)"""
+    writer = csv.writer(_Echo())
+    chunk = [writer.writerow(EXPORT_HEADER)]
+    for row in rows:
+        chunk.append(writer.writerow(export_values(row)))
+        if len(chunk) >= chunk_rows:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def iter_ndjson(rows, chunk_rows=500):
+    """One JSON object per line, in chunks of chunk_rows lines"""
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps(dict(zip(EXPORT_HEADER, export_values(row))), ensure_ascii=False) + '\n')
+        if len(chunk) >= chunk_rows:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def iter_export(export_format, rows):
+    return iter_csv(rows) if export_format == 'csv' else iter_ndjson(rows)
@@ -0,0 +1,143 @@
+"""Logging off the request path: settings.LOGGING_CONFIG points at configure_logging.
+
+The handlers of every configured logger are moved behind a QueueHandler
+that remembers them; one listener thread formats the records and hands
+each to the handlers of the logger it came through. A request only pays
+for building the LogRecord and a put_nowait() - messages use lazy
+%-formatting, and the formatting happens on the listener thread. The
+"queue" section of LOGGING is read here (dictConfig never sees it):
+
+    'queue': {
+        'maxsize': 10000,                      # records waiting; more are dropped, not blocked on
+        'sampling': {'foglalas.views': 10},    # keep 1 in 10 INFO/DEBUG records of that logger
+    }
+"""
+import atexit
+import itertools
+import json
+import logging
+import logging.config
+import logging.handlers
+import os
+import queue
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has - the rest came from extra={...}
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+
+class StructuredFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, the extra={...} fields and exc"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep every n-th INFO/DEBUG record per logger (logger name -> n); warnings and up always pass"""
+
+    def __init__(self, every=None):
+        super().__init__()
+        self.every = dict(every or {})
+        self._counters = {name: itertools.count() for name in self.every}
+
+    def filter(self, record):
+        if record.levelno > logging.INFO:
+            return True
+        name = record.name
+        while name not in self.every:
+            if '.' not in name:
+                return True
+            name = name.rsplit('.', 1)[0]
+        # next() on itertools.count is atomic under the GIL
+        return next(self._counters[name]) % self.every[name] == 0
+
+
+class BackgroundQueueHandler(logging.handlers.QueueHandler):
+    """Queues records for `targets` (the logger's real handlers) without formatting or blocking"""
+
+    def __init__(self, queue_, targets, sampler=None):
+        super().__init__(queue_)
+        self.targets = tuple(targets)
+        self.dropped = 0
+        if sampler is not None:
+            self.addFilter(sampler)
+
+    def prepare(self, record):
+        # The listener formats; the record (and its args) stays in this process
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait((self.targets, record))
+        except queue.Full:
+            self.dropped += 1
+
+
+class DispatchingListener(logging.handlers.QueueListener):
+    """Listener thread for BackgroundQueueHandler - each record goes to its own logger's handlers"""
+
+    def __init__(self, queue_):
+        super().__init__(queue_)
+
+    def handle(self, item):
+        targets, record = item
+        for handler in targets:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+_listener = None
+
+
+def _handled_loggers(config):
+    # 'django' keeps Django's default handlers (mail_admins sends mail synchronously)
+    names = ['django', *config.get('loggers', {})]
+    return [logging.getLogger()] + [logging.getLogger(name) for name in dict.fromkeys(names)]
+
+
+def configure_logging(config):
+    """LOGGING_CONFIG callable: dictConfig, then run the configured handlers on a listener thread"""
+    global _listener
+    config = dict(config)
+    options = config.pop('queue', {})
+    logging.config.dictConfig(config)
+
+    if _listener is not None:
+        _listener.stop()
+    records = queue.Queue(options.get('maxsize', 10000))
+    sampler = SamplingFilter(options['sampling']) if options.get('sampling') else None
+    for logger in _handled_loggers(config):
+        if logger.handlers:
+            logger.handlers = [BackgroundQueueHandler(records, logger.handlers, sampler)]
+    _listener = DispatchingListener(records)
+    _listener.start()
+
+
+def _restart_listener():
+    # A forked worker (e.g. gunicorn --preload) doesn't inherit the thread
+    if _listener is not None:
+        _listener._thread = None
+        _listener.start()
+
+
+def _stop_listener():
+    # Flushes what is still queued
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+atexit.register(_stop_listener)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_listener)
@@ -0,0 +1,73 @@
+import time as time_module
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from foglalas.archive import archive_batch
+from foglalas.models import Appointment
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Move appointments older than --days into the archive table, one transaction per batch. '
+        'Safe to interrupt: the next run carries on where this one stopped'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=90,
+            help='Archive appointments dated more than this many days ago (default: 90)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Appointments moved per transaction (default: 1000)',
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            help='Stop after this many batches (e.g. to spread the work over several runs)',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.0,
+            help='Seconds to wait between batches, to leave the database to the bookings',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be archived')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1 (today and later are never archived)')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        before = date.today() - timedelta(days=options['days'])
+
+        if options['dry_run']:
+            count = Appointment.objects.filter(date__lt=before).count()
+            self.stdout.write(f'{count} appointments dated before {before} would be archived')
+            return
+
+        started = time_module.perf_counter()
+        moved = batches = 0
+        while options['max_batches'] is None or batches < options['max_batches']:
+            count = archive_batch(before, options['batch_size'])
+            if not count:
+                break
+            moved += count
+            batches += 1
+            self.stderr.write(f'{moved} archived ({time_module.perf_counter() - started:.1f}s)')
+            if options['pause']:
+                time_module.sleep(options['pause'])
+
+        remaining = Appointment.objects.filter(date__lt=before).exists()
+        elapsed = time_module.perf_counter() - started
+        message = f'{moved} appointments dated before {before} archived in {batches} batches ({elapsed:.1f}s)'
+        if remaining:
+            message += ' - more are left, run again to continue'
+        logger.info('Archival: %s', message)
+        self.stdout.write(self.style.SUCCESS(message))
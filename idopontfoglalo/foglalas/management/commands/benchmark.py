@@ -0,0 +1,184 @@
+import json
+import logging
+import random
+import threading
+import time as time_module
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from urllib.parse import urlencode
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.test import Client
+from foglalas.benchmarks import (
+    APP_SERVICE_TYPES, OPENING_HOURS, regressions, remove_benchmark_data, seed_benchmark_data, summarize,
+)
+
+DRIVERS = ('client', 'wsgi')
+ENDPOINTS = ('times', 'slots', 'book')
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed benchmark businesses and appointments, then drive the booking and availability '
+        'endpoints of every app through the test client and a threaded WSGI server. Reports '
+        'requests/s and p50/p95/p99 latency; with --baseline it fails on regressions'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--businesses', type=int, default=3, help='Businesses to seed (default: 3)')
+        parser.add_argument('--days', type=int, default=30, help='Days to seed, starting tomorrow (default: 30)')
+        parser.add_argument(
+            '--appointments', type=int, default=5,
+            help='Appointments per business, day and service type (default: 5)',
+        )
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint, app and driver (default: 200)')
+        parser.add_argument('--concurrency', type=int, default=8, help='Client threads against the WSGI server (default: 8)')
+        parser.add_argument('--driver', choices=DRIVERS, action='append', help='Only these drivers (repeatable)')
+        parser.add_argument('--endpoint', choices=ENDPOINTS, action='append', help='Only these endpoints (repeatable)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the data and the request mix')
+        parser.add_argument('--json', dest='json_path', help='Write the results to this file (usable as a baseline)')
+        parser.add_argument('--baseline', help='Results file of an earlier run to compare with')
+        parser.add_argument(
+            '--threshold', type=float, default=0.25,
+            help='Allowed slowdown against the baseline, as a fraction (default: 0.25)',
+        )
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded data after the run')
+
+    def handle(self, *args, **options):
+        if min(options['businesses'], options['days'], options['requests'], options['concurrency']) < 1:
+            raise CommandError('--businesses, --days, --requests and --concurrency must be at least 1')
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as source:
+                    baseline = json.load(source)['results']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Cannot read baseline {options['baseline']}: {e}")
+
+        drivers = options['driver'] or list(DRIVERS)
+        endpoints = options['endpoint'] or list(ENDPOINTS)
+        # Don't let per-request logging (conflicts log a warning) dominate the numbers
+        logging.disable(logging.WARNING)
+
+        started = time_module.perf_counter()
+        businesses = seed_benchmark_data(options['businesses'], options['days'], options['appointments'], options['seed'])
+        self.stderr.write(f'Seeded {len(businesses)} businesses in {time_module.perf_counter() - started:.1f}s')
+        try:
+            results = {}
+            for driver in drivers:
+                run = self._run_client if driver == 'client' else self._run_wsgi
+                results[driver] = {}
+                for name, requests in self._workload(businesses, endpoints, options):
+                    run(requests[:options['concurrency']], options['concurrency'])  # warm-up
+                    started = time_module.perf_counter()
+                    outcomes = run(requests, options['concurrency'])
+                    results[driver][name] = summarize(outcomes, time_module.perf_counter() - started)
+        finally:
+            logging.disable(logging.NOTSET)
+            if not options['keep']:
+                remove_benchmark_data()
+
+        self._report(results)
+        if options['json_path']:
+            config = {key: options[key] for key in ('businesses', 'days', 'appointments', 'requests', 'concurrency', 'seed')}
+            with open(options['json_path'], 'w', encoding='utf-8') as output:
+                json.dump({'config': config, 'results': results}, output, indent=2)
+
+        if baseline is not None:
+            problems = regressions(results, baseline, options['threshold'])
+            for problem in problems:
+                self.stderr.write(problem)
+            if problems:
+                raise CommandError(f'{len(problems)} regressions against {options["baseline"]}', returncode=1)
+            self.stdout.write(self.style.SUCCESS(f'No regressions beyond {options["threshold"]:.0%}'))
+
+    def _workload(self, businesses, endpoints, options):
+        """(name, requests) per app and endpoint; a request is (method, path, query, body)"""
+        first_day = date.today() + timedelta(days=1)
+        for app, service_type in APP_SERVICE_TYPES.items():
+            for endpoint in endpoints:
+                if endpoint == 'slots' and app != 'foglalas':
+                    continue
+                # Same mix on every run with the same seed
+                rng = random.Random(f"{options['seed']}-{app}-{endpoint}")
+                requests = []
+                for _ in range(options['requests']):
+                    business = rng.choice(businesses)
+                    day = (first_day + timedelta(days=rng.randrange(options['days']))).isoformat()
+                    query = urlencode({'business': business.slug, 'date': day})
+                    if endpoint == 'times':
+                        requests.append(('GET', f'/{app}/api/available-times/', query, b''))
+                    elif endpoint == 'slots':
+                        requests.append(('GET', '/foglalas/api/slots/', query, b''))
+                    else:
+                        # Seeded days, so some of these collide with existing bookings
+                        body = json.dumps({
+                            'business': business.slug, 'name': 'Benchmark Foglalás', 'phone': '+36 30 000 0000',
+                            'email': 'benchmark@example.com', 'date': day, 'service_type': service_type,
+                            'time': f'{rng.randrange(*OPENING_HOURS):02d}:00',
+                        }).encode()
+                        requests.append(('POST', f'/{app}/api/book-appointment/', '', body))
+                yield f'{app}.{endpoint}', requests
+
+    def _run_client(self, requests, concurrency):
+        """Django test client in this thread - the request/response cycle without HTTP"""
+        client = Client(SERVER_NAME='localhost')
+        outcomes = []
+        for method, path, query, body in requests:
+            started = time_module.perf_counter()
+            if method == 'GET':
+                response = client.get(f'{path}?{query}')
+            else:
+                response = client.post(path, body, content_type='application/json')
+            outcomes.append((time_module.perf_counter() - started, response.status_code))
+        return outcomes
+
+    def _run_wsgi(self, requests, concurrency):
+        """A real threaded WSGI server on a free local port, hit by `concurrency` HTTP clients"""
+        server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler, allow_reuse_address=True)
+        server.set_app(WSGIHandler())
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        base = f'http://localhost:{server.server_port}'
+
+        def call(request):
+            method, path, query, body = request
+            url = f'{base}{path}?{query}' if query else f'{base}{path}'
+            http_request = urllib.request.Request(
+                url, data=body or None, method=method, headers={'Content-Type': 'application/json'},
+            )
+            started = time_module.perf_counter()
+            try:
+                with urllib.request.urlopen(http_request, timeout=30) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                e.read()
+                status = e.code
+            return time_module.perf_counter() - started, status
+
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='benchmark') as pool:
+                return list(pool.map(call, requests))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def _report(self, results):
+        self.stdout.write(
+            f"{'driver':<7} {'endpoint':<14} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}"
+        )
+        for driver, runs in results.items():
+            for name, r in runs.items():
+                self.stdout.write(
+                    f"{driver:<7} {name:<14} {r['rps']:>8.0f} {r['p50_ms']:>8.2f} "
+                    f"{r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['errors']:>7}"
+                )
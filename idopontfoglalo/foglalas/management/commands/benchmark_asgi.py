@@ -0,0 +1,197 @@
+import asyncio
+import io
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import time as time_module
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from foglalas.benchmarks import APP_SERVICE_TYPES as APPS, summarize
+from foglalas.models import Appointment, Business
+
+ENDPOINTS = ('times', 'slots', 'book')
+# Appointments made by this command are recognised (and removed) by name and email -
+# distinct from the data `benchmark --keep` seeds, which must survive the cleanup
+BENCHMARK_NAME = 'ASGI Benchmark Foglalás'
+BENCHMARK_EMAIL = 'benchmark-asgi@example.com'
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the sync views under WSGI with the async views under ASGI at high concurrency. '
+        'Both handler stacks run in-process (a thread pool for WSGI, one event loop for ASGI); '
+        'reports requests/s and p50/p99 latency per endpoint'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint and mode (default: 2000)')
+        parser.add_argument('--concurrency', type=int, default=64, help='Requests in flight at once (default: 64)')
+        parser.add_argument('--endpoint', choices=ENDPOINTS, action='append', help='Only these endpoints (repeatable)')
+        parser.add_argument('--business', default='harmonia-masszazs', help='Business slug to query and book')
+        parser.add_argument('--days', type=int, default=30, help='Spread requests over this many future days')
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this file')
+        parser.add_argument('--mode', choices=['wsgi', 'asgi'], help='Run one mode in this process (used internally)')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be at least 1')
+        if not Business.objects.filter(slug=options['business']).exists():
+            raise CommandError(f"Unknown business {options['business']!r} - run migrate or setup_businesses")
+        endpoints = options['endpoint'] or list(ENDPOINTS)
+
+        if options['mode']:
+            # Child process: settings.ASYNC_VIEWS was set from the environment
+            results = self._run_mode(options['mode'], endpoints, options)
+            self.stdout.write(json.dumps(results))
+            return
+
+        results = {}
+        for mode in ('wsgi', 'asgi'):
+            results[mode] = self._spawn(mode, endpoints, options)
+        self._cleanup()
+
+        self.stdout.write(f"{'endpoint':<8} {'mode':<5} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for endpoint in endpoints:
+            for mode in ('wsgi', 'asgi'):
+                r = results[mode][endpoint]
+                self.stdout.write(
+                    f"{endpoint:<8} {mode:<5} {r['rps']:>9.0f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['errors']:>7}"
+                )
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as output:
+                json.dump({'options': {k: options[k] for k in ('requests', 'concurrency', 'business', 'days')},
+                           'results': results}, output, indent=2)
+
+    def _spawn(self, mode, endpoints, options):
+        """Run one mode in a fresh process - the URLconf picks sync or async views at import time"""
+        command = [
+            sys.executable, str(settings.BASE_DIR / 'manage.py'), 'benchmark_asgi', '--mode', mode,
+            '--requests', str(options['requests']), '--concurrency', str(options['concurrency']),
+            '--business', options['business'], '--days', str(options['days']),
+        ]
+        for endpoint in endpoints:
+            command += ['--endpoint', endpoint]
+        env = dict(os.environ, ASYNC_VIEWS='1' if mode == 'asgi' else '0')
+        completed = subprocess.run(command, env=env, capture_output=True, text=True)
+        if completed.returncode:
+            raise CommandError(f'{mode} run failed:\n{completed.stderr}')
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+    def _requests(self, endpoint, options):
+        """(method, path, query, body) for every request of one endpoint, in a fixed random order"""
+        rng = random.Random(endpoint)
+        first_day = date.today() + timedelta(days=1)
+        slug = options['business']
+        requests = []
+        for _ in range(options['requests']):
+            day = (first_day + timedelta(days=rng.randrange(options['days']))).isoformat()
+            app = rng.choice(list(APPS))
+            if endpoint == 'times':
+                requests.append(('GET', f'/{app}/api/available-times/', urlencode({'business': slug, 'date': day}), b''))
+            elif endpoint == 'slots':
+                requests.append(('GET', '/foglalas/api/slots/', urlencode({'date': day}), b''))
+            else:
+                # Bookings far ahead so they never collide with real ones
+                far_day = (first_day + timedelta(days=365 + rng.randrange(options['days']))).isoformat()
+                body = json.dumps({
+                    'business': slug, 'name': BENCHMARK_NAME, 'phone': '+36 30 000 0000',
+                    'email': BENCHMARK_EMAIL, 'date': far_day,
+                    'time': f'{rng.randrange(9, 17):02d}:00', 'service_type': APPS[app],
+                }).encode()
+                requests.append(('POST', f'/{app}/api/book-appointment/', '', body))
+        return requests
+
+    def _run_mode(self, mode, endpoints, options):
+        if settings.ASYNC_VIEWS != (mode == 'asgi'):
+            raise CommandError(f'ASYNC_VIEWS must be {"on" if mode == "asgi" else "off"} for the {mode} run')
+        # Don't let per-request logging dominate the numbers
+        logging.disable(logging.INFO)
+
+        results = {}
+        for endpoint in endpoints:
+            requests = self._requests(endpoint, options)
+            run = self._run_wsgi if mode == 'wsgi' else self._run_asgi
+            run(requests[:options['concurrency']], options['concurrency'])  # warm-up
+            started = time_module.perf_counter()
+            outcomes = run(requests, options['concurrency'])
+            results[endpoint] = summarize(outcomes, time_module.perf_counter() - started)
+        return results
+
+    def _run_wsgi(self, requests, concurrency):
+        """A threaded WSGI server's worker pool, without the socket layer - returns (latency, status) pairs"""
+        handler = WSGIHandler()
+
+        def call(request):
+            method, path, query, body = request
+            environ = {
+                'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+                'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'REMOTE_ADDR': '127.0.0.1', 'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(body)),
+                'wsgi.input': io.BytesIO(body), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+                'wsgi.version': (1, 0), 'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+            }
+            statuses = []
+            started = time_module.perf_counter()
+            response = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+            b''.join(response)
+            response.close()
+            return time_module.perf_counter() - started, int(statuses[0].split()[0])
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='wsgi') as pool:
+            return list(pool.map(call, requests))
+
+    def _run_asgi(self, requests, concurrency):
+        """One event loop serving `concurrency` connections, as uvicorn or daphne would"""
+        handler = ASGIHandler()
+
+        async def call(request):
+            method, path, query, body = request
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+                'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+                'root_path': '', 'headers': [(b'host', b'localhost'), (b'content-type', b'application/json'),
+                                             (b'content-length', str(len(body)).encode())],
+                'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+            }
+            messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+            status = []
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                await asyncio.Event().wait()  # never disconnects
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            started = time_module.perf_counter()
+            await handler(scope, receive, send)
+            return time_module.perf_counter() - started, status[0]
+
+        async def main():
+            queue = list(reversed(requests))
+            outcomes = []
+
+            async def worker():
+                while queue:
+                    outcomes.append(await call(queue.pop()))
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            return outcomes
+
+        return asyncio.run(main())
+
+    def _cleanup(self):
+        # Deleted through the ORM so the occupancy and availability cache follow
+        deleted, _ = Appointment.objects.filter(name=BENCHMARK_NAME, email=BENCHMARK_EMAIL).delete()
+        if deleted:
+            self.stderr.write(f'Removed {deleted} benchmark appointments')
@@ -0,0 +1,49 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from foglalas.benchmarks import CONNECTION_MODES, benchmark_connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure what connection reuse saves per request: the same request cycle with a new '
+        'connection each time, with persistent connections (CONN_MAX_AGE) and, on PostgreSQL, '
+        "with psycopg's pool. Run it against the production-like database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Request cycles per mode (default: 500)')
+        parser.add_argument('--database', default='default', help='Database alias to connect to (default: default)')
+        parser.add_argument('--mode', choices=CONNECTION_MODES, action='append', help='Only these modes (repeatable)')
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this file')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests must be at least 1')
+        if options['database'] not in connections.settings:
+            raise CommandError(f"Unknown database alias {options['database']!r}")
+        connection = connections[options['database']]
+        modes = options['mode'] or [
+            mode for mode in CONNECTION_MODES if mode != 'pooled' or connection.vendor == 'postgresql'
+        ]
+        if 'pooled' in modes and connection.vendor != 'postgresql':
+            raise CommandError(f'Connection pooling needs PostgreSQL, {options["database"]} is {connection.vendor}')
+
+        results = {}
+        for mode in modes:
+            summary, opened = benchmark_connections(connection.settings_dict, mode, options['requests'])
+            results[mode] = {**summary, 'connections': opened}
+
+        self.stdout.write(f"{'mode':<11} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'connections':>12}")
+        for mode, r in results.items():
+            self.stdout.write(
+                f"{mode:<11} {r['rps']:>8.0f} {r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f} "
+                f"{r['p99_ms']:>8.3f} {r['connections']:>12}"
+            )
+        if 'fresh' in results:
+            for mode in [mode for mode in results if mode != 'fresh']:
+                saved = results['fresh']['p50_ms'] - results[mode]['p50_ms']
+                self.stdout.write(f'{mode} saves {saved:.3f} ms per request at p50 against fresh connections')
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as output:
+                json.dump({'vendor': connection.vendor, 'results': results}, output, indent=2)
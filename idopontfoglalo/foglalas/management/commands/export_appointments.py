@@ -0,0 +1,37 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from foglalas.export import EXPORT_FORMATS, export_rows, iter_export
+
+
+class Command(BaseCommand):
+    help = 'Stream appointments as CSV or NDJSON to stdout or a file without loading the table into memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv', help='Output format (default: csv)')
+        parser.add_argument('--output', '-o', default='-', help='Output file (default: stdout)')
+        parser.add_argument('--business', help='Only this business (slug)')
+        parser.add_argument('--from', dest='date_from', help='First date, YYYY-MM-DD')
+        parser.add_argument('--to', dest='date_to', help='Last date, YYYY-MM-DD')
+        parser.add_argument('--service-type', help='Only this service_type')
+
+    def handle(self, *args, **options):
+        try:
+            date_from = date.fromisoformat(options['date_from']) if options['date_from'] else None
+            date_to = date.fromisoformat(options['date_to']) if options['date_to'] else None
+        except ValueError as e:
+            raise CommandError(f'Invalid date: {e}')
+
+        rows = export_rows(
+            business=options['business'],
+            date_from=date_from,
+            date_to=date_to,
+            service_type=options['service_type'],
+        )
+        chunks = iter_export(options['format'], rows)
+        if options['output'] == '-':
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            for chunk in chunks:
+                output.write(chunk)
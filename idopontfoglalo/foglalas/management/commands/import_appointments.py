@@ -0,0 +1,213 @@
+import csv
+import json
+import sys
+import time as time_module
+from datetime import date, time
+from itertools import islice
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from foglalas.availability import invalidate_availability
+from foglalas.models import Appointment, Business
+from foglalas.occupancy import rebuild_occupancy
+import logging
+
+logger = logging.getLogger(__name__)
+
+UPDATE_FIELDS = ['name', 'phone', 'email', 'duration']
+SERVICE_TYPES = {choice for choice, _ in Appointment.SERVICE_TYPE_CHOICES}
+# Only the first few bad rows are printed, the rest are just counted
+MAX_REPORTED_ERRORS = 20
+
+
+def _unassigned(keys):
+    """Unassigned appointments over the bounding set of (business_id, date, time, service_type) keys"""
+    return Appointment.objects.filter(
+        business_id__in={key[0] for key in keys},
+        date__in={key[1] for key in keys},
+        time__in={key[2] for key in keys},
+        service_type__in={key[3] for key in keys},
+        resource__isnull=True,
+    )
+
+
+def _count_inserted(new):
+    """How many of the {slot key: Appointment} rows are in the table now, rather than a concurrent booking"""
+    if not new:
+        return 0
+    stored = set(_unassigned(new).values_list('business_id', 'date', 'time', 'service_type', 'name', 'phone', 'email'))
+    return sum((*key, a.name, a.phone, a.email) in stored for key, a in new.items())
+
+
+class Command(BaseCommand):
+    help = 'Stream appointments from a CSV or JSONL file (or stdin) into the database in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Input file, or "-" for stdin',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help='Input format (default: from the file extension, csv for stdin)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows per bulk INSERT / transaction (default: 1000)',
+        )
+        parser.add_argument(
+            '--on-conflict',
+            choices=['skip', 'update'],
+            default='skip',
+            help='What to do with rows whose slot is already booked (default: skip)',
+        )
+        parser.add_argument(
+            '--default-service-type',
+            choices=sorted(SERVICE_TYPES),
+            default=Appointment._meta.get_field('service_type').default,
+            help='service_type for rows that have none',
+        )
+        parser.add_argument(
+            '--progress-every',
+            type=int,
+            default=10000,
+            help='Report progress every N rows (0 to disable)',
+        )
+
+    def handle(self, *args, **options):
+        """Read rows lazily and write them batch by batch - memory stays bounded by --batch-size"""
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        path = options['path']
+        input_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        self.on_conflict = options['on_conflict']
+        self.default_service_type = options['default_service_type']
+        self.business_ids = dict(Business.objects.values_list('slug', 'id'))
+        self.counts = {'read': 0, 'created': 0, 'updated': 0, 'skipped': 0, 'invalid': 0}
+
+        progress_every = options['progress_every']
+        started = time_module.perf_counter()
+        next_report = progress_every
+
+        stream = sys.stdin if path == '-' else self._open(path)
+        try:
+            rows = self._read_csv(stream) if input_format == 'csv' else self._read_jsonl(stream)
+            appointments = self._parse(rows)
+            while True:
+                batch = list(islice(appointments, batch_size))
+                if not batch:
+                    break
+                self._write_batch(batch)
+                if progress_every and self.counts['read'] >= next_report:
+                    self._report(started)
+                    next_report += progress_every
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        self._report(started, final=True)
+
+    def _open(self, path):
+        try:
+            return open(path, newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(f'Cannot open {path}: {e}')
+
+    def _read_csv(self, stream):
+        for line_number, row in enumerate(csv.DictReader(stream), start=2):
+            yield line_number, row
+
+    def _read_jsonl(self, stream):
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, e
+
+    def _parse(self, rows):
+        """Turn raw rows into unsaved Appointments, counting and reporting the bad ones"""
+        for line_number, row in rows:
+            self.counts['read'] += 1
+            try:
+                if isinstance(row, Exception):
+                    raise ValueError(f'invalid JSON ({row})')
+                yield self._build(row)
+            except (KeyError, TypeError, ValueError) as e:
+                self.counts['invalid'] += 1
+                if self.counts['invalid'] <= MAX_REPORTED_ERRORS:
+                    self.stderr.write(f'Line {line_number}: skipped, {e}')
+
+    def _build(self, row):
+        slug = row['business']
+        if slug not in self.business_ids:
+            raise ValueError(f'unknown business {slug!r}')
+        service_type = row.get('service_type') or self.default_service_type
+        if service_type not in SERVICE_TYPES:
+            raise ValueError(f'unknown service_type {service_type!r}')
+        for field in ('name', 'phone', 'email'):
+            if not row.get(field):
+                raise ValueError(f'missing {field}')
+        return Appointment(
+            business_id=self.business_ids[slug],
+            service_type=service_type,
+            name=str(row['name']).strip(),
+            phone=str(row['phone']).strip(),
+            email=str(row['email']).strip(),
+            date=date.fromisoformat(row['date']),
+            time=time.fromisoformat(row['time']),
+            duration=int(row['duration']) if row.get('duration') else None,
+        )
+
+    def _write_batch(self, batch):
+        # Last row wins for slots repeated inside the batch
+        by_slot = {(a.business_id, a.date, a.time, a.service_type): a for a in batch}
+        self.counts['skipped'] += len(batch) - len(by_slot)
+
+        with transaction.atomic():
+            # Imported rows get no resource, so only unassigned bookings hold their slot.
+            # unique_appointment_slot is partial for that reason, and ON CONFLICT
+            # can't name it - updates are a bulk UPDATE of the rows found here
+            rows = _unassigned(by_slot).values_list('business_id', 'date', 'time', 'service_type', 'pk')
+            existing = {row[:4]: row[4] for row in rows if row[:4] in by_slot}
+
+            if self.on_conflict == 'update':
+                for key, pk in existing.items():
+                    by_slot[key].pk = pk
+                Appointment.objects.bulk_update([by_slot[key] for key in existing], UPDATE_FIELDS)
+                self.counts['updated'] += len(existing)
+            else:
+                self.counts['skipped'] += len(existing)
+            new = {key: a for key, a in by_slot.items() if key not in existing}
+            # ignore_conflicts also covers rows booked since the query above -
+            # those are found missing below and counted as skipped
+            Appointment.objects.bulk_create(new.values(), ignore_conflicts=True)
+            created = _count_inserted(new)
+            self.counts['created'] += created
+            self.counts['skipped'] += len(new) - created
+
+            # bulk_create sends no signals - recompute the touched days' occupancy here
+            days = {(key[0], key[1], key[3]) for key in by_slot}
+            rebuild_occupancy(days)
+
+        for business_id, day, service_type in days:
+            invalidate_availability(business_id, day, service_type)
+
+    def _report(self, started, final=False):
+        elapsed = time_module.perf_counter() - started
+        rate = self.counts['read'] / elapsed if elapsed else 0
+        message = (
+            f"{self.counts['read']} rows read: {self.counts['created']} created, "
+            f"{self.counts['updated']} updated, {self.counts['skipped']} skipped, "
+            f"{self.counts['invalid']} invalid ({rate:.0f} rows/s)"
+        )
+        if final:
+            self.stdout.write(self.style.SUCCESS(f'Import finished in {elapsed:.1f}s - {message}'))
+            logger.info('Appointment import finished: %s', message)
+        else:
+            self.stderr.write(message)
@@ -0,0 +1,58 @@
+import time as time_module
+from django.core.management.base import BaseCommand, CommandError
+from foglalas.availability import invalidate_availability
+from foglalas.models import Business
+from foglalas.occupancy import occupancy_differences, rebuild_occupancy
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Only the first few differences are printed, the rest are just counted
+MAX_REPORTED_DIFFERENCES = 20
+
+
+class Command(BaseCommand):
+    help = 'Recompute the DayOccupancy bitmaps from the appointments, or check them with --check'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--business', help='Only this business (slug)')
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only compare the bitmaps with the appointments; exit with status 1 if they differ',
+        )
+
+    def handle(self, *args, **options):
+        business_id = None
+        if options['business']:
+            try:
+                business_id = Business.objects.get(slug=options['business']).pk
+            except Business.DoesNotExist:
+                raise CommandError(f"Unknown business {options['business']!r}")
+
+        started = time_module.perf_counter()
+        differences = occupancy_differences(business_id)
+        for (pk, day, service_type), expected, actual in differences[:MAX_REPORTED_DIFFERENCES]:
+            self.stderr.write(
+                f'business {pk} {day} {service_type}: expected {self._describe(expected)}, found {self._describe(actual)}'
+            )
+
+        if options['check']:
+            if differences:
+                raise CommandError(f'{len(differences)} occupancy rows differ from the appointments', returncode=1)
+            self.stdout.write(self.style.SUCCESS('Occupancy matches the appointments'))
+            return
+
+        rows = rebuild_occupancy(business_id=business_id)
+        for key in (key for key, _, _ in differences):
+            invalidate_availability(*key)
+        elapsed = time_module.perf_counter() - started
+        message = f'{rows} occupancy rows rebuilt, {len(differences)} were out of date ({elapsed:.1f}s)'
+        logger.info('Occupancy rebuild: %s', message)
+        self.stdout.write(self.style.SUCCESS(message))
+
+    def _describe(self, value):
+        if value is None:
+            return 'no row'
+        interval, mask = value
+        return f'{mask:b} ({interval} min slots)'
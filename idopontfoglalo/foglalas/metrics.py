@@ -0,0 +1,212 @@
+"""In-process metrics, served at /metrics in the Prometheus text format.
+
+Every labelled series is created once and then only updated: an
+observation is a bucket lookup (bisect) and an increment under the
+series' own lock, so unrelated series never contend. Values are per
+process - with several workers, scrape each of them (or sum them in
+Prometheus).
+"""
+import threading
+from bisect import bisect_left
+from .models import Appointment
+from .registry import find_business
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SERVICE_TYPES = {choice for choice, _ in Appointment.SERVICE_TYPE_CHOICES}
+BOOKING_OUTCOMES = ('success', 'conflict', 'validation_error', 'server_error')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterValue:
+    __slots__ = ('_lock', 'value')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramValue:
+    __slots__ = ('_lock', '_bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self._lock = threading.Lock()
+        self._bounds = bounds
+        # One slot per bucket plus +Inf, not cumulative (that's done when rendering)
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = bisect_left(self._bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def labels(self, *values):
+        """The series of these label values - keep it to skip the lookup on hot paths"""
+        series = self._series.get(values)
+        if series is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f'{self.name} takes labels {self.labelnames}, got {values}')
+            with self._lock:
+                series = self._series.get(values)
+                if series is None:
+                    series = self._series[values] = self._new_series()
+        return series
+
+    def _items(self):
+        with self._lock:
+            return sorted(self._series.items())
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values, series in self._items():
+            lines.extend(self._render_series(list(zip(self.labelnames, values)), series))
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_series(self):
+        return _CounterValue()
+
+    def _render_series(self, labels, series):
+        return [f'{self.name}{_format_labels(labels)} {_format_value(series.value)}']
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_series(self):
+        return _HistogramValue(self.buckets)
+
+    def _render_series(self, labels, series):
+        with series._lock:
+            counts, total = list(series.counts), series.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{_format_labels(labels + [("le", _format_value(bound))])} {cumulative}')
+        lines.append(f'{self.name}_sum{_format_labels(labels)} {_format_value(total)}')
+        lines.append(f'{self.name}_count{_format_labels(labels)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, function):
+        """Register function() -> [(name, kind, documentation, value)], read at scrape time only"""
+        self._collectors.append(function)
+        return function
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, kind, documentation, value in collect():
+                lines += [f'# HELP {name} {documentation}', f'# TYPE {name} {kind}', f'{name} {_format_value(value)}']
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    'foglalas_http_request_duration_seconds', 'Request latency by view (to the first byte for streams)', ['view'],
+)
+REQUEST_DB_TIME = REGISTRY.histogram(
+    'foglalas_http_request_db_seconds', 'Database time per request by view', ['view'],
+)
+DB_QUERIES = REGISTRY.counter('foglalas_db_queries_total', 'Database queries by view', ['view'])
+BOOKINGS = REGISTRY.counter(
+    'foglalas_bookings_total', 'Booking attempts by business, service type and outcome',
+    ['business', 'service_type', 'outcome'],
+)
+
+
+@REGISTRY.collector
+def _availability_cache():
+    from .availability import availability_cache_stats
+    stats = availability_cache_stats()
+    lookups = stats['hits'] + stats['misses']
+    return [
+        ('foglalas_availability_cache_hits_total', 'counter', 'Availability cache hits', stats['hits']),
+        ('foglalas_availability_cache_misses_total', 'counter', 'Availability cache misses', stats['misses']),
+        ('foglalas_availability_cache_hit_ratio', 'gauge', 'Availability cache hits per lookup since start',
+         stats['hits'] / lookups if lookups else 0.0),
+    ]
+
+
+def observe_request(view, seconds, db_seconds, queries):
+    """Called by QueryCountMiddleware once per request"""
+    REQUEST_LATENCY.labels(view).observe(seconds)
+    REQUEST_DB_TIME.labels(view).observe(db_seconds)
+    if queries:
+        DB_QUERIES.labels(view).inc(queries)
+
+
+def count_booking(outcome, business=None, service_type=None):
+    """Count one booking attempt - the view passes the business it looked up (None if it didn't get that far).
+
+    Unknown service types are counted as 'unknown', so bad input cannot
+    create new series.
+    """
+    if service_type not in SERVICE_TYPES:
+        service_type = 'unknown'
+    BOOKINGS.labels(business.slug if business else 'unknown', service_type, outcome).inc()
+
+
+def booking_labels(data):
+    """(business, service_type) of a batch item's fields, for count_booking - business is None if unknown"""
+    if not isinstance(data, dict):
+        return None, None
+    slug = data.get('business')
+    return (find_business(slug) if isinstance(slug, str) else None), data.get('service_type', 'personal')
@@ -0,0 +1,136 @@
+"""Per-request database query count and timing.
+
+An execute wrapper installed on every database connection (connection_created)
+counts the queries and their time into the stats of the request running in
+the current context. The context variable is copied into sync_to_async
+threads, so the ORM calls of async views are counted too, and nothing here
+depends on DEBUG or connection.queries.
+"""
+import logging
+import threading
+import time as time_module
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from .metrics import observe_request
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('foglalas_request_stats', default=None)
+
+DEFAULT_BUDGET = {'queries': 20, 'ms': 500}
+
+_totals_lock = threading.Lock()
+# url name -> {'requests', 'queries', 'db_ms', 'total_ms', 'over_budget'}
+_totals = {}
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_seconds', 'started')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.started = time_module.perf_counter()
+
+
+def count_queries(execute, sql, params, many, context):
+    """Execute wrapper: time the query into the current request's stats, if there is one"""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time_module.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time_module.perf_counter() - started
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """connection_created receiver - every new connection gets the wrapper once"""
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+def request_totals():
+    """Copy of the per-URL-name totals of this process"""
+    with _totals_lock:
+        return {name: dict(values) for name, values in _totals.items()}
+
+
+def reset_request_totals():
+    with _totals_lock:
+        _totals.clear()
+
+
+def _budget(url_name):
+    budgets = getattr(settings, 'REQUEST_BUDGETS', {})
+    return {**DEFAULT_BUDGET, **budgets.get('default', {}), **budgets.get(url_name, {})}
+
+
+class QueryCountMiddleware:
+    """Adds Server-Timing (db and total) to every response and logs requests over their budget.
+
+    Budgets come from settings.REQUEST_BUDGETS, keyed by URL name
+    ('book_appointment', 'available_times', 'get_slots', ...) with a
+    'default' entry for the rest; each sets a 'queries' and an 'ms' limit.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, stats)
+
+    def _finish(self, request, response, stats):
+        # Streaming responses are timed up to the first byte
+        total_ms = (time_module.perf_counter() - stats.started) * 1000
+        db_ms = stats.db_seconds * 1000
+        response.headers['Server-Timing'] = (
+            f'db;dur={db_ms:.1f};desc="{stats.queries} queries", total;dur={total_ms:.1f}'
+        )
+
+        match = getattr(request, 'resolver_match', None)
+        url_name = (match.url_name if match else None) or 'unresolved'
+        observe_request(match.view_name if match else 'unresolved', total_ms / 1000, stats.db_seconds, stats.queries)
+        budget = _budget(url_name)
+        over = stats.queries > budget['queries'] or total_ms > budget['ms']
+        with _totals_lock:
+            totals = _totals.setdefault(
+                url_name, {'requests': 0, 'queries': 0, 'db_ms': 0.0, 'total_ms': 0.0, 'over_budget': 0},
+            )
+            totals['requests'] += 1
+            totals['queries'] += stats.queries
+            totals['db_ms'] += db_ms
+            totals['total_ms'] += total_ms
+            totals['over_budget'] += over
+        if over:
+            logger.warning(
+                "%s over budget: %s queries (%s allowed), %.0f ms (%s allowed), db %.0f ms - %s %s",
+                url_name, stats.queries, budget['queries'], total_ms, budget['ms'], db_ms, request.method, request.path,
+                extra={'url_name': url_name, 'queries': stats.queries, 'duration_ms': round(total_ms, 1)},
+            )
+        return response
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:40
+
+import logging
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+logger = logging.getLogger(__name__)
+
+
+def remove_duplicate_slots(apps, schema_editor):
+    """Keep the first booking of every double-booked slot - the constraint below can't be added over them.
+
+    The barber and massage pages never checked for conflicts, so older
+    databases can have several appointments per slot. The later ones are
+    logged (with their contact details, to call them) and deleted.
+    """
+    Appointment = apps.get_model('foglalas', 'Appointment')
+    duplicates = (
+        Appointment.objects.values('business_id', 'date', 'time', 'service_type')
+        .annotate(count=Count('id'), first=Min('id'))
+        .filter(count__gt=1)
+        .order_by()
+    )
+    for slot in list(duplicates):
+        first = slot.pop('first')
+        slot.pop('count')
+        later = Appointment.objects.filter(**slot).exclude(pk=first)
+        for appointment in later:
+            logger.warning(
+                "Removing double booking %s of business %s on %s %s (%s): %s, %s, %s - slot kept for #%s",
+                appointment.pk, slot['business_id'], slot['date'], slot['time'], slot['service_type'],
+                appointment.name, appointment.phone, appointment.email, first,
+            )
+        later.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foglalas', '0004_auto_20250822_0842'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_slots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(fields=('business', 'date', 'time', 'service_type'), name='unique_appointment_slot'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foglalas', '0005_appointment_unique_slot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['business', 'date', 'service_type', 'time'], name='appt_business_date_svc_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foglalas', '0006_appointment_availability_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='appointment',
+            name='appt_business_date_svc_idx',
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='duration',
+            field=models.PositiveIntegerField(blank=True, help_text='Percben', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['business', 'date', 'service_type', 'time', 'duration'], name='appt_business_date_svc_idx'),
+        ),
+    ]
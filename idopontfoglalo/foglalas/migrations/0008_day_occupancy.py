@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def build_occupancy(apps, schema_editor):
+    """Fill DayOccupancy from the existing appointments.
+
+    A frozen copy of foglalas.occupancy as of this migration: every
+    booking fills its slots (there is no capacity above one yet).
+    """
+    Appointment = apps.get_model('foglalas', 'Appointment')
+    DayOccupancy = apps.get_model('foglalas', 'DayOccupancy')
+    masks = {}
+    rows = Appointment.objects.values_list(
+        'business_id', 'date', 'service_type', 'time', 'duration', 'business__time_interval',
+    ).order_by()
+    for business_id, day, service_type, slot, duration, interval in rows.iterator(chunk_size=2000):
+        start = slot.hour * 60 + slot.minute
+        first = start // interval
+        last = min(-(-(start + (duration or interval)) // interval), MINUTES_PER_DAY // interval)
+        key = (business_id, day, service_type)
+        _, mask = masks.get(key, (interval, 0))
+        if last > first:
+            mask |= ((1 << (last - first)) - 1) << first
+        masks[key] = (interval, mask)
+    DayOccupancy.objects.bulk_create(
+        [
+            DayOccupancy(business_id=key[0], date=key[1], service_type=key[2], interval=interval, mask=mask)
+            for key, (interval, mask) in masks.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foglalas', '0007_appointment_duration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DayOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('service_type', models.CharField(choices=[('massage', 'Masszázs'), ('barber', 'Fodrász'), ('personal', 'Személyes konzultáció')], max_length=20)),
+                ('interval', models.PositiveSmallIntegerField(help_text='Slot length in minutes the mask was built with')),
+                ('mask', models.BigIntegerField(default=0)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='foglalas.business')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('business', 'date', 'service_type'), name='unique_day_occupancy')],
+            },
+        ),
+        migrations.RunPython(build_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foglalas', '0008_day_occupancy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAppointment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('service_type', models.CharField(choices=[('massage', 'Masszázs'), ('barber', 'Fodrász'), ('personal', 'Személyes konzultáció')], max_length=20)),
+                ('name', models.CharField(max_length=100)),
+                ('phone', models.CharField(max_length=20)),
+                ('email', models.EmailField(max_length=254)),
+                ('date', models.DateField()),
+                ('time', models.TimeField()),
+                ('duration', models.PositiveIntegerField(blank=True, help_text='Percben', null=True)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='foglalas.business')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['business', 'date'], name='archived_business_date_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foglalas', '0009_archived_appointment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Resource',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('is_active', models.BooleanField(default=True, help_text='Csak az aktív erőforrásokra lehet foglalni')),
+            ],
+        ),
+        migrations.RemoveConstraint(
+            model_name='appointment',
+            name='unique_appointment_slot',
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='business',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='foglalas.business'),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='resource',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.RESTRICT, to='foglalas.resource'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('resource__isnull', True)), fields=('business', 'date', 'time', 'service_type'), name='unique_appointment_slot'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(fields=('resource', 'date', 'time', 'service_type'), name='unique_resource_slot'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foglalas', '0010_resources'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedappointment',
+            name='resource',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='foglalas.resource'),
+        ),
+    ]
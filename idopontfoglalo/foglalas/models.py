@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 
 class Business(models.Model):
     INTERVAL_CHOICES = [
@@ -26,6 +26,20 @@ class Service(models.Model):
     def __str__(self):
         return f"{self.name} ({self.business.name})"
 
+
+class Resource(models.Model):
+    """A chair, room or staff member - a business takes as many bookings per slot as it has active resources.
+
+    A business without resources takes one, as before; see foglalas.booking.
+    """
+    business = models.ForeignKey(Business, on_delete=models.CASCADE)
+    name = models.CharField(max_length=100)
+    is_active = models.BooleanField(default=True, help_text="Csak az aktív erőforrásokra lehet foglalni")
+
+    def __str__(self):
+        return f"{self.name} ({self.business.name})"
+
+
 class Appointment(models.Model):
     SERVICE_TYPE_CHOICES = [
         ('massage', 'Masszázs'),
@@ -40,7 +54,97 @@ class Appointment(models.Model):
     email = models.EmailField()
     date = models.DateField()
     time = models.TimeField()
+    # Percben - empty means one slot (the business time_interval)
+    duration = models.PositiveIntegerField(null=True, blank=True, help_text="Percben")
+    # Assigned on booking at businesses that have resources; empty otherwise
+    # (imported and admin-made bookings still take up one of the capacity)
+    resource = models.ForeignKey(Resource, null=True, blank=True, on_delete=models.RESTRICT)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            # One booking per slot (per resource, where one is assigned) -
+            # enforced by the database so concurrent requests cannot
+            # double-book (see foglalas.booking)
+            models.UniqueConstraint(
+                fields=['business', 'date', 'time', 'service_type'],
+                condition=models.Q(resource__isnull=True),
+                name='unique_appointment_slot',
+            ),
+            models.UniqueConstraint(
+                fields=['resource', 'date', 'time', 'service_type'],
+                name='unique_resource_slot',
+            ),
+        ]
+        indexes = [
+            # Availability lookups filter on (business, date[, service_type])
+            # and only read `time` and `duration` - both shapes are answered
+            # from this index alone.
+            models.Index(
+                fields=['business', 'date', 'service_type', 'time', 'duration'],
+                name='appt_business_date_svc_idx',
+            ),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.get_service_type_display()} - {self.business.name} - {self.date} {self.time}"
+
+    def save(self, *args, **kwargs):
+        # The post_save signal updates DayOccupancy - keep both writes in one transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class ArchivedAppointment(models.Model):
+    """A past Appointment moved out of the live table by `manage.py archive_appointments`.
+
+    Keeps the appointment's id; read both tables through foglalas.archive.appointment_history().
+    """
+    id = models.BigIntegerField(primary_key=True)
+    business = models.ForeignKey(Business, on_delete=models.CASCADE)
+    service_type = models.CharField(max_length=20, choices=Appointment.SERVICE_TYPE_CHOICES)
+    name = models.CharField(max_length=100)
+    phone = models.CharField(max_length=20)
+    email = models.EmailField()
+    date = models.DateField()
+    time = models.TimeField()
+    duration = models.PositiveIntegerField(null=True, blank=True, help_text="Percben")
+    # Kept for the history; a resource removed since only loses the link
+    resource = models.ForeignKey(Resource, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['business', 'date'], name='archived_business_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} - {self.get_service_type_display()} - {self.business.name} - {self.date} {self.time}"
+
+
+class DayOccupancy(models.Model):
+    """Full slots of one (business, date, service_type) as a bitmask, kept in step with Appointment.
+
+    A slot is full when it has as many bookings as the business has
+    resources (one without resources).
+
+    Bit i is the slot starting i * interval minutes after midnight; see
+    foglalas.occupancy. Rebuild with `manage.py rebuild_occupancy`.
+    """
+    business = models.ForeignKey(Business, on_delete=models.CASCADE)
+    date = models.DateField()
+    service_type = models.CharField(max_length=20, choices=Appointment.SERVICE_TYPE_CHOICES)
+    interval = models.PositiveSmallIntegerField(help_text="Slot length in minutes the mask was built with")
+    mask = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['business', 'date', 'service_type'],
+                name='unique_day_occupancy',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.business_id} {self.date} {self.service_type}: {self.mask:b}"
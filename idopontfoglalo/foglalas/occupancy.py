@@ -0,0 +1,234 @@
+"""DayOccupancy - the full slots of a (business, date, service_type) as one bitmask.
+
+Bit i stands for the i-th slot of the day, i * interval minutes after
+midnight, where interval is the business time_interval the row was built
+with (30 or 60 minutes, so a day fits in 48 bits). A slot is full when its
+bookings reach the capacity of the business - its number of active
+resources, or one without resources, where full simply means booked.
+Every Appointment write keeps the row up to date in the same transaction;
+the rebuild_occupancy command recomputes or checks the rows from the
+Appointment table.
+"""
+from collections import defaultdict
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.lookups import Exact
+from .models import Appointment, DayOccupancy, Resource
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def slot_mask(start_minute, length, interval):
+    """Bits of the slots [start_minute, start_minute + length) touches"""
+    first = start_minute // interval
+    last = min(-(-(start_minute + length) // interval), MINUTES_PER_DAY // interval)
+    return ((1 << (last - first)) - 1) << first if last > first else 0
+
+
+def appointment_mask(slot, duration, interval):
+    """Bits of a booking at `slot` (datetime.time) lasting duration minutes (default: one slot)"""
+    return slot_mask(slot.hour * 60 + slot.minute, duration or interval, interval)
+
+
+def capacity_mask(bookings, interval, capacity):
+    """Bits of the slots that (time, duration, count) bookings take `capacity` times or more"""
+    if capacity <= 1:
+        mask = 0
+        for slot, duration, _ in bookings:
+            mask |= appointment_mask(slot, duration, interval)
+        return mask
+    counts = defaultdict(int)
+    for slot, duration, count in bookings:
+        bits = appointment_mask(slot, duration, interval)
+        while bits:
+            low = bits & -bits
+            counts[low] += count
+            bits ^= low
+    mask = 0
+    for bit, count in counts.items():
+        if count >= capacity:
+            mask |= bit
+    return mask
+
+
+def resource_capacities():
+    """{business_id: number of active resources} of the businesses that have any, in one query"""
+    return dict(
+        Resource.objects.filter(is_active=True).values('business_id').annotate(n=Count('pk'))
+        .order_by().values_list('business_id', 'n')
+    )
+
+
+def mask_bookings(mask, interval):
+    """(start minute, length) pairs of the runs of set bits, in order"""
+    bookings = []
+    index = 0
+    while mask:
+        if mask & 1:
+            run = 0
+            while mask & 1:
+                mask >>= 1
+                run += 1
+            bookings.append((index * interval, run * interval))
+            index += run
+        else:
+            # Skip the whole run of zeros at once
+            zeros = (mask & -mask).bit_length() - 1
+            mask >>= zeros
+            index += zeros
+    return tuple(bookings)
+
+
+def occupy(business, day, service_type, bits):
+    """Set bits on the day's row unless one of them is already set - returns False on a clash.
+
+    The check and the write are one conditional UPDATE, so two concurrent
+    bookings of overlapping slots cannot both succeed. Run it in the
+    transaction that inserts the appointment.
+    """
+    free = DayOccupancy.objects.filter(business=business, date=day, service_type=service_type).filter(
+        Exact(F('mask').bitand(bits), 0)
+    )
+    if free.update(mask=F('mask').bitor(bits)):
+        return True
+    try:
+        with transaction.atomic():
+            DayOccupancy.objects.create(
+                business=business, date=day, service_type=service_type,
+                interval=business.time_interval, mask=bits,
+            )
+        return True
+    except IntegrityError:
+        # The row exists: either it clashes, or a concurrent booking created it just now
+        return bool(free.update(mask=F('mask').bitor(bits)))
+
+
+def record(business, day, service_type, bits):
+    """Set bits on the day's row without checking them (bookings already accepted elsewhere)"""
+    rows = DayOccupancy.objects.filter(business=business, date=day, service_type=service_type)
+    if rows.update(mask=F('mask').bitor(bits)):
+        return
+    try:
+        with transaction.atomic():
+            DayOccupancy.objects.create(
+                business=business, date=day, service_type=service_type,
+                interval=business.time_interval, mask=bits,
+            )
+    except IntegrityError:
+        rows.update(mask=F('mask').bitor(bits))
+
+
+def expected_masks(keys=None, business_id=None):
+    """{(business_id, date, service_type): (interval, mask)} computed from the appointments.
+
+    keys limits it to those days (days without appointments are left out);
+    otherwise every day, optionally of one business. The bookings are
+    counted per slot with one GROUP BY query and compared with the
+    capacities.
+    """
+    appointments = Appointment.objects.all()
+    if keys is not None:
+        appointments = appointments.filter(
+            business_id__in={key[0] for key in keys},
+            date__in={key[1] for key in keys},
+            service_type__in={key[2] for key in keys},
+        )
+    if business_id is not None:
+        appointments = appointments.filter(business_id=business_id)
+
+    capacities = resource_capacities()
+    masks = {}
+    shared = defaultdict(list)  # key -> (time, duration, count) of days with more capacity
+    rows = (
+        appointments
+        .values_list('business_id', 'date', 'service_type', 'time', 'duration', 'business__time_interval')
+        .annotate(n=Count('pk')).order_by()
+    )
+    for pk, day, service_type, slot, duration, interval, count in rows.iterator(chunk_size=2000):
+        key = (pk, day, service_type)
+        if keys is not None and key not in keys:
+            continue
+        if capacities.get(pk, 1) > 1:
+            masks[key] = (interval, 0)
+            shared[key].append((slot, duration, count))
+        else:
+            _, mask = masks.get(key, (interval, 0))
+            masks[key] = (interval, mask | appointment_mask(slot, duration, interval))
+    for key, bookings in shared.items():
+        interval, _ = masks[key]
+        masks[key] = (interval, capacity_mask(bookings, interval, capacities[key[0]]))
+    return masks
+
+
+def rebuild_occupancy(keys=None, business_id=None):
+    """Recompute DayOccupancy rows from Appointment - for the given keys, one business or everything.
+
+    Returns the number of rows written.
+    """
+    if keys is not None:
+        keys = set(keys)
+        if not keys:
+            return 0
+    masks = expected_masks(keys, business_id)
+
+    with transaction.atomic():
+        if keys is not None:
+            for business, day, service_type in keys - masks.keys():
+                DayOccupancy.objects.filter(business_id=business, date=day, service_type=service_type).delete()
+        else:
+            stale = DayOccupancy.objects.all()
+            if business_id is not None:
+                stale = stale.filter(business_id=business_id)
+            stale.delete()
+        DayOccupancy.objects.bulk_create(
+            [
+                DayOccupancy(business_id=key[0], date=key[1], service_type=key[2], interval=interval, mask=mask)
+                for key, (interval, mask) in masks.items()
+            ],
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['business', 'date', 'service_type'],
+            update_fields=['interval', 'mask'],
+        )
+    return len(masks)
+
+
+def day_masks(keys):
+    """{key: mask} of the DayOccupancy rows of (business_id, date, service_type) keys, in one query"""
+    if not keys:
+        return {}
+    rows = DayOccupancy.objects.filter(
+        business_id__in={key[0] for key in keys},
+        date__in={key[1] for key in keys},
+        service_type__in={key[2] for key in keys},
+    ).values_list('business_id', 'date', 'service_type', 'mask')
+    return {(pk, day, service_type): mask for pk, day, service_type, mask in rows if (pk, day, service_type) in keys}
+
+
+def rebuild_changes(keys):
+    """rebuild_occupancy(keys), returning {key: bits of the slots that became full or free}"""
+    keys = set(keys)
+    before = day_masks(keys)
+    rebuild_occupancy(keys)
+    after = day_masks(keys)
+    return {key: before.get(key, 0) ^ after.get(key, 0) for key in keys}
+
+
+def occupancy_differences(business_id=None):
+    """Keys whose DayOccupancy row doesn't match the appointments, as (key, expected, actual)"""
+    # Days with bookings but no full slot have no bits to compare, like days without a row
+    expected = {key: value for key, value in expected_masks(business_id=business_id).items() if value[1]}
+    rows = DayOccupancy.objects.all()
+    if business_id is not None:
+        rows = rows.filter(business_id=business_id)
+    actual = {
+        (pk, day, service_type): (interval, mask)
+        for pk, day, service_type, interval, mask
+        in rows.values_list('business_id', 'date', 'service_type', 'interval', 'mask').iterator()
+        if mask
+    }
+    return [
+        (key, expected.get(key), actual.get(key))
+        for key in sorted(expected.keys() | actual.keys())
+        if expected.get(key) != actual.get(key)
+    ]
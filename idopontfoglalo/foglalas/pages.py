@@ -0,0 +1,78 @@
+"""Caching of the public pages, which only change with Business and Service.
+
+Every cached page and fragment is keyed on a site version stored in the
+cache. The Business/Service signals replace the version, so all workers
+sharing the cache stop using the old entries at once; those just expire.
+The time of the change is kept with the version, and a worker whose
+registry snapshot is older reloads it before rendering, so a page is never cached
+under the new version with stale data.
+"""
+import time
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from .registry import invalidate_registry_before
+
+VERSION_KEY = 'pages:version'
+
+
+def _cache():
+    return caches[getattr(settings, 'PAGE_CACHE_ALIAS', 'default')]
+
+
+def _state():
+    # (version, time of the last Business/Service change)
+    cache = _cache()
+    state = cache.get(VERSION_KEY)
+    if state is None:
+        # A new version rather than 1, so an evicted one can't bring old pages back;
+        # nothing changed though, so the registries can stay
+        state = (time.time_ns(), 0)
+        if not cache.add(VERSION_KEY, state, None):
+            state = cache.get(VERSION_KEY, state)
+    return state
+
+
+def page_version():
+    """Current site version - part of every page and fragment cache key"""
+    version, changed_at = _state()
+    invalidate_registry_before(changed_at)
+    return version
+
+
+def invalidate_pages():
+    now = time.time_ns()
+    _cache().set(VERSION_KEY, (now, now), None)
+
+
+def fragment_context():
+    """Template variables of the {% cache %} tags: page_cache_timeout and page_version"""
+    return {'page_cache_timeout': getattr(settings, 'PAGE_CACHE_TIMEOUT', 3600), 'page_version': page_version()}
+
+
+def page_cache_key(request):
+    # The pages don't read the query string, so ?utm_... doesn't get entries of its own
+    return f'pages:{page_version()}:{request.path}'
+
+
+def cached_page(view):
+    """Serve a view's GET response from the page cache until Business or Service changes.
+
+    Only for views whose output depends on nothing but the URL: responses
+    that set cookies or Vary (session, CSRF) are never stored.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+        cache = _cache()
+        key = page_cache_key(request)
+        response = cache.get(key)
+        if response is not None:
+            return response
+        response = view(request, *args, **kwargs)
+        if (request.method == 'GET' and response.status_code == 200 and not response.streaming
+                and not response.cookies and not response.has_header('Vary')):
+            cache.set(key, response, getattr(settings, 'PAGE_CACHE_TIMEOUT', 3600))
+        return response
+    return wrapper
@@ -0,0 +1,144 @@
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .models import Business, Resource, Service
+
+# The whole business table is tiny, so it is loaded at once (three queries)
+# and kept per process. Business/Service/Resource signals drop the snapshot in this
+# process; the TTL makes the other workers pick up changes too.
+_lock = threading.Lock()
+_snapshot = None
+_generation = 0
+
+
+class _Snapshot:
+    def __init__(self):
+        self.loaded_at = time.time_ns()
+        businesses = list(Business.objects.order_by('pk'))
+        by_id = {business.pk: business for business in businesses}
+        services = {business.pk: [] for business in businesses}
+        for service in Service.objects.order_by('pk'):
+            if service.business_id in by_id:
+                # Share the cached Business so Service.__str__ doesn't query it
+                service.business = by_id[service.business_id]
+                services[service.business_id].append(service)
+        resources = {business.pk: [] for business in businesses}
+        for resource in Resource.objects.filter(is_active=True).order_by('pk'):
+            if resource.business_id in by_id:
+                resource.business = by_id[resource.business_id]
+                resources[resource.business_id].append(resource)
+
+        self.businesses = tuple(businesses)
+        self.by_slug = {business.slug: business for business in businesses}
+        self.services = {pk: tuple(items) for pk, items in services.items()}
+        self.resources = {pk: tuple(items) for pk, items in resources.items()}
+        self.expires = time.monotonic() + getattr(settings, 'BUSINESS_REGISTRY_TTL', 60)
+
+
+def _current():
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot is None or snapshot.expires <= time.monotonic():
+        with _lock:
+            snapshot = _snapshot
+            if snapshot is None or snapshot.expires <= time.monotonic():
+                generation = _generation
+                snapshot = _Snapshot()
+                # Don't keep a snapshot that an invalidation raced past
+                if generation == _generation:
+                    _snapshot = snapshot
+    return snapshot
+
+
+async def _acurrent():
+    # A fresh snapshot is served without leaving the event loop
+    snapshot = _snapshot
+    if snapshot is None or snapshot.expires <= time.monotonic():
+        snapshot = await sync_to_async(_current)()
+    return snapshot
+
+
+def get_business(slug):
+    """Business by slug from the registry - raises Business.DoesNotExist like objects.get()"""
+    try:
+        return _current().by_slug[slug]
+    except KeyError:
+        raise Business.DoesNotExist(f"No business with slug {slug!r}") from None
+
+
+def find_business(slug):
+    """Business by slug from the registry, or None"""
+    return _current().by_slug.get(slug)
+
+
+def first_business():
+    """Business with the lowest id (what Business.objects.first() returns), or None"""
+    businesses = _current().businesses
+    return businesses[0] if businesses else None
+
+
+def get_services(business):
+    """Services of a business as a tuple, in id order"""
+    if business is None:
+        return ()
+    return _current().services.get(business.pk, ())
+
+
+def get_service(business, service_id):
+    """One of the business's services by id - raises Service.DoesNotExist if it isn't one"""
+    for service in get_services(business):
+        if str(service.pk) == str(service_id):
+            return service
+    raise Service.DoesNotExist(f"No service {service_id!r} for {business}")
+
+
+def get_resources(business):
+    """Active resources of a business as a tuple, in id order - empty for single-capacity businesses"""
+    return _current().resources.get(business.pk, ())
+
+
+def get_capacity(business):
+    """Bookings a slot of the business can take: its number of active resources, at least one"""
+    return len(get_resources(business)) or 1
+
+
+async def aget_business(slug):
+    """get_business for async views"""
+    try:
+        return (await _acurrent()).by_slug[slug]
+    except KeyError:
+        raise Business.DoesNotExist(f"No business with slug {slug!r}") from None
+
+
+async def afirst_business():
+    """first_business for async views"""
+    businesses = (await _acurrent()).businesses
+    return businesses[0] if businesses else None
+
+
+async def aget_service(business, service_id):
+    """get_service for async views"""
+    for service in (await _acurrent()).services.get(business.pk, ()):
+        if str(service.pk) == str(service_id):
+            return service
+    raise Service.DoesNotExist(f"No service {service_id!r} for {business}")
+
+
+async def aget_capacity(business):
+    """get_capacity for async views"""
+    return len((await _acurrent()).resources.get(business.pk, ())) or 1
+
+
+def invalidate_registry_before(timestamp_ns):
+    """Drop the snapshot if it was loaded before timestamp_ns (a time.time_ns() value)"""
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.loaded_at < timestamp_ns:
+        invalidate_registry()
+
+
+def invalidate_registry():
+    """Drop the snapshot - the next lookup reloads it"""
+    global _snapshot, _generation
+    _generation += 1
+    _snapshot = None
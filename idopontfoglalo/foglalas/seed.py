@@ -0,0 +1,75 @@
+"""Initial businesses - the single copy of the seed data.
+
+Used by data migration 0004, the setup_businesses command and the
+foglalas.E001 ready check. Request handlers never seed or probe for it.
+"""
+
+INITIAL_BUSINESSES = (
+    {
+        'name': 'Stílus Fodrászat',
+        'slug': 'stilus-fodraszat',
+        'description': 'Professzionális fodrász szolgáltatások minden korosztály számára.',
+        'address': '1052 Budapest, Váci utca 15.',
+        'phone': '+36 1 234 5678',
+        'email': 'info@stilusfodraszat.hu',
+        'time_interval': 30,
+    },
+    {
+        'name': 'Harmónia Masszázs Szalon',
+        'slug': 'harmonia-masszazs',
+        'description': 'Relaxáló masszázs és wellness szolgáltatások a belvárosban.',
+        'address': '1051 Budapest, József Attila utca 12.',
+        'phone': '+36 1 345 6789',
+        'email': 'info@harmoniamasszazs.hu',
+        'time_interval': 60,
+    },
+    {
+        'name': 'Szakértői Tanácsadás',
+        'slug': 'szakertoi-tanacsadas',
+        'description': 'Személyre szabott konzultáció és szakértői tanácsadás.',
+        'address': '1053 Budapest, Kossuth Lajos utca 8.',
+        'phone': '+36 1 456 7890',
+        'email': 'info@szakertoi-tanacsadas.hu',
+        'time_interval': 60,
+    },
+)
+
+INITIAL_SLUGS = tuple(business['slug'] for business in INITIAL_BUSINESSES)
+
+
+def _business_model(business_model):
+    if business_model is None:
+        from .models import Business
+        return Business
+    return business_model
+
+
+def seed_businesses(business_model=None, force=False):
+    """Create the missing initial businesses, idempotently.
+
+    With force, existing ones are updated to the seed data too. Migrations
+    pass their historical Business model. Returns (created, updated) lists.
+    """
+    Business = _business_model(business_model)
+    created, updated = [], []
+    for business_data in INITIAL_BUSINESSES:
+        business, was_created = Business.objects.get_or_create(
+            slug=business_data['slug'],
+            defaults=business_data
+        )
+        if was_created:
+            created.append(business)
+        elif force:
+            for key, value in business_data.items():
+                if key != 'slug':  # Don't update slug as it's the unique identifier
+                    setattr(business, key, value)
+            business.save()
+            updated.append(business)
+    return created, updated
+
+
+def missing_business_slugs(business_model=None):
+    """Initial business slugs not present in the database"""
+    Business = _business_model(business_model)
+    existing = set(Business.objects.filter(slug__in=INITIAL_SLUGS).values_list('slug', flat=True))
+    return [slug for slug in INITIAL_SLUGS if slug not in existing]
@@ -0,0 +1,131 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from .availability import invalidate_availability
+from .events import SLOT_FREED, SLOT_TAKEN, publish_slot_change
+from .models import Appointment, Business, DayOccupancy, Resource, Service
+from .occupancy import appointment_mask, rebuild_changes, rebuild_occupancy, record
+from .pages import invalidate_pages
+from .registry import get_resources, invalidate_registry
+
+
+def _slot_key(appointment):
+    return (appointment.business_id, appointment.date, appointment.service_type)
+
+
+def _publish(kind, instance, key, booking, changed=None):
+    """Announce the booking's slots - only if they became full or free, when changed ({key: bits}) is given"""
+    business_id, day, service_type = key
+    if business_id == instance.business_id:
+        business = instance.business
+    else:
+        business = Business.objects.filter(pk=business_id).first()
+    if business is None:
+        return
+    if changed is not None and not changed.get(key, 0) & appointment_mask(*booking, business.time_interval):
+        # Still room left (or still full) - the free times shown don't change
+        return
+    publish_slot_change(kind, business, day, service_type, *booking)
+
+
+def _rebuild(instance, keys):
+    """Recompute the days - returns the changed bits at a business with resources, None otherwise.
+
+    Without resources every booking fills its slots, so its events are
+    always sent; with them only a booking that fills up or frees a slot is
+    announced.
+    """
+    if get_resources(instance.business):
+        return rebuild_changes(keys)
+    rebuild_occupancy(keys)
+    return None
+
+
+@receiver(post_init, sender=Appointment)
+def remember_appointment_slot(sender, instance, **kwargs):
+    """Keep the loaded slot so an edit that moves the booking also frees the old day"""
+    # Read __dict__ directly - touching a deferred field here would cost a query
+    fields = instance.__dict__
+    instance._loaded_slot = (fields.get('business_id'), fields.get('date'), fields.get('service_type'))
+    instance._loaded_booking = (fields.get('time'), fields.get('duration'))
+
+
+@receiver(post_save, sender=Appointment)
+def appointment_saved(sender, instance, created, **kwargs):
+    current = _slot_key(instance)
+    previous = getattr(instance, '_loaded_slot', None)
+    moved = previous and previous != current and previous[0] is not None
+
+    # Runs inside Appointment.save()'s transaction
+    changed = None
+    if created:
+        if getattr(instance, '_occupancy_recorded', False):
+            # create_appointment tells which slots a booking with a resource filled up
+            filled = getattr(instance, '_filled_slots', None)
+            if filled is not None:
+                changed = {current: filled}
+        elif get_resources(instance.business):
+            # Whether the slots are full depends on the other bookings too
+            changed = rebuild_changes({current})
+        else:
+            business = instance.business
+            record(business, instance.date, instance.service_type,
+                   appointment_mask(instance.time, instance.duration, business.time_interval))
+    else:
+        # The time or duration may have changed - recompute the day(s)
+        changed = _rebuild(instance, {current, previous} if moved else {current})
+
+    invalidate_availability(*current)
+    if moved:
+        invalidate_availability(*previous)
+
+    booking = (instance.time, instance.duration)
+    previous_booking = getattr(instance, '_loaded_booking', (None, None))
+    if created:
+        _publish(SLOT_TAKEN, instance, current, booking, changed)
+    elif moved or booking != previous_booking:
+        if previous and previous[0] is not None and previous_booking[0] is not None:
+            _publish(SLOT_FREED, instance, previous, previous_booking, changed)
+        _publish(SLOT_TAKEN, instance, current, booking, changed)
+    instance._loaded_slot = current
+    instance._loaded_booking = booking
+
+
+@receiver(post_delete, sender=Appointment)
+def appointment_deleted(sender, instance, **kwargs):
+    # Inside the delete's transaction; other bookings may share the slots, so recompute
+    changed = _rebuild(instance, {_slot_key(instance)})
+    invalidate_availability(*_slot_key(instance))
+    _publish(SLOT_FREED, instance, _slot_key(instance), (instance.time, instance.duration), changed)
+
+
+@receiver(post_save, sender=Business)
+def business_interval_changed(sender, instance, created, **kwargs):
+    """Occupancy masks are per time_interval slot - rebuild them when the interval changes"""
+    if not created and DayOccupancy.objects.filter(business=instance).exclude(interval=instance.time_interval).exists():
+        rebuild_occupancy(business_id=instance.pk)
+
+
+@receiver(post_save, sender=Resource)
+@receiver(post_delete, sender=Resource)
+def capacity_changed(sender, instance, **kwargs):
+    """A resource added, removed or (de)activated changes which slots are full"""
+    rebuild_occupancy(business_id=instance.business_id)
+    for business_id, day, service_type in DayOccupancy.objects.filter(
+        business_id=instance.business_id,
+    ).values_list('business_id', 'date', 'service_type'):
+        invalidate_availability(business_id, day, service_type)
+
+
+@receiver(post_save, sender=Business)
+@receiver(post_delete, sender=Business)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Resource)
+@receiver(post_delete, sender=Resource)
+def business_changed(sender, **kwargs):
+    invalidate_registry()
+    invalidate_pages()
+    # Again after commit, in case a request reloaded the pre-commit state meanwhile
+    transaction.on_commit(invalidate_registry)
+    transaction.on_commit(invalidate_pages)
@@ -0,0 +1,34 @@
+from datetime import time
+from functools import lru_cache
+from typing import NamedTuple
+
+
+class SlotGrid(NamedTuple):
+    """Immutable list of a day's bookable slots for one (interval, opening hours) setup"""
+    times: tuple        # slot start times as datetime.time
+    labels: tuple       # slot starts formatted as 'HH:MM'
+    minutes: tuple      # slot starts as minutes since midnight
+
+
+@lru_cache(maxsize=64)
+def get_slot_grid(interval_minutes, start_hour, end_hour, include_closing_time=True):
+    """Build the slot grid once per key and serve it from memory afterwards.
+
+    With include_closing_time a slot may start at end_hour:00 (the
+    get_available_times behaviour); without it every slot has to end by
+    end_hour (the get_slots behaviour).
+    """
+    close = end_hour * 60
+    last_start = close if include_closing_time else close - interval_minutes
+
+    starts = range(start_hour * 60, last_start + 1, interval_minutes)
+    return SlotGrid(
+        tuple(time(hour=minutes // 60, minute=minutes % 60) for minutes in starts),
+        tuple(minutes_label(minutes) for minutes in starts),
+        tuple(starts),
+    )
+
+
+def minutes_label(minutes):
+    """'HH:MM' for a number of minutes since midnight"""
+    return f"{minutes // 60 % 24:02d}:{minutes % 60:02d}"
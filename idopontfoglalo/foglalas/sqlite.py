@@ -0,0 +1,20 @@
+"""Opt-in SQLite profile for single-node deployments (SQLITE_PERFORMANCE=1 in the environment).
+
+The default rollback journal locks the whole file while a booking commits,
+so concurrent requests fail with "database is locked". In WAL mode readers
+keep reading the last committed state while a write is in progress;
+busy_timeout makes writers queue for the lock instead of failing, and
+synchronous=NORMAL is safe with WAL (a power cut can lose the last
+commits, not corrupt the file).
+"""
+from django.conf import settings
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """connection_created receiver - runs settings.SQLITE_PRAGMAS on every new SQLite connection"""
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', None)
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+    # On the raw connection: the query counter and debug log shouldn't see these
+    for name, value in pragmas.items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
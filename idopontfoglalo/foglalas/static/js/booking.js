@@ -1,5 +1,6 @@
 // ====================================
-// ENHANCED BOOKING SYSTEM FOR HARMÓNIA MASSZÁZS SZALON
+// SHARED BOOKING FORM - barber, massage and foglalas
+// The form's data-api attribute is the app's API prefix, e.g. "/massage/api/"
 // ====================================
 
 document.addEventListener("DOMContentLoaded", function () {
@@ -18,6 +19,13 @@ document.addEventListener("DOMContentLoaded", function () {
   }
   
   const business = businessElement.value;
+  const api = bookingForm.dataset.api;
+
+  // Free times per day, prefetched a month at a time from the range endpoint
+  const availabilityCache = {};
+  const fullyBookedDays = new Set();
+  // ETag and times of the last per-day answer, sent back as If-None-Match
+  const dayValidators = {};
 
   console.log('Booking system initialization started');
   console.log('Business slug:', business);
@@ -44,9 +52,14 @@ document.addEventListener("DOMContentLoaded", function () {
       // Disable Sundays (day 0)
       function(date) {
         return (date.getDay() === 0);
+      },
+      // Disable days with no free slot left
+      function(date) {
+        return fullyBookedDays.has(toIsoDate(date));
       }
     ],
     onChange: function (selectedDates, dateStr) {
+      watchSlotEvents(dateStr);
       if (dateStr) {
         fetchAvailableTimes(business, dateStr);
         updateSummary();
@@ -58,6 +71,10 @@ document.addEventListener("DOMContentLoaded", function () {
     onReady: function(selectedDates, dateStr, instance) {
       // Add some styling to the calendar
       instance.calendarContainer.classList.add('flatpickr-custom');
+      prefetchMonth(instance.currentYear, instance.currentMonth);
+    },
+    onMonthChange: function(selectedDates, dateStr, instance) {
+      prefetchMonth(instance.currentYear, instance.currentMonth);
     }
   });
   console.log('Flatpickr initialized successfully');
@@ -67,6 +84,7 @@ document.addEventListener("DOMContentLoaded", function () {
     dateInput.type = 'date';
     dateInput.addEventListener('change', function() {
       const dateStr = this.value;
+      watchSlotEvents(dateStr);
       if (dateStr) {
         fetchAvailableTimes(business, dateStr);
         updateSummary();
@@ -77,69 +95,53 @@ document.addEventListener("DOMContentLoaded", function () {
     });
   }
 
-  function fetchAvailableTimes(business, date, retryCount = 0) {
+  // keepTime: the time chosen before a live refresh, selected again if still free
+  function fetchAvailableTimes(business, date, keepTime) {
     const timeSelect = document.getElementById('time');
     if (!timeSelect) {
       console.error('Time select element not found');
-      showNotification('Hiba: Az időpont kiválasztó nem található', 'error');
       return;
     }
     
-    // Validate inputs before making API call
-    if (!business || !date) {
-      console.error('Missing required parameters:', { business, date });
-      timeSelect.innerHTML = '<option value="">Hiányozó paraméterek</option>';
-      timeSelect.disabled = true;
-      showNotification('Hiba: Hiányzó paraméterek', 'error');
+    if (availabilityCache[date]) {
+      renderTimes(availabilityCache[date], keepTime);
       return;
     }
 
-    // Validate date format
-    const dateRegex = /^\d{4}-\d{2}-\d{2}$/;
-    if (!dateRegex.test(date)) {
-      console.error('Invalid date format:', date);
-      timeSelect.innerHTML = '<option value="">Érvénytelen dátum formátum</option>';
-      timeSelect.disabled = true;
-      showNotification('Hiba: Érvénytelen dátum formátum', 'error');
-      return;
-    }
-    
-    console.log('Fetching available times for:', { business, date, retryCount });
+    console.log('Fetching available times for:', { business, date });
     
-    // Show loading state with retry indicator
-    const loadingText = retryCount > 0 ? 
-      `Időpontok betöltése... (újrapróbálkozás ${retryCount + 1}/3)` : 
-      'Időpontok betöltése...';
-    timeSelect.innerHTML = `<option value="">${loadingText}</option>`;
+    // Show loading state
+    timeSelect.innerHTML = '<option value="">Időpontok betöltése...</option>';
     timeSelect.disabled = true;
 
-    const url = `/api/available-times/?business=${encodeURIComponent(business)}&date=${encodeURIComponent(date)}`;
+    const url = `${api}available-times/?business=${encodeURIComponent(business)}&date=${encodeURIComponent(date)}`;
     console.log('API URL:', url);
 
-    const fetchWithTimeout = (url, options, timeout = 10000) => {
-      return new Promise((resolve, reject) => {
-        const timer = setTimeout(() => {
-          reject(new Error('Időtúllépés: A kérés túl sokáig tartott'));
-        }, timeout);
-
-        fetch(url, options)
-          .then(response => {
-            clearTimeout(timer);
-            resolve(response);
-          })
-          .catch(error => {
-            clearTimeout(timer);
-            reject(error);
-          });
-      });
-    };
+    const headers = { 'Accept': 'application/json' };
+    const validator = dayValidators[date];
+    if (validator) {
+      headers['If-None-Match'] = validator.etag;
+    }
 
-    fetchWithTimeout(url, { 
-      headers: { 'Accept': 'application/json' },
-      method: 'GET'
+    // no-store: the validator is handled here, a 304 must reach this code
+    fetch(url, {
+      headers: headers,
+      method: 'GET',
+      cache: 'no-store'
     })
       .then(response => {
         console.log('API Response status:', response.status);
+        if (response.status === 304 && validator) {
+          // Unchanged since the last answer
+          return { times: validator.times };
+        }
+        const etag = response.headers.get('ETag');
+        if (response.ok && etag) {
+          return response.json().then(data => {
+            dayValidators[date] = { etag: etag, times: data.times || [] };
+            return data;
+          });
+        }
         if (!response.ok) {
           throw new Error(`HTTP ${response.status}: ${response.statusText}`);
         }
@@ -153,130 +155,121 @@ document.addEventListener("DOMContentLoaded", function () {
 
         if (data.error) {
           console.error('API Error:', data.error);
-          
-          // Show specific error messages based on error type
-          let errorMessage = 'Hiba történt az időpontok betöltésekor';
-          let canRetry = true;
-          
-          switch (data.error) {
-            case 'missing-params':
-              errorMessage = 'Hiányozó paraméterek';
-              canRetry = false;
-              break;
-            case 'unknown-business':
-              errorMessage = 'Ismeretlen vállalkozás';
-              canRetry = false;
-              break;
-            case 'bad-date':
-            case 'invalid-date':
-              errorMessage = 'Érvénytelen dátum';
-              canRetry = false;
-              break;
-            case 'past-date':
-              errorMessage = 'Múltbeli dátumra nem lehet időpontot foglalni';
-              canRetry = false;
-              break;
-            case 'server-error':
-              errorMessage = 'Szerver hiba - próbálja újra később';
-              break;
-            default:
-              errorMessage = data.message || 'Hiba történt az időpontok betöltésekor';
-          }
-          
-          timeSelect.innerHTML = `<option value="">${errorMessage}</option>`;
-          timeSelect.disabled = true;
-          
-          // Show retry button for retryable errors
-          if (canRetry && retryCount < 2) {
-            showNotification(`${errorMessage} - Újrapróbálkozás ${retryCount + 2}/3`, 'warning');
-            setTimeout(() => {
-              fetchAvailableTimes(business, date, retryCount + 1);
-            }, 2000 * (retryCount + 1)); // Exponential backoff
-          } else if (canRetry && retryCount >= 2) {
-            showNotification(`${errorMessage} - Kérjük próbálja újra később`, 'error');
-            addRetryButton(business, date);
-          } else {
-            showNotification(errorMessage, 'error');
-          }
+          timeSelect.innerHTML = '<option value="">Hiba történt az időpontok betöltésekor</option>';
+          timeSelect.disabled = false;
           return;
         }
 
-        if (data.times && data.times.length > 0) {
-          console.log(`Found ${data.times.length} available times:`, data.times);
-          data.times.forEach(time => {
-            const option = document.createElement("option");
-            option.value = time;
-            option.textContent = time;
-            timeSelect.appendChild(option);
-          });
-          timeSelect.disabled = false;
-          
-          if (retryCount > 0) {
-            showNotification('Időpontok sikeresen betöltve', 'success');
-          }
-        } else {
-          console.log('No available times found');
-          timeSelect.innerHTML = '<option value="">Nincs szabad időpont ezen a napon</option>';
-          timeSelect.disabled = true;
-          showNotification('Nincs szabad időpont ezen a napon', 'info');
-        }
+        availabilityCache[date] = data.times || [];
+        renderTimes(availabilityCache[date], keepTime);
       })
       .catch(error => {
         console.error('Fetch Error:', error);
-        
-        let errorMessage = 'Hiba történt az időpontok betöltésekor';
-        if (error.message.includes('Időtúllépés')) {
-          errorMessage = 'Időtúllépés - a szerver lassan válaszol';
-        } else if (error.message.includes('Failed to fetch')) {
-          errorMessage = 'Kapcsolati hiba - ellenőrizze az internetkapcsolatát';
+        timeSelect.innerHTML = '<option value="">Hiba történt az időpontok betöltésekor</option>';
+        timeSelect.disabled = false;
+      });
+  }
+
+  // Fill the time select with the free times of the selected day
+  function renderTimes(times, keepTime) {
+    timeSelect.innerHTML = '<option value="">Válasszon időpontot</option>';
+
+    if (times.length > 0) {
+      console.log(`Found ${times.length} available times:`, times);
+      times.forEach(time => {
+        const option = document.createElement("option");
+        option.value = time;
+        option.textContent = time;
+        timeSelect.appendChild(option);
+      });
+    } else {
+      console.log('No available times found');
+      timeSelect.innerHTML = '<option value="">Nincs szabad időpont ezen a napon</option>';
+    }
+    timeSelect.disabled = false;
+
+    if (keepTime) {
+      if (times.includes(keepTime)) {
+        timeSelect.value = keepTime;
+      } else {
+        showNotification('A kiválasztott időpontot közben lefoglalták, kérjük válasszon másikat!', 'error');
+      }
+      updateSummary();
+    }
+  }
+
+  // Live updates of the selected day: the server pushes taken and freed slots
+  let slotEvents = null;
+
+  function watchSlotEvents(date) {
+    if (slotEvents) {
+      slotEvents.close();
+      slotEvents = null;
+    }
+    if (!date || typeof EventSource === 'undefined') {
+      return;
+    }
+
+    const url = `${api}slot-events/?business=${encodeURIComponent(business)}&date=${encodeURIComponent(date)}`;
+    const source = new EventSource(url);
+    let connected = false;
+    const refresh = () => refreshTimes(date);
+    ['slot-taken', 'slot-freed', 'resync'].forEach(type => source.addEventListener(type, refresh));
+    source.addEventListener('open', () => {
+      // Changes may have been missed while reconnecting
+      if (connected) {
+        refresh();
+      }
+      connected = true;
+    });
+    slotEvents = source;
+  }
+
+  // Refetch the day's times (a cheap 304 if nothing changed for this service)
+  function refreshTimes(date) {
+    delete availabilityCache[date];
+    if (dateInput.value === date) {
+      fetchAvailableTimes(business, date, timeSelect.value);
+    }
+  }
+
+  // Load free times for a whole month with one request
+  function prefetchMonth(year, month) {
+    const from = toIsoDate(new Date(year, month, 1));
+    const to = toIsoDate(new Date(year, month + 1, 0));
+    const url = `${api}available-times/range/?business=${encodeURIComponent(business)}&from=${from}&to=${to}`;
+
+    fetch(url, { headers: { 'Accept': 'application/json' } })
+      .then(response => {
+        if (!response.ok) {
+          throw new Error(`HTTP ${response.status}: ${response.statusText}`);
         }
-        
-        timeSelect.innerHTML = `<option value="">${errorMessage}</option>`;
-        timeSelect.disabled = true;
-        
-        // Retry logic for network errors
-        if (retryCount < 2) {
-          showNotification(`${errorMessage} - Újrapróbálkozás ${retryCount + 2}/3`, 'warning');
-          setTimeout(() => {
-            fetchAvailableTimes(business, date, retryCount + 1);
-          }, 3000 * (retryCount + 1)); // Exponential backoff
-        } else {
-          showNotification(`${errorMessage} - Kérjük próbálja újra később`, 'error');
-          addRetryButton(business, date);
+        return response.json();
+      })
+      .then(data => {
+        Object.assign(availabilityCache, data.days);
+        data.full_days.forEach(day => fullyBookedDays.add(day));
+        if (datePicker) {
+          datePicker.redraw();
         }
+      })
+      .catch(error => {
+        // Not fatal - fetchAvailableTimes falls back to per-day requests
+        console.warn('Range prefetch failed:', error);
       });
   }
 
-  // Add retry button for manual retry
-  function addRetryButton(business, date) {
-    const timeSelect = document.getElementById('time');
-    const retryBtn = document.createElement('button');
-    retryBtn.type = 'button';
-    retryBtn.className = 'btn btn-outline-primary btn-sm mt-2';
-    retryBtn.innerHTML = '<i class="fas fa-redo me-1"></i>Újrapróbálkozás';
-    retryBtn.onclick = () => {
-      retryBtn.remove();
-      fetchAvailableTimes(business, date, 0);
-    };
-    
-    // Insert retry button after time select
-    if (timeSelect.parentNode && !document.getElementById('retry-btn')) {
-      retryBtn.id = 'retry-btn';
-      timeSelect.parentNode.insertBefore(retryBtn, timeSelect.nextSibling);
-    }
+  // Local date as YYYY-MM-DD (toISOString would shift it to UTC)
+  function toIsoDate(date) {
+    const month = String(date.getMonth() + 1).padStart(2, '0');
+    const day = String(date.getDate()).padStart(2, '0');
+    return `${date.getFullYear()}-${month}-${day}`;
   }
 
   // Reset time select
   function resetTimeSelect() {
-    const timeSelect = document.getElementById('time');
     timeSelect.innerHTML = '<option value="">Először válassza ki a dátumot</option>';
     timeSelect.disabled = true;
-    
-    // Remove any retry buttons
-    const retryBtn = document.getElementById('retry-btn');
-    if (retryBtn) {
-      retryBtn.remove();
-    }
   }
 
   // Update booking summary
@@ -427,7 +420,7 @@ document.addEventListener("DOMContentLoaded", function () {
     submitBtn.disabled = true;
 
     // Submit booking
-    fetch('/api/book-appointment/', {
+    fetch(`${api}book-appointment/`, {
       method: 'POST',
       headers: { 
         'Content-Type': 'application/json',
@@ -437,6 +430,9 @@ document.addEventListener("DOMContentLoaded", function () {
     })
     .then(res => res.json())
     .then(response => {
+      // Availability of the day changed (or was stale) either way
+      delete availabilityCache[formData.date];
+
       // Reset button
       submitBtn.innerHTML = originalText;
       submitBtn.disabled = false;
@@ -519,22 +515,11 @@ document.addEventListener("DOMContentLoaded", function () {
   function showNotification(message, type = 'info') {
     // Create notification element
     const notification = document.createElement('div');
-    
-    // Map notification types to Bootstrap classes and icons
-    const typeMapping = {
-      'error': { class: 'danger', icon: 'exclamation-triangle' },
-      'success': { class: 'success', icon: 'check-circle' },
-      'warning': { class: 'warning', icon: 'exclamation-circle' },
-      'info': { class: 'info', icon: 'info-circle' }
-    };
-    
-    const typeConfig = typeMapping[type] || typeMapping['info'];
-    
-    notification.className = `alert alert-${typeConfig.class} notification-toast alert-dismissible`;
+    notification.className = `alert alert-${type === 'error' ? 'danger' : 'success'} notification-toast`;
     notification.innerHTML = `
-      <i class="fas fa-${typeConfig.icon} me-2"></i>
+      <i class="fas fa-${type === 'error' ? 'exclamation-triangle' : 'check-circle'} me-2"></i>
       ${message}
-      <button type="button" class="btn-close" data-bs-dismiss="alert" aria-label="Close"></button>
+      <button type="button" class="btn-close" data-bs-dismiss="alert"></button>
     `;
     
     // Add styles
@@ -544,39 +529,18 @@ document.addEventListener("DOMContentLoaded", function () {
       right: 20px;
       z-index: 9999;
       min-width: 300px;
-      max-width: 400px;
       box-shadow: 0 4px 20px rgba(0,0,0,0.15);
       animation: slideInRight 0.3s ease;
-      word-wrap: break-word;
     `;
     
     document.body.appendChild(notification);
     
-    // Auto remove after different times based on type
-    const timeout = type === 'error' ? 8000 : (type === 'warning' ? 6000 : 5000);
+    // Auto remove after 5 seconds
     setTimeout(() => {
       if (notification.parentNode) {
-        notification.style.animation = 'slideOutRight 0.3s ease';
-        setTimeout(() => {
-          if (notification.parentNode) {
-            notification.remove();
-          }
-        }, 300);
+        notification.remove();
       }
-    }, timeout);
-    
-    // Handle manual close
-    const closeBtn = notification.querySelector('.btn-close');
-    if (closeBtn) {
-      closeBtn.addEventListener('click', () => {
-        notification.style.animation = 'slideOutRight 0.3s ease';
-        setTimeout(() => {
-          if (notification.parentNode) {
-            notification.remove();
-          }
-        }, 300);
-      });
-    }
+    }, 5000);
   }
 
   // Get CSRF token
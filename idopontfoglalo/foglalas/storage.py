@@ -0,0 +1,87 @@
+"""Static files build: settings.STORAGES['staticfiles'] points here when DEBUG is off.
+
+collectstatic then writes, for every file:
+
+- a copy with the content hash in its name, listed in staticfiles.json
+  (ManifestStaticFilesStorage) - {% static %} links to it, so the front
+  server can send STATIC_URL with "Cache-Control: max-age=31536000, immutable"
+- JS and CSS minified, when rjsmin / rcssmin are installed (the hash is of
+  the source, so a rebuild of unchanged files keeps their URLs)
+- .gz (and .br with the brotli package) next to the text files, for
+  nginx's gzip_static / brotli_static
+"""
+import gzip
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.json', '.map', '.svg', '.txt', '.xml', '.html')
+# Smaller files don't win back the extra request headers
+MIN_COMPRESS_SIZE = 256
+
+
+def minify(name, text):
+    """Minified JS/CSS source, or the text itself when there is no minifier for it"""
+    if '.min.' in name:
+        return text
+    if name.endswith('.js') and rjsmin is not None:
+        return rjsmin.jsmin(text)
+    if name.endswith('.css') and rcssmin is not None:
+        return rcssmin.cssmin(text)
+    return text
+
+
+def compressed_variants(data):
+    """(suffix, bytes) of the precompressed copies worth keeping"""
+    variants = []
+    if len(data) < MIN_COMPRESS_SIZE:
+        return variants
+    # mtime=0 keeps the output identical between builds
+    variants.append(('.gz', gzip.compress(data, compresslevel=9, mtime=0)))
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data)))
+    return [(suffix, packed) for suffix, packed in variants if len(packed) < len(data)]
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def _save(self, name, content):
+        # Collected and hashed copies both pass here; minifying is idempotent
+        if name.endswith(('.js', '.css')):
+            content.seek(0)
+            source = content.read()
+            text = source.decode('utf-8') if isinstance(source, bytes) else source
+            minified = minify(name, text)
+            if minified != text:
+                content = ContentFile(minified.encode('utf-8'))
+            else:
+                content.seek(0)
+        return super()._save(name, content)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name):
+                self._write_compressed(name)
+
+    def _write_compressed(self, name):
+        with self.open(name) as source:
+            data = source.read()
+        for suffix, packed in compressed_variants(data):
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(packed))
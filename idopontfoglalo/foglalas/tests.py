@@ -1,3 +1,1639 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import random
+import re
+import tempfile
+import threading
+import time as time_module
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, time, timedelta
+from unittest import mock, skipIf
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.db.models import Count
+from django.db.utils import OperationalError, load_backend
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .archive import archive_batch
+from .availability import (
+    DayAvailability, _appointment_rows, _occupancy_rows, availability_by_day, availability_cache_stats,
+    get_day_availability,
+)
+from .benchmarks import benchmark_connections, regressions, remove_benchmark_data, seed_benchmark_data
+from .booking import SlotAlreadyBooked, create_appointment, create_appointments_batch
+from .checks import check_initial_businesses
+from .events import SLOT_FREED, SLOT_TAKEN, channel_name, get_broker, slot_event
+from .log import BackgroundQueueHandler, DispatchingListener, SamplingFilter, StructuredFormatter
+from .middleware import request_totals, reset_request_totals
+from .models import Appointment, ArchivedAppointment, Business, DayOccupancy, Resource, Service
+from .occupancy import mask_bookings, occupancy_differences, slot_mask
+from .pages import page_version
+from .storage import compressed_variants
+from .seed import INITIAL_SLUGS, missing_business_slugs, seed_businesses
+from .registry import find_business, first_business, get_business, get_resources, get_services, invalidate_registry
+from .slots import get_slot_grid
+from . import booking, views
+from barber import views as barber_views
+from massage import views as massage_views
+
+
+def reset_caches():
+    # Cached state outlives the per-test rollback, ids get reused
+    caches['default'].clear()
+    invalidate_registry()
+
+
+def booked_times(business, day, service_type=None):
+    """Start times of the slots get_day_availability() has no room in"""
+    grid = get_slot_grid(business.time_interval, 0, 23)
+    availability = get_day_availability(business, day, service_type)
+    return {
+        slot for slot, minutes in zip(grid.times, grid.minutes)
+        if not availability.is_free(minutes, business.time_interval)
+    }
+
+
+def make_business(slug='teszt-uzlet', time_interval=60):
+    return Business.objects.create(
+        name='Teszt Üzlet',
+        slug=slug,
+        address='1000 Budapest, Teszt utca 1.',
+        phone='+36 1 000 0000',
+        email='teszt@example.com',
+        time_interval=time_interval,
+    )
+
+
+def booking_payload(business, day, slot, **extra):
+    payload = {
+        'business': business.slug,
+        'name': 'Teszt Elek',
+        'phone': '+36 30 123 4567',
+        'email': 'teszt@example.com',
+        'date': day.isoformat(),
+        'time': slot,
+    }
+    payload.update(extra)
+    return payload
+
+
+class CreateAppointmentTests(TestCase):
+    def setUp(self):
+        self.business = make_business()
+        self.day = date.today() + timedelta(days=1)
+
+    def book(self, service_type='personal', slot=time(10, 0)):
+        return create_appointment(
+            business=self.business, service_type=service_type, name='Teszt Elek',
+            phone='+36 30 123 4567', email='teszt@example.com', date=self.day, time=slot,
+        )
+
+    def test_second_booking_for_same_slot_is_rejected(self):
+        self.book()
+        with self.assertRaises(SlotAlreadyBooked):
+            self.book()
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_conflict_is_detected_without_select(self):
+        self.book()
+        with CaptureQueriesContext(connection) as queries:
+            with self.assertRaises(SlotAlreadyBooked):
+                self.book()
+        statements = [q['sql'].split()[0].upper() for q in queries.captured_queries]
+        self.assertNotIn('SELECT', statements)
+        self.assertEqual(statements.count('INSERT'), 1)
+
+    def test_other_service_type_same_slot_is_allowed(self):
+        self.book(service_type='personal')
+        self.book(service_type='massage')
+        self.assertEqual(Appointment.objects.count(), 2)
+
+
+class BookAppointmentViewTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.business = make_business()
+        self.day = date.today() + timedelta(days=1)
+
+    def post(self, url, payload):
+        return self.client.post(url, json.dumps(payload), content_type='application/json')
+
+    def test_double_booking_rejected_in_every_app(self):
+        for url in ('/foglalas/api/book-appointment/', '/barber/api/book-appointment/', '/massage/api/book-appointment/'):
+            with self.subTest(url=url):
+                payload = booking_payload(self.business, self.day, '11:00')
+                self.assertEqual(self.post(url, payload).status_code, 200)
+                response = self.post(url, payload)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['message'], 'Ez az időpont már foglalt')
+
+    def test_barber_rejects_bad_time(self):
+        payload = booking_payload(self.business, self.day, '25:99')
+        response = self.post('/barber/api/book-appointment/', payload)
+        self.assertEqual(response.status_code, 400)
+
+
+class AvailabilityViewTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.business = make_business(time_interval=60)
+        self.day = date.today() + timedelta(days=1)
+        for service_type, slot in (('personal', time(9, 0)), ('barber', time(10, 0)), ('massage', time(11, 0))):
+            Appointment.objects.create(
+                business=self.business, service_type=service_type, name='Foglalt',
+                phone='+36 30 123 4567', email='foglalt@example.com', date=self.day, time=slot,
+            )
+
+    def get_times(self, app):
+        response = self.client.get(
+            f'/{app}/api/available-times/', {'business': self.business.slug, 'date': self.day.isoformat()}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()['times']
+
+    def test_foglalas_excludes_every_booking(self):
+        times = self.get_times('foglalas')
+        self.assertEqual(times[0], '08:00')
+        self.assertNotIn('09:00', times)
+        self.assertNotIn('10:00', times)
+        self.assertNotIn('11:00', times)
+
+    def test_barber_and_massage_only_exclude_their_service_type(self):
+        barber = self.get_times('barber')
+        self.assertNotIn('10:00', barber)
+        self.assertIn('11:00', barber)
+        massage = self.get_times('massage')
+        self.assertNotIn('11:00', massage)
+        self.assertIn('10:00', massage)
+
+    def test_get_slots_excludes_booked_starts(self):
+        # get_slots works on the first business (seeded by migration 0004)
+        business = Business.objects.first()
+        Appointment.objects.create(
+            business=business, service_type='personal', name='Foglalt',
+            phone='+36 30 123 4567', email='foglalt@example.com', date=self.day, time=time(9, 0),
+        )
+        response = self.client.get('/foglalas/api/slots/', {'date': self.day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        slots = response.json()['slots']
+        self.assertNotIn('09:00', [slot['start'] for slot in slots])
+        self.assertEqual(len(slots), len(get_slot_grid(business.time_interval, 9, 17, False).times) - 1)
+        self.assertEqual(slots[-1]['end'], '17:00')
+
+
+class AvailabilityCacheTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.business = make_business()
+        self.day = date.today() + timedelta(days=1)
+
+    def book(self, slot, service_type='barber'):
+        return create_appointment(
+            business=self.business, service_type=service_type, name='Teszt Elek',
+            phone='+36 30 123 4567', email='teszt@example.com', date=self.day, time=slot,
+        )
+
+    def test_second_lookup_is_a_cache_hit(self):
+        before = availability_cache_stats()
+        booked_times(self.business, self.day)
+        with self.assertNumQueries(0):
+            booked_times(self.business, self.day)
+        after = availability_cache_stats()
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+
+    def test_booking_invalidates_its_service_type_and_the_all_types_entry(self):
+        self.assertEqual(booked_times(self.business, self.day, 'barber'), frozenset())
+        self.assertEqual(booked_times(self.business, self.day), frozenset())
+        booked_times(self.business, self.day, 'massage')
+        self.book(time(10, 0))
+        self.assertEqual(booked_times(self.business, self.day, 'barber'), {time(10, 0)})
+        self.assertEqual(booked_times(self.business, self.day), {time(10, 0)})
+        with self.assertNumQueries(0):
+            self.assertEqual(booked_times(self.business, self.day, 'massage'), frozenset())
+
+    def test_moving_and_deleting_an_appointment_invalidates(self):
+        appointment = self.book(time(10, 0))
+        booked_times(self.business, self.day, 'barber')
+        next_day = self.day + timedelta(days=1)
+        booked_times(self.business, next_day, 'barber')
+
+        appointment = Appointment.objects.get(pk=appointment.pk)
+        appointment.date = next_day
+        appointment.save()
+        self.assertEqual(booked_times(self.business, self.day, 'barber'), frozenset())
+        self.assertEqual(booked_times(self.business, next_day, 'barber'), {time(10, 0)})
+
+        appointment.delete()
+        self.assertEqual(booked_times(self.business, next_day, 'barber'), frozenset())
+
+
+class BusinessRegistryTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.business = make_business()
+        Service.objects.create(business=self.business, name='Konzultáció', duration=60)
+
+    def test_lookups_are_served_from_memory(self):
+        expected_first = Business.objects.first()
+        get_business(self.business.slug)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_business(self.business.slug), self.business)
+            self.assertEqual(find_business('nincs-ilyen'), None)
+            self.assertEqual(first_business(), expected_first)
+            services = get_services(self.business)
+            self.assertEqual([str(service) for service in services], ['Konzultáció (Teszt Üzlet)'])
+        with self.assertRaises(Business.DoesNotExist):
+            get_business('nincs-ilyen')
+
+    def test_saves_refresh_the_registry(self):
+        get_business(self.business.slug)
+        self.business.name = 'Átnevezett Üzlet'
+        self.business.save()
+        self.assertEqual(get_business(self.business.slug).name, 'Átnevezett Üzlet')
+        Service.objects.create(business=self.business, name='Utókezelés', duration=30)
+        self.assertEqual(len(get_services(self.business)), 2)
+
+    def test_snapshot_expires_after_ttl(self):
+        get_business(self.business.slug)
+        # Changes made by another worker don't fire signals in this process
+        Business.objects.filter(pk=self.business.pk).update(name='Máshol módosítva')
+        self.assertEqual(get_business(self.business.slug).name, 'Teszt Üzlet')
+        with mock.patch('foglalas.registry.time.monotonic', return_value=time_module.monotonic() + 3600):
+            self.assertEqual(get_business(self.business.slug).name, 'Máshol módosítva')
+
+
+class SeedTests(TestCase):
+    def test_seeding_is_idempotent(self):
+        # Migration 0004 already seeded the test database
+        self.assertEqual(missing_business_slugs(), [])
+        self.assertEqual(seed_businesses(), ([], []))
+        created, updated = seed_businesses(force=True)
+        self.assertEqual((created, len(updated)), ([], len(INITIAL_SLUGS)))
+
+    def test_ready_check_reports_missing_businesses(self):
+        self.assertEqual(check_initial_businesses(None, databases=['default']), [])
+        Business.objects.filter(slug='harmonia-masszazs').delete()
+        errors = check_initial_businesses(None, databases=['default'])
+        self.assertEqual([error.id for error in errors], ['foglalas.E001'])
+        call_command('setup_businesses', stdout=io.StringIO())
+        self.assertEqual(check_initial_businesses(None, databases=['default']), [])
+
+    def test_pages_do_not_probe_for_businesses(self):
+        reset_caches()
+        find_business('szakertoi-tanacsadas')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/foglalas/')
+            self.client.get('/foglalas/kapcsolat/')
+        self.assertEqual(queries.captured_queries, [])
+
+
+class AvailabilityRangeViewTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.business = make_business(time_interval=60)
+        self.day = date.today() + timedelta(days=1)
+
+    def book(self, day, slot, service_type='personal'):
+        Appointment.objects.create(
+            business=self.business, service_type=service_type, name='Foglalt',
+            phone='+36 30 123 4567', email='foglalt@example.com', date=day, time=slot,
+        )
+
+    def get_range(self, app, start, end):
+        return self.client.get(f'/{app}/api/available-times/range/', {
+            'business': self.business.slug, 'from': start.isoformat(), 'to': end.isoformat(),
+        })
+
+    def test_range_is_answered_with_one_appointment_query(self):
+        self.book(self.day, time(9, 0))
+        get_business(self.business.slug)
+        with self.assertNumQueries(1):
+            response = self.get_range('foglalas', self.day, self.day + timedelta(days=29))
+        days = response.json()['days']
+        self.assertEqual(len(days), 30)
+        self.assertNotIn('09:00', days[self.day.isoformat()])
+        self.assertIn('09:00', days[(self.day + timedelta(days=1)).isoformat()])
+
+    def test_fully_booked_days_are_listed(self):
+        for slot in get_slot_grid(60, 8, 17).times:
+            self.book(self.day, slot)
+        data = self.get_range('foglalas', self.day, self.day + timedelta(days=1)).json()
+        self.assertEqual(data['full_days'], [self.day.isoformat()])
+        self.assertEqual(data['days'][self.day.isoformat()], [])
+
+    def test_barber_range_only_counts_barber_bookings(self):
+        self.book(self.day, time(10, 0), service_type='massage')
+        days = self.get_range('barber', self.day, self.day).json()['days']
+        self.assertIn('10:00', days[self.day.isoformat()])
+
+    def test_past_days_are_skipped_and_long_ranges_rejected(self):
+        yesterday = date.today() - timedelta(days=1)
+        days = self.get_range('massage', yesterday, date.today()).json()['days']
+        self.assertEqual(list(days), [date.today().isoformat()])
+        response = self.get_range('foglalas', self.day, self.day + timedelta(days=365))
+        self.assertEqual(response.status_code, 400)
+
+
+class SlotGridTests(TestCase):
+    def test_grid_includes_closing_time(self):
+        grid = get_slot_grid(30, 8, 17)
+        self.assertEqual(len(grid.times), 19)
+        self.assertEqual((grid.labels[0], grid.labels[-1]), ('08:00', '17:00'))
+        self.assertEqual(grid.times[1], time(8, 30))
+
+    def test_grid_slots_end_by_closing_time(self):
+        grid = get_slot_grid(60, 9, 17, include_closing_time=False)
+        self.assertEqual(grid.labels[-1], '16:00')
+
+    def test_grid_is_memoized(self):
+        self.assertIs(get_slot_grid(60, 8, 17), get_slot_grid(60, 8, 17))
+
+    def test_free_slots_skip_booked_times(self):
+        grid = get_slot_grid(60, 9, 12, include_closing_time=False)
+        day = DayAvailability([(9 * 60, 60), (11 * 60, 60)])
+        self.assertEqual(day.free_slots(grid, 60), [{'start': '10:00', 'end': '11:00'}])
+        self.assertEqual(day.free_starts(grid, 60), ['10:00'])
+
+
+class DurationAvailabilityTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.business = make_business(time_interval=30)
+        self.massage = Service.objects.create(business=self.business, name='Svédmasszázs', duration=90)
+        self.day = date.today() + timedelta(days=1)
+
+    def get_times(self, **params):
+        response = self.client.get('/massage/api/available-times/', {
+            'business': self.business.slug, 'date': self.day.isoformat(), **params,
+        })
+        return response
+
+    def test_intervals_are_merged_and_checked_by_bisect(self):
+        day = DayAvailability([(600, 90), (630, 30), (720, 30)])
+        self.assertEqual((day.starts, day.ends), ([600, 720], [690, 750]))
+        self.assertTrue(day.is_free(540, 60))
+        self.assertFalse(day.is_free(540, 61))
+        self.assertFalse(day.is_free(660, 30))
+        self.assertTrue(day.is_free(690, 30))
+        self.assertFalse(day.is_free(690, 31))
+
+    def test_long_booking_hides_the_starts_it_covers(self):
+        response = self.client.post('/massage/api/book-appointment/', booking_payload(
+            self.business, self.day, '10:00', service=self.massage.pk,
+        ), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Appointment.objects.get().duration, 90)
+
+        times = self.get_times().json()['times']
+        for hidden in ('10:00', '10:30', '11:00'):
+            self.assertNotIn(hidden, times)
+        self.assertIn('09:30', times)
+        self.assertIn('11:30', times)
+
+    def test_service_only_lists_starts_where_it_fits(self):
+        create_appointment(
+            business=self.business, service_type='massage', name='Foglalt', phone='+36 30 123 4567',
+            email='foglalt@example.com', date=self.day, time=time(10, 0),
+        )
+        times = self.get_times(service=self.massage.pk).json()['times']
+        # 90 minutes must end by 10:00 and by 17:00 closing
+        self.assertIn('08:30', times)
+        self.assertNotIn('09:00', times)
+        self.assertIn('10:30', times)
+        self.assertEqual(times[-1], '15:30')
+
+    def test_unknown_service_is_rejected(self):
+        other = make_business(slug='masik-uzlet')
+        foreign = Service.objects.create(business=other, name='Más', duration=30)
+        response = self.get_times(service=foreign.pk)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'unknown-service')
+        response = self.client.post('/barber/api/book-appointment/', booking_payload(
+            self.business, self.day, '10:00', service=foreign.pk,
+        ), content_type='application/json')
+        self.assertEqual(response.json()['message'], 'Ismeretlen szolgáltatás')
+
+
+class DayOccupancyTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.business = make_business(time_interval=30)
+        self.day = date.today() + timedelta(days=1)
+
+    def book(self, slot, duration=None, service_type='massage'):
+        return create_appointment(
+            business=self.business, service_type=service_type, name='Teszt Elek', phone='+36 30 123 4567',
+            email='teszt@example.com', date=self.day, time=slot, duration=duration,
+        )
+
+    def mask(self, service_type='massage'):
+        return DayOccupancy.objects.get(business=self.business, date=self.day, service_type=service_type).mask
+
+    def test_masks_and_runs(self):
+        self.assertEqual(slot_mask(600, 90, 30), 0b111 << 20)
+        self.assertEqual(slot_mask(615, 30, 30), 0b11 << 20)
+        self.assertEqual(mask_bookings(0b111 << 20 | 1 << 30, 30), ((600, 90), (900, 30)))
+
+    def test_overlapping_booking_is_rejected(self):
+        self.book(time(10, 0), duration=90)
+        self.assertEqual(self.mask(), 0b111 << 20)
+        with self.assertRaises(SlotAlreadyBooked):
+            self.book(time(11, 0))
+        self.book(time(11, 30))
+        self.book(time(11, 0), service_type='barber')
+        self.assertEqual(self.mask(), 0b1111 << 20)
+        self.assertEqual(Appointment.objects.count(), 3)
+
+    def test_availability_is_one_lookup(self):
+        self.book(time(10, 0), duration=60)
+        with self.assertNumQueries(1):
+            booked = booked_times(self.business, self.day, 'massage')
+        self.assertEqual(booked, {time(10, 0), time(10, 30)})
+
+    def test_edits_and_deletes_keep_the_mask_in_step(self):
+        appointment = self.book(time(10, 0), duration=60)
+        Appointment.objects.create(
+            business=self.business, service_type='massage', name='Admin', phone='+36 30 123 4567',
+            email='admin@example.com', date=self.day, time=time(14, 0),
+        )
+        self.assertEqual(self.mask(), 0b11 << 20 | 1 << 28)
+        appointment.time = time(9, 0)
+        appointment.save()
+        self.assertEqual(self.mask(), 0b11 << 18 | 1 << 28)
+        appointment.delete()
+        self.assertEqual(self.mask(), 1 << 28)
+        self.assertEqual(occupancy_differences(), [])
+
+    def test_interval_change_rebuilds_the_masks(self):
+        self.book(time(10, 0), duration=60)
+        self.business.time_interval = 60
+        self.business.save()
+        self.assertEqual(self.mask(), 1 << 10)
+
+    def test_command_checks_and_rebuilds(self):
+        self.book(time(10, 0))
+        DayOccupancy.objects.update(mask=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_occupancy', '--check', stdout=io.StringIO(), stderr=io.StringIO())
+        call_command('rebuild_occupancy', '--business', self.business.slug, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(self.mask(), 1 << 20)
+        call_command('rebuild_occupancy', '--check', stdout=io.StringIO())
+
+
+class AsyncViewTests(TestCase):
+    """The ASGI versions answer exactly like the sync views"""
+
+    def setUp(self):
+        reset_caches()
+        self.business = make_business()
+        self.day = date.today() + timedelta(days=1)
+        self.factory = AsyncRequestFactory()
+        Appointment.objects.create(
+            business=self.business, service_type='barber', name='Foglalt', phone='+36 30 123 4567',
+            email='foglalt@example.com', date=self.day, time=time(10, 0),
+        )
+
+    def params(self, **extra):
+        return {'business': self.business.slug, 'date': self.day.isoformat(), **extra}
+
+    async def test_available_times_match_the_sync_views(self):
+        for module in (views, barber_views, massage_views):
+            request = self.factory.get('/', self.params())
+            expected = await sync_to_async(module.get_available_times)(request)
+            response = await module.aget_available_times(request)
+            self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+        request = self.factory.get('/', {'business': self.business.slug, 'from': self.day.isoformat(), 'to': self.day.isoformat()})
+        response = await views.aget_available_times_range(request)
+        self.assertNotIn('10:00', json.loads(response.content)['days'][self.day.isoformat()])
+
+    async def test_cache_hit_stays_in_the_event_loop(self):
+        request = self.factory.get('/', self.params())
+        await views.aget_available_times(request)
+        with mock.patch('foglalas.availability._occupancy_rows', side_effect=AssertionError('database read')):
+            response = await views.aget_available_times(request)
+        self.assertNotIn('10:00', json.loads(response.content)['times'])
+
+    async def test_slots_and_errors(self):
+        response = await views.aget_slots(self.factory.get('/', {'date': self.day.isoformat()}))
+        self.assertEqual(response.status_code, 200)
+        response = await views.aget_available_times(self.factory.get('/', self.params(business='nincs-ilyen')))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual((await views.aget_slots(self.factory.post('/'))).status_code, 405)
+
+    async def test_booking(self):
+        body = json.dumps(booking_payload(self.business, self.day, '11:00'))
+        request = lambda: self.factory.post('/', body, content_type='application/json')
+        self.assertEqual((await views.abook_appointment(request())).status_code, 200)
+        response = await barber_views.abook_appointment(request())
+        self.assertEqual(response.status_code, 200)
+        response = await barber_views.abook_appointment(request())
+        self.assertEqual(json.loads(response.content)['message'], 'Ez az időpont már foglalt')
+        self.assertEqual(await Appointment.objects.filter(time=time(11, 0)).acount(), 2)
+
+    async def test_booking_errors_match_the_sync_view(self):
+        for request in (
+            self.factory.get('/'),
+            self.factory.post('/', '{broken', content_type='application/json'),
+            self.factory.post('/', json.dumps(booking_payload(self.business, self.day, '10:00', service_type='barber')),
+                              content_type='application/json'),
+            self.factory.post('/', json.dumps(booking_payload(self.business, self.day, '12:00', service='999')),
+                              content_type='application/json'),
+        ):
+            expected = await sync_to_async(views.book_appointment)(request)
+            response = await views.abook_appointment(request)
+            self.assertEqual((response.status_code, response.content), (expected.status_code, expected.content))
+        self.assertEqual(expected.status_code, 400)
+        self.assertEqual((await views.abook_appointment(self.factory.get('/'))).status_code, 405)
+
+    async def test_app_booking_errors_match_the_sync_views(self):
+        for app_views in (barber_views, massage_views):
+            for request in (
+                self.factory.post('/', 'nem json', content_type='application/json'),
+                self.factory.post('/', json.dumps(booking_payload(self.business, self.day, '25:00')),
+                                  content_type='application/json'),
+                self.factory.post('/', json.dumps({**booking_payload(self.business, self.day, '10:00'), 'business': 'nincs'}),
+                                  content_type='application/json'),
+                self.factory.get('/'),
+            ):
+                expected = await sync_to_async(app_views.book_appointment)(request)
+                response = await app_views.abook_appointment(request)
+                self.assertEqual((response.status_code, response.content), (expected.status_code, expected.content))
+            self.assertEqual(expected.status_code, 405)
+
+
+class ConditionalAvailabilityTests(TestCase):
+    """Availability answers carry an ETag and repeat requests can get a 304"""
+
+    def setUp(self):
+        reset_caches()
+        self.business = make_business()
+        self.day = date.today() + timedelta(days=1)
+
+    def get(self, url, etag=None, **params):
+        headers = {'If-None-Match': etag} if etag else {}
+        return self.client.get(url, {'business': self.business.slug, 'date': self.day.isoformat(), **params}, headers=headers)
+
+    def test_repeat_request_is_not_modified(self):
+        for url in ('/barber/api/available-times/', '/foglalas/api/slots/'):
+            first = self.get(url)
+            self.assertEqual(first.status_code, 200)
+            self.assertIn('no-cache', first['Cache-Control'])
+            repeat = self.get(url, first['ETag'])
+            self.assertEqual(repeat.status_code, 304)
+            self.assertEqual(repeat.content, b'')
+            self.assertEqual(repeat['ETag'], first['ETag'])
+
+    def test_booking_changes_the_etag(self):
+        etag = self.get('/barber/api/available-times/')['ETag']
+        create_appointment(
+            business=self.business, service_type='barber', name='Foglalt', phone='+36 30 123 4567',
+            email='foglalt@example.com', date=self.day, time=time(10, 0),
+        )
+        response = self.get('/barber/api/available-times/', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('10:00', response.json()['times'])
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_depends_on_the_endpoint_and_service(self):
+        service = Service.objects.create(business=self.business, name='Hosszú', duration=90)
+        tags = {
+            self.get('/barber/api/available-times/')['ETag'],
+            self.get('/massage/api/available-times/')['ETag'],
+            self.get('/barber/api/available-times/', service=service.pk)['ETag'],
+        }
+        self.assertEqual(len(tags), 3)
+
+    async def test_async_view_is_not_modified(self):
+        factory = AsyncRequestFactory()
+        params = {'business': self.business.slug, 'date': self.day.isoformat()}
+        first = await views.aget_available_times(factory.get('/', params))
+        repeat = await views.aget_available_times(factory.get('/', params, headers={'If-None-Match': first['ETag']}))
+        self.assertEqual(repeat.status_code, 304)
+
+
+class SlotEventTests(TestCase):
+    """Appointment changes reach the open slot-event streams of their day"""
+
+    def setUp(self):
+        reset_caches()
+        self.business = make_business()
+        self.day = date.today() + timedelta(days=1)
+        self.channel = channel_name(self.business.pk, self.day)
+        self.subscription = get_broker().subscribe(self.channel)
+        self.addCleanup(get_broker().unsubscribe, self.subscription)
+
+    def events(self):
+        events = []
+        while (event := self.subscription.get(0)) is not None:
+            events.append((event['type'], event['start'], event['end']))
+        return events
+
+    def book(self, slot, **extra):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_appointment(
+                business=self.business, service_type='barber', name='Foglalt', phone='+36 30 123 4567',
+                email='foglalt@example.com', date=self.day, time=slot, **extra
+            )
+
+    def test_booking_and_cancelling_publish_events(self):
+        appointment = self.book(time(10, 0), duration=90)
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.delete()
+        self.assertEqual(self.events(), [('slot-taken', '10:00', '11:30'), ('slot-freed', '10:00', '11:30')])
+
+    def test_moving_publishes_freed_and_taken(self):
+        appointment = self.book(time(10, 0))
+        self.events()
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.name = 'Átnevezve'
+            appointment.save()
+        self.assertEqual(self.events(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.time = time(12, 0)
+            appointment.save()
+        self.assertEqual(self.events(), [('slot-freed', '10:00', '11:00'), ('slot-taken', '12:00', '13:00')])
+
+    def test_rolled_back_booking_is_not_announced(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    create_appointment(
+                        business=self.business, service_type='barber', name='Foglalt', phone='+36 30 123 4567',
+                        email='foglalt@example.com', date=self.day, time=time(10, 0),
+                    )
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(self.events(), [])
+
+    def test_batch_booking_publishes_events(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_appointments_batch([booking_payload(self.business, self.day, '09:00', service_type='barber')])
+        self.assertEqual(self.events(), [('slot-taken', '09:00', '10:00')])
+
+    @override_settings(SLOT_EVENTS_QUEUE_SIZE=1)
+    def test_full_queue_asks_for_a_resync(self):
+        subscription = get_broker().subscribe(self.channel)
+        self.addCleanup(get_broker().unsubscribe, subscription)
+        event = slot_event('slot-taken', self.business.pk, self.day, 'barber', time(10, 0), 60)
+        get_broker().publish(self.channel, event)
+        get_broker().publish(self.channel, event)
+        self.assertTrue(subscription.overflowed)
+
+    @override_settings(SLOT_EVENTS_HEARTBEAT=0.05, SLOT_EVENTS_SYNC_MAX_AGE=0.2)
+    def test_stream_sends_the_service_types_events(self):
+        # The sync view itself - under ASYNC_VIEWS the URL serves the async one.
+        # Ends after the sync max age, not the (default) long SLOT_EVENTS_MAX_AGE
+        request = RequestFactory().get('/', {'business': self.business.slug, 'date': self.day.isoformat()})
+        response = barber_views.slot_events(request)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        # Not subscribed until the response is sent - one never sent leaves nothing behind
+        self.assertEqual(get_broker().subscriber_count(self.channel), 1)
+        content = iter(response.streaming_content)
+        self.assertEqual(next(content), b'retry: 3000\n\n')
+        self.assertEqual(get_broker().subscriber_count(self.channel), 2)
+        for service_type in ('massage', 'barber'):
+            get_broker().publish(self.channel, slot_event('slot-taken', self.business.pk, self.day, service_type, time(10, 0), 60))
+        body = b''.join(content).decode()
+        self.assertEqual(body.count('event: slot-taken'), 1)
+        self.assertIn('"service_type": "barber"', body)
+        self.assertEqual(get_broker().subscriber_count(self.channel), 1)
+
+    def test_stream_errors(self):
+        self.assertEqual(self.client.get('/barber/api/slot-events/', {'business': self.business.slug}).status_code, 400)
+        response = self.client.get('/foglalas/api/slot-events/', {'business': 'nincs-ilyen', 'date': self.day.isoformat()})
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(SLOT_EVENTS_HEARTBEAT=0.05, SLOT_EVENTS_MAX_AGE=0.2)
+    async def test_async_stream(self):
+        request = AsyncRequestFactory().get('/', {'business': self.business.slug, 'date': self.day.isoformat()})
+        response = await massage_views.aslot_events(request)
+        content = aiter(response.streaming_content)
+        self.assertEqual(await anext(content), b'retry: 3000\n\n')
+        # Published from another thread, like a sync booking view would
+        event = slot_event('slot-freed', self.business.pk, self.day, 'massage', time(10, 0), 60)
+        await sync_to_async(get_broker().publish, thread_sensitive=False)(self.channel, event)
+        body = ''.join([chunk.decode() async for chunk in content])
+        self.assertIn('event: slot-freed', body)
+        self.assertIn(': keepalive', body)
+
+
+class AvailabilityIndexTests(TestCase):
+    """EXPLAIN the queries the availability views run - they must be answered from an index"""
+
+    appointment_indexes = ('appt_business_date_svc_idx',)
+    # SQLite names the index of a plain unique constraint itself
+    occupancy_indexes = ('unique_day_occupancy', 'sqlite_autoindex_foglalas_dayoccupancy')
+
+    def setUp(self):
+        self.business = make_business()
+        self.day = date.today() + timedelta(days=1)
+        self.last_day = self.day + timedelta(days=30)
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would otherwise always be seq-scanned
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assertUsesIndex(self, queryset, index_names, covering):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest(f'No plan check for {connection.vendor}')
+        plan = self.explain(queryset)
+        self.assertTrue(any(name in plan for name in index_names), plan)
+        if connection.vendor == 'sqlite':
+            # Every SQLite index carries the rowid, so Count('pk') is covered too
+            self.assertIn('COVERING INDEX' if covering else 'USING INDEX', plan)
+        else:
+            self.assertRegex(plan, r'Index (Only )?Scan')
+
+    def test_occupancy_read(self):
+        for service_type in (None, 'barber'):
+            self.assertUsesIndex(
+                _occupancy_rows(self.business, self.day, self.last_day, service_type), self.occupancy_indexes, covering=False,
+            )
+
+    def test_grouped_appointment_read(self):
+        for service_type in (None, 'barber'):
+            self.assertUsesIndex(
+                _appointment_rows(self.business, self.day, self.last_day, service_type), self.appointment_indexes, covering=True,
+            )
+
+
+class BatchBookingTests(TestCase):
+    url = '/foglalas/api/book-appointments/batch/'
+
+    def setUp(self):
+        reset_caches()
+        self.business = make_business()
+        self.day = date.today() + timedelta(days=1)
+
+    def post(self, bookings, mode='atomic'):
+        return self.client.post(self.url, json.dumps({'mode': mode, 'bookings': bookings}), content_type='application/json')
+
+    def test_batch_is_inserted_with_one_conflict_query_and_one_insert(self):
+        bookings = [booking_payload(self.business, self.day, f'{hour:02d}:00') for hour in range(8, 18)]
+        get_business(self.business.slug)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(bookings)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], 10)
+        # Plus the DayOccupancy write for the day
+        statements = [q['sql'].split()[0].upper() for q in queries.captured_queries if 'foglalas_appointment' in q['sql']]
+        self.assertEqual(statements.count('SELECT'), 1)
+        self.assertEqual(statements.count('INSERT'), 1)
+        self.assertEqual(Appointment.objects.count(), 10)
+
+    def test_atomic_mode_writes_nothing_on_conflict(self):
+        self.post([booking_payload(self.business, self.day, '09:00')])
+        response = self.post([
+            booking_payload(self.business, self.day, '08:00'),
+            booking_payload(self.business, self.day, '09:00'),
+            booking_payload(self.business, self.day, 'nem-idő'),
+        ])
+        self.assertEqual(response.status_code, 409)
+        statuses = [result['status'] for result in response.json()['results']]
+        self.assertEqual(statuses, ['skipped', 'conflict', 'invalid'])
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_best_effort_books_what_it_can(self):
+        self.post([booking_payload(self.business, self.day, '09:00')])
+        response = self.post([
+            booking_payload(self.business, self.day, '08:00'),
+            booking_payload(self.business, self.day, '09:00'),
+            booking_payload(self.business, self.day, '08:00'),
+            dict(booking_payload(self.business, self.day, '10:00'), business='nincs-ilyen'),
+        ], mode='best-effort')
+        self.assertEqual(response.status_code, 207)
+        statuses = [result['status'] for result in response.json()['results']]
+        self.assertEqual(statuses, ['created', 'conflict', 'conflict', 'invalid'])
+        self.assertEqual(Appointment.objects.count(), 2)
+
+    def test_batch_invalidates_cached_availability(self):
+        self.assertEqual(booked_times(self.business, self.day, 'personal'), frozenset())
+        self.post([booking_payload(self.business, self.day, '08:00')])
+        self.assertEqual(booked_times(self.business, self.day, 'personal'), {time(8, 0)})
+
+    def test_race_after_conflict_query_is_caught(self):
+        items = [booking_payload(self.business, self.day, '08:00'), booking_payload(self.business, self.day, '09:00')]
+        original_filter = Appointment.objects.filter
+
+        def filter_then_race(*args, **kwargs):
+            # Another request books 09:00 right after the conflict query ran
+            taken = list(original_filter(*args, **kwargs).values_list('business_id', 'date', 'time', 'service_type'))
+            Appointment.objects.create(
+                business=self.business, service_type='personal', name='Gyorsabb',
+                phone='+36 30 123 4567', email='gyors@example.com', date=self.day, time=time(9, 0),
+            )
+            return mock.Mock(values_list=lambda *fields: taken)
+
+        with mock.patch.object(Appointment.objects, 'filter', side_effect=filter_then_race):
+            results = create_appointments_batch(items, atomic=False)
+        self.assertEqual([r['status'] for r in results], ['created', 'conflict'])
+        self.assertEqual(Appointment.objects.count(), 2)
+
+    def test_item_overlapping_a_longer_booking_is_a_conflict(self):
+        create_appointment(
+            business=self.business, service_type='personal', name='Hosszú', phone='+36 30 123 4567',
+            email='hosszu@example.com', date=self.day, time=time(10, 0), duration=120,
+        )
+        response = self.post([booking_payload(self.business, self.day, '11:00')], mode='best-effort')
+        self.assertEqual([r['status'] for r in response.json()['results']], ['conflict'])
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_overlapping_items_of_one_batch(self):
+        service = Service.objects.create(business=self.business, name='Hosszú kezelés', duration=120)
+        items = [
+            booking_payload(self.business, self.day, '14:00', service=service.pk),
+            booking_payload(self.business, self.day, '15:00'),
+        ]
+        response = self.post(items)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual([r['status'] for r in response.json()['results']], ['skipped', 'conflict'])
+        self.assertFalse(Appointment.objects.exists())
+        self.assertFalse(DayOccupancy.objects.exclude(mask=0).exists())
+
+        response = self.post(items, mode='best-effort')
+        self.assertEqual([r['status'] for r in response.json()['results']], ['created', 'conflict'])
+        self.assertEqual(booked_times(self.business, self.day, 'personal'), {time(14, 0), time(15, 0)})
+
+
+class ImportAppointmentsCommandTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.business = make_business()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def run_import(self, path, *args):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('import_appointments', path, *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_csv_import_in_batches(self):
+        lines = ['business,service_type,name,phone,email,date,time']
+        lines += [f'teszt-uzlet,personal,Vendég {i},+36 30 123 4567,v{i}@example.com,2020-01-{1 + i // 9:02d},{8 + i % 9:02d}:00' for i in range(25)]
+        lines.append('nincs-ilyen,personal,Rossz,+36 30 123 4567,r@example.com,2020-01-01,08:00')
+        stdout, stderr = self.run_import(self.write('import.csv', '\n'.join(lines)), '--batch-size', '10')
+        self.assertEqual(Appointment.objects.count(), 25)
+        self.assertIn('25 created', stdout)
+        self.assertIn('1 invalid', stdout)
+        self.assertIn("unknown business 'nincs-ilyen'", stderr)
+
+    def test_jsonl_conflicts_skip_or_update(self):
+        row = {'business': 'teszt-uzlet', 'service_type': 'massage', 'name': 'Régi', 'phone': '1', 'email': 'a@example.com', 'date': '2020-02-03', 'time': '10:00:00'}
+        path = self.write('import.jsonl', json.dumps(row) + '\n')
+        self.run_import(path)
+        stdout, _ = self.run_import(path)
+        self.assertIn('1 skipped', stdout)
+
+        row['name'] = 'Új'
+        stdout, _ = self.run_import(self.write('update.jsonl', json.dumps(row) + '\n{broken\n'), '--on-conflict', 'update')
+        self.assertIn('1 updated', stdout)
+        self.assertIn('1 invalid', stdout)
+        self.assertEqual(Appointment.objects.get().name, 'Új')
+
+    def test_row_booked_during_the_import_is_counted_as_skipped(self):
+        row = {'business': 'teszt-uzlet', 'service_type': 'massage', 'name': 'Import', 'phone': '1', 'email': 'a@example.com', 'date': '2020-02-03', 'time': '10:00:00'}
+        bulk_create = Appointment.objects.bulk_create
+
+        def booked_meanwhile(objs, **kwargs):
+            Appointment.objects.create(
+                business=self.business, service_type='massage', name='Közben', phone='2', email='b@example.com',
+                date=date(2020, 2, 3), time=time(10, 0),
+            )
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(Appointment.objects, 'bulk_create', side_effect=booked_meanwhile):
+            stdout, _ = self.run_import(self.write('import.jsonl', json.dumps(row) + '\n'))
+        self.assertIn('0 created', stdout)
+        self.assertIn('1 skipped', stdout)
+        self.assertEqual(Appointment.objects.get().name, 'Közben')
+
+
+class QueryCountMiddlewareTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        reset_request_totals()
+        self.business = make_business()
+        self.params = {'business': self.business.slug, 'date': (date.today() + timedelta(days=1)).isoformat()}
+
+    def server_timing(self, response):
+        match = re.fullmatch(r'db;dur=([\d.]+);desc="(\d+) queries", total;dur=([\d.]+)', response['Server-Timing'])
+        self.assertIsNotNone(match, response['Server-Timing'])
+        return int(match[2])
+
+    @override_settings(DEBUG=False)
+    def test_server_timing_counts_the_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/barber/api/available-times/', self.params)
+        self.assertEqual(self.server_timing(response), len(queries.captured_queries))
+        # Served from the availability cache
+        self.assertEqual(self.server_timing(self.client.get('/barber/api/available-times/', self.params)), 0)
+
+    async def test_async_stack_counts_queries_of_sync_code(self):
+        response = await self.async_client.get('/massage/api/available-times/', self.params)
+        self.assertGreater(self.server_timing(response), 0)
+
+    @override_settings(REQUEST_BUDGETS={'available_times': {'queries': 0}})
+    def test_over_budget_requests_are_logged_by_url_name(self):
+        with self.assertLogs('foglalas.middleware', 'WARNING') as logs:
+            self.client.get('/barber/api/available-times/', self.params)
+            # Cached now, no queries
+            self.client.get('/barber/api/available-times/', self.params)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('available_times over budget', logs.output[0])
+        self.client.get('/foglalas/kapcsolat/')
+        totals = request_totals()
+        self.assertEqual(totals['available_times']['requests'], 2)
+        self.assertEqual(totals['available_times']['over_budget'], 1)
+        self.assertEqual(totals['contact']['over_budget'], 0)
+
+
+class BackgroundLoggingTests(SimpleTestCase):
+    def test_handlers_run_on_the_listener_thread(self):
+        self.assertIsInstance(logging.getLogger().handlers[0], BackgroundQueueHandler)
+
+        seen = []
+
+        class Recorder(logging.Handler):
+            def emit(self, record):
+                seen.append((self.format(record), threading.current_thread().name))
+
+        records = queue.Queue(2)
+        handler = BackgroundQueueHandler(records, [Recorder()])
+        listener = DispatchingListener(records)
+        record = logging.makeLogRecord({'msg': 'foglalás %s', 'args': ({'id': 1},), 'levelno': logging.INFO})
+        handler.handle(record)
+        # Not formatted by the caller
+        self.assertEqual(record.args, ({'id': 1},))
+        handler.handle(record)
+        handler.handle(record)
+        self.assertEqual(handler.dropped, 1)
+
+        listener.start()
+        listener.stop()
+        self.assertEqual(seen[0][0], "foglalás {'id': 1}")
+        self.assertNotEqual(seen[0][1], threading.current_thread().name)
+
+    def test_sampling_keeps_every_nth_info_record(self):
+        sampler = SamplingFilter({'foglalas.views': 3})
+        info = [logging.makeLogRecord({'name': 'foglalas.views.sub', 'levelno': logging.INFO}) for _ in range(7)]
+        self.assertEqual([sampler.filter(record) for record in info], [True, False, False, True, False, False, True])
+        self.assertTrue(sampler.filter(logging.makeLogRecord({'name': 'foglalas.views', 'levelno': logging.WARNING})))
+        self.assertTrue(sampler.filter(logging.makeLogRecord({'name': 'foglalas.booking', 'levelno': logging.INFO})))
+
+    def test_structured_formatter(self):
+        record = logging.makeLogRecord({
+            'name': 'foglalas.views', 'levelname': 'INFO', 'msg': 'Appointment created: %s', 'args': (5,),
+            'business': 'teszt-uzlet',
+        })
+        entry = json.loads(StructuredFormatter().format(record))
+        self.assertEqual(entry['message'], 'Appointment created: 5')
+        self.assertEqual(entry['business'], 'teszt-uzlet')
+        self.assertEqual(entry['logger'], 'foglalas.views')
+
+
+class MetricsTests(TestCase):
+    """Metrics are per process and never reset, so the tests look at differences"""
+
+    def setUp(self):
+        reset_caches()
+        self.business = make_business()
+        self.day = date.today() + timedelta(days=1)
+
+    def sample(self, series):
+        for line in self.client.get('/metrics').content.decode().splitlines():
+            if line.startswith(series + ' '):
+                return float(line.rsplit(' ', 1)[1])
+        return 0.0
+
+    def bookings(self, outcome, business='teszt-uzlet', service_type='barber'):
+        return self.sample(f'foglalas_bookings_total{{business="{business}",service_type="{service_type}",outcome="{outcome}"}}')
+
+    def book(self, url, **payload):
+        return self.client.post(url, json.dumps(payload), content_type='application/json')
+
+    def test_booking_outcomes(self):
+        before = {outcome: self.bookings(outcome) for outcome in ('success', 'conflict', 'validation_error')}
+        unknown = self.bookings('validation_error', business='unknown')
+        self.book('/barber/api/book-appointment/', **booking_payload(self.business, self.day, '10:00'))
+        self.book('/barber/api/book-appointment/', **booking_payload(self.business, self.day, '10:00'))
+        self.book('/barber/api/book-appointment/', **booking_payload(self.business, self.day, '25:00'))
+        self.book('/barber/api/book-appointment/', **{**booking_payload(self.business, self.day, '11:00'), 'business': 'nincs-ilyen'})
+        for outcome in before:
+            self.assertEqual(self.bookings(outcome) - before[outcome], 1, outcome)
+        self.assertEqual(self.bookings('validation_error', business='unknown') - unknown, 1)
+
+    def test_foglalas_view_outcomes(self):
+        success = self.bookings('success', service_type='personal')
+        conflict = self.bookings('conflict', service_type='personal')
+        # Rejected before the business is looked up
+        invalid = self.bookings('validation_error', business='unknown', service_type='personal')
+        for slot in ('10:00', '10:00', '25:00'):
+            self.book('/foglalas/api/book-appointment/', **booking_payload(self.business, self.day, slot))
+        self.assertEqual(self.bookings('success', service_type='personal') - success, 1)
+        self.assertEqual(self.bookings('conflict', service_type='personal') - conflict, 1)
+        self.assertEqual(self.bookings('validation_error', business='unknown', service_type='personal') - invalid, 1)
+
+    def test_batch_items_are_counted(self):
+        before = self.bookings('success', service_type='personal')
+        items = [booking_payload(self.business, self.day, slot) for slot in ('09:00', '10:00')]
+        self.book('/foglalas/api/book-appointments/batch/', bookings=items)
+        self.assertEqual(self.bookings('success', service_type='personal') - before, 2)
+
+    async def test_async_conflict_is_a_conflict(self):
+        await sync_to_async(create_appointment)(
+            business=self.business, service_type='massage', name='Foglalt', phone='+36 30 123 4567',
+            email='foglalt@example.com', date=self.day, time=time(10, 0),
+        )
+        before = await sync_to_async(self.bookings)('conflict', service_type='massage')
+        body = json.dumps(booking_payload(self.business, self.day, '10:00'))
+        request = AsyncRequestFactory().post('/', body, content_type='application/json')
+        response = await massage_views.abook_appointment(request)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(await sync_to_async(self.bookings)('conflict', service_type='massage') - before, 1)
+
+    def test_latency_db_time_and_cache(self):
+        series = 'foglalas_http_request_duration_seconds_count{view="barber:available_times"}'
+        before, hits = self.sample(series), self.sample('foglalas_availability_cache_hits_total')
+        params = {'business': self.business.slug, 'date': self.day.isoformat()}
+        self.client.get('/barber/api/available-times/', params)
+        self.client.get('/barber/api/available-times/', params)
+        self.assertEqual(self.sample(series) - before, 2)
+        self.assertEqual(self.sample('foglalas_availability_cache_hits_total') - hits, 1)
+        self.assertGreater(self.sample('foglalas_db_queries_total{view="barber:available_times"}'), 0)
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('foglalas_http_request_db_seconds_bucket{view="barber:available_times",le="+Inf"}', body)
+        self.assertIn('# TYPE foglalas_availability_cache_hit_ratio gauge', body)
+
+    @override_settings(METRICS_TOKEN='titok')
+    def test_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer titok'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+
+class BenchmarkCommandTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def run_benchmark(self, *args):
+        stdout = io.StringIO()
+        call_command(
+            'benchmark', '--driver', 'client', '--businesses', '2', '--days', '2', '--appointments', '2',
+            '--requests', '5', '--concurrency', '1', *args, stdout=stdout, stderr=io.StringIO(),
+        )
+        return stdout.getvalue()
+
+    def test_seeding_is_deterministic(self):
+        businesses = seed_benchmark_data(2, 3, 4, seed=7)
+        first = sorted(Appointment.objects.values_list('business__slug', 'date', 'service_type', 'time'))
+        self.assertEqual(len(first), 2 * 3 * 3 * 4)
+        self.assertEqual(occupancy_differences(), [])
+        seed_benchmark_data(2, 3, 4, seed=7)
+        self.assertEqual(sorted(Appointment.objects.values_list('business__slug', 'date', 'service_type', 'time')), first)
+        with mock.patch('foglalas.signals.rebuild_occupancy') as rebuild:
+            self.assertEqual(remove_benchmark_data(), len(businesses))
+        # One bulk delete, not a post_delete rebuild per appointment
+        rebuild.assert_not_called()
+        self.assertFalse(Appointment.objects.exists())
+        self.assertFalse(DayOccupancy.objects.exists())
+
+    def test_results_and_baseline(self):
+        path = os.path.join(self.directory.name, 'baseline.json')
+        stdout = self.run_benchmark('--json', path)
+        self.assertIn('barber.book', stdout)
+        with open(path, encoding='utf-8') as f:
+            results = json.load(f)['results']['client']
+        self.assertEqual(set(results), {f'{app}.{endpoint}' for app in ('foglalas', 'barber', 'massage') for endpoint in ('times', 'book')} | {'foglalas.slots'})
+        self.assertEqual(set(results['foglalas.slots']), {'requests', 'rps', 'p50_ms', 'p95_ms', 'p99_ms', 'errors', 'statuses'})
+        self.assertFalse(Business.objects.filter(slug__startswith='benchmark-').exists())
+
+        self.assertIn('No regressions', self.run_benchmark('--endpoint', 'times', '--baseline', path, '--threshold', '1000'))
+        # A baseline far faster than any real run, so the check can't depend on timing
+        with open(path, encoding='utf-8') as f:
+            baseline = json.load(f)
+        for summary in baseline['results']['client'].values():
+            summary['rps'] *= 1000
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f)
+        with self.assertRaises(CommandError):
+            self.run_benchmark('--endpoint', 'times', '--baseline', path, '--threshold', '0.2')
+
+    def test_regressions(self):
+        baseline = {'wsgi': {'barber.times': {'rps': 100.0, 'p95_ms': 10.0, 'errors': 0}}}
+        fine = {'wsgi': {'barber.times': {'rps': 90.0, 'p95_ms': 11.0, 'errors': 0}, 'uj.times': {'rps': 1.0, 'p95_ms': 1.0, 'errors': 0}}}
+        self.assertEqual(regressions(fine, baseline, 0.2), [])
+        slow = {'wsgi': {'barber.times': {'rps': 70.0, 'p95_ms': 13.0, 'errors': 1}}}
+        self.assertEqual(len(regressions(slow, baseline, 0.2)), 3)
+
+
+class ConnectionReuseTests(TestCase):
+    def test_persistent_connections_are_opened_once(self):
+        with tempfile.TemporaryDirectory() as directory:
+            database = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(directory, 'kapcsolat.sqlite3')}
+            summary, opened = benchmark_connections(database, 'fresh', 5)
+            self.assertEqual((summary['requests'], opened), (5, 5))
+            summary, opened = benchmark_connections(database, 'persistent', 5)
+            self.assertEqual((summary['requests'], opened), (5, 1))
+
+    @skipIf(connection.vendor != 'postgresql', 'Connection pooling needs PostgreSQL')
+    def test_pool_reuses_its_connections(self):
+        _, opened = benchmark_connections(connection.settings_dict, 'pooled', 20)
+        self.assertLess(opened, 20)
+
+
+@override_settings(EXPORT_API_TOKEN='titok')
+class ExportAppointmentsTests(TestCase):
+    url = '/foglalas/api/appointments/export/'
+
+    def setUp(self):
+        self.business = make_business()
+        other = make_business(slug='masik-uzlet')
+        for day, business, service_type, duration in (
+            (date(2020, 1, 1), self.business, 'personal', None),
+            (date(2020, 1, 2), self.business, 'massage', 90),
+            (date(2020, 1, 3), other, 'personal', None),
+        ):
+            Appointment.objects.create(
+                business=business, service_type=service_type, name='Vendég, "Idézett"',
+                phone='+36 30 123 4567', email='v@example.com', date=day, time=time(9, 30), duration=duration,
+            )
+
+    def export(self, token='titok', **params):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        return self.client.get(self.url, params, **headers)
+
+    def test_requires_staff_or_token(self):
+        self.assertEqual(self.export(token=None).status_code, 403)
+        self.assertEqual(self.export(token='rossz').status_code, 403)
+
+    def test_csv_stream_uses_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.export(business='teszt-uzlet')
+            self.assertTrue(response.streaming)
+            content = b''.join(response.streaming_content).decode()
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[0][:3], ['id', 'business', 'service_type'])
+        self.assertEqual([row[1] for row in rows[1:]], ['teszt-uzlet', 'teszt-uzlet'])
+        self.assertEqual(rows[1][3], 'Vendég, "Idézett"')
+        self.assertEqual(rows[0][7:9], ['time', 'duration'])
+        self.assertEqual([row[7:9] for row in rows[1:]], [['09:30', ''], ['09:30', '90']])
+
+    def test_ndjson_filters(self):
+        response = self.export(format='ndjson', **{'from': '2020-01-02', 'service_type': 'personal'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['business'] for line in lines], ['masik-uzlet'])
+        self.assertEqual(json.loads(lines[0])['time'], '09:30')
+        self.assertIsNone(json.loads(lines[0])['duration'])
+
+    def test_command_streams_to_stdout(self):
+        stdout = io.StringIO()
+        call_command('export_appointments', '--format', 'ndjson', '--to', '2020-01-01', stdout=stdout)
+        self.assertEqual(len(stdout.getvalue().splitlines()), 1)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.business = make_business()
+        self.old_day = date.today() - timedelta(days=200)
+        self.future_day = date.today() + timedelta(days=1)
+        for day in (self.old_day, self.old_day + timedelta(days=1), self.future_day):
+            for hour in (9, 10):
+                Appointment.objects.create(
+                    business=self.business, service_type='personal', name='Archív Vendég',
+                    phone='+36 30 123 4567', email='a@example.com', date=day, time=time(hour),
+                )
+
+    def test_command_moves_past_appointments_in_resumable_batches(self):
+        ids = set(Appointment.objects.filter(date__lt=self.future_day).values_list('pk', flat=True))
+        stdout = io.StringIO()
+        call_command('archive_appointments', '--days', '30', '--batch-size', '3', '--max-batches', '1',
+                     stdout=stdout, stderr=io.StringIO())
+        self.assertIn('run again', stdout.getvalue())
+        self.assertEqual(ArchivedAppointment.objects.count(), 3)
+
+        call_command('archive_appointments', '--days', '30', '--batch-size', '3', stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(set(ArchivedAppointment.objects.values_list('pk', flat=True)), ids)
+        self.assertEqual(list(Appointment.objects.values_list('date', flat=True).distinct()), [self.future_day])
+        # The archived days' occupancy rows go too, the future one stays
+        self.assertEqual(occupancy_differences(), [])
+        self.assertEqual(list(DayOccupancy.objects.values_list('date', flat=True)), [self.future_day])
+
+    def test_archiving_announces_no_freed_slots(self):
+        with mock.patch('foglalas.signals.publish_slot_change') as publish:
+            self.assertEqual(archive_batch(date.today()), 4)
+        publish.assert_not_called()
+        self.assertEqual(archive_batch(date.today()), 0)
+
+    def test_archive_keeps_the_resource(self):
+        chair = Resource.objects.create(business=self.business, name='1. szék')
+        Appointment.objects.filter(date=self.old_day, time=time(9)).update(resource=chair)
+        archive_batch(date.today())
+        self.assertEqual(ArchivedAppointment.objects.get(date=self.old_day, time=time(9)).resource, chair)
+        # Removing the resource keeps its archived bookings
+        chair.delete()
+        self.assertIsNone(ArchivedAppointment.objects.get(date=self.old_day, time=time(9)).resource)
+
+    def test_exports_read_the_archive_too(self):
+        archive_batch(date.today())
+        stdout = io.StringIO()
+        call_command('export_appointments', '--format', 'ndjson', stdout=stdout)
+        rows = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual(len(rows), 6)
+        self.assertEqual([row['id'] for row in rows], sorted(row['id'] for row in rows))
+        stdout = io.StringIO()
+        call_command('export_appointments', '--format', 'ndjson', '--to', self.old_day.isoformat(), stdout=stdout)
+        self.assertEqual(len(stdout.getvalue().splitlines()), 2)
+
+
+WAL_PRAGMAS = {'journal_mode': 'WAL', 'busy_timeout': 5000, 'synchronous': 'NORMAL', 'mmap_size': 2 ** 24, 'cache_size': -2000}
+
+
+def sqlite_wrapper(path, alias, **options):
+    settings_dict = connections.configure_settings(
+        {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path, 'OPTIONS': options}},
+    )['default']
+    return load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, alias)
+
+
+@contextmanager
+def default_connection(wrapper):
+    """Run the ORM on wrapper (opened with the 'default' alias) instead of the test database, in this thread"""
+    previous = connections['default']
+    connections['default'] = wrapper
+    try:
+        yield
+    finally:
+        connections['default'] = previous
+
+
+class SQLiteProfileTests(SimpleTestCase):
+    # Queries go to files of their own, through connections swapped in as 'default'
+    databases = {'default'}
+    readers = 8
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'foglalas.sqlite3')
+        self.day = date.today() + timedelta(days=1)
+        # The registry would otherwise keep this file's businesses
+        invalidate_registry()
+        self.addCleanup(invalidate_registry)
+        writer = sqlite_wrapper(self.path, 'default')
+        # Created in the default rollback-journal mode (WAL would stick to the file)
+        with override_settings(SQLITE_PRAGMAS={}), default_connection(writer):
+            with writer.schema_editor() as editor:
+                for model in (Business, Service, Resource, Appointment, DayOccupancy):
+                    editor.create_model(model)
+            self.business = make_business()
+            self.book(time(9, 0))
+        writer.close()
+
+    def book(self, slot):
+        return create_appointment(
+            business=self.business, service_type='barber', name='Teszt Elek', phone='+36 30 123 4567',
+            email='teszt@example.com', date=self.day, time=slot,
+        )
+
+    def read_while_writing(self):
+        """(seconds, booked ranges seen) of every availability read while another connection books"""
+        # EXCLUSIVE takes the lock a commit takes at BEGIN, and holds it while the readers run
+        writer = sqlite_wrapper(self.path, 'default', transaction_mode='EXCLUSIVE')
+
+        def read(_):
+            reader = sqlite_wrapper(self.path, 'default', timeout=0.2)
+            started = time_module.perf_counter()
+            try:
+                with default_connection(reader):
+                    day = availability_by_day(self.business, self.day, self.day, 'barber')[self.day]
+                return time_module.perf_counter() - started, list(zip(day.starts, day.ends))
+            finally:
+                reader.close()
+
+        try:
+            with default_connection(writer), transaction.atomic():
+                self.book(time(10, 0))
+                with ThreadPoolExecutor(self.readers) as pool:
+                    results = list(pool.map(read, range(self.readers)))
+                transaction.set_rollback(True)
+            return results
+        finally:
+            writer.close()
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        with override_settings(SQLITE_PRAGMAS=WAL_PRAGMAS):
+            wrapper = sqlite_wrapper(self.path, 'profile')
+            with wrapper.cursor() as cursor:
+                values = {name: cursor.execute(f'PRAGMA {name}').fetchone()[0] for name in WAL_PRAGMAS}
+            wrapper.close()
+        self.assertEqual(values['journal_mode'], 'wal')
+        self.assertEqual(values['busy_timeout'], 5000)
+        self.assertEqual(values['synchronous'], 1)  # NORMAL
+        self.assertEqual(values['cache_size'], -2000)
+
+    def test_readers_do_not_block_on_a_writing_booking(self):
+        with override_settings(SQLITE_PRAGMAS=WAL_PRAGMAS):
+            results = self.read_while_writing()
+        # The 09:00 booking, not yet the uncommitted 10:00 one
+        self.assertEqual([booked for _, booked in results], [[(540, 600)]] * self.readers)
+        self.assertLess(max(seconds for seconds, _ in results), 0.2)
+
+    def test_rollback_journal_readers_are_locked_out(self):
+        with override_settings(SQLITE_PRAGMAS={}), self.assertRaisesRegex(OperationalError, 'locked'):
+            self.read_while_writing()
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        reset_caches()
+
+    def test_static_page_is_served_from_the_cache(self):
+        first = self.client.get('/barber/')
+        with mock.patch('barber.views.render') as render:
+            second = self.client.get('/barber/?utm_source=teszt')
+        render.assert_not_called()
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.content, first.content)
+
+    def test_business_save_invalidates_pages(self):
+        self.client.get('/massage/kapcsolat/')
+        business = Business.objects.get(slug='harmonia-masszazs')
+        business.phone = '+36 1 999 9999'
+        business.save()
+        self.assertContains(self.client.get('/massage/kapcsolat/'), '+36 1 999 9999')
+
+    def test_stale_registry_is_reloaded_for_a_newer_version(self):
+        self.client.get('/massage/kapcsolat/')
+        # Another worker saved the business: the version moved, this registry didn't hear of it
+        Business.objects.filter(slug='harmonia-masszazs').update(phone='+36 1 888 8888')
+        changed_at = time_module.time_ns() + 1
+        caches['default'].set('pages:version', (changed_at, changed_at), None)
+        self.assertContains(self.client.get('/massage/kapcsolat/'), '+36 1 888 8888')
+
+    def test_service_list_fragment_follows_service_changes(self):
+        business = Business.objects.get(slug='harmonia-masszazs')
+        service = Service.objects.create(business=business, name='Svédmasszázs', duration=60)
+        version = page_version()
+        self.assertContains(self.client.get('/massage/'), 'Svédmasszázs')
+        service.name = 'Frissített Masszázs'
+        service.save()
+        self.assertNotEqual(page_version(), version)
+        self.assertContains(self.client.get('/massage/'), 'Frissített Masszázs')
+
+    def test_posts_are_not_cached(self):
+        self.client.get('/barber/')
+        with mock.patch('barber.views.render', return_value=HttpResponse('friss')):
+            response = self.client.post('/barber/')
+        self.assertEqual(response.content, b'friss')
+
+
+class StaticBuildTests(SimpleTestCase):
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(STATIC_ROOT=root, STORAGES={
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'staticfiles': {'BACKEND': 'foglalas.storage.CompressedManifestStaticFilesStorage'},
+        }):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            with open(os.path.join(root, 'staticfiles.json'), encoding='utf-8') as manifest:
+                paths = json.load(manifest)['paths']
+            hashed = os.path.join(root, paths['js/booking.js'])
+            with open(hashed, 'rb') as source, gzip.open(hashed + '.gz') as packed:
+                self.assertEqual(packed.read(), source.read())
+        # One booking module for every app
+        self.assertNotIn('barber/js/booking.js', paths)
+        self.assertNotIn('massage/js/booking.js', paths)
+
+    def test_small_or_incompressible_files_get_no_variants(self):
+        self.assertEqual(compressed_variants(b'x' * 100), [])
+        self.assertEqual(compressed_variants(os.urandom(4096)), [])
+        self.assertEqual(compressed_variants(b'a' * 4096)[0][0], '.gz')
+
+
+class ResourceCapacityTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.business = make_business(time_interval=30)
+        self.day = date.today() + timedelta(days=1)
+
+    def add_resources(self, count, business=None):
+        business = business or self.business
+        return [Resource.objects.create(business=business, name=f'{n}. szék') for n in range(1, count + 1)]
+
+    def book(self, slot, duration=None, business=None):
+        return create_appointment(
+            business=business or self.business, service_type='barber', name='Teszt Elek',
+            phone='+36 30 123 4567', email='teszt@example.com', date=self.day, time=slot, duration=duration,
+        )
+
+    def test_slot_takes_one_booking_per_resource(self):
+        chairs = self.add_resources(3)
+        booked = [self.book(time(10, 0)).resource for _ in chairs]
+        self.assertEqual(booked, chairs)
+        self.assertEqual(booked_times(self.business, self.day, 'barber'), {time(10, 0)})
+        with self.assertRaises(SlotAlreadyBooked):
+            self.book(time(10, 0))
+        self.assertEqual(self.book(time(10, 30)).resource, chairs[0])
+        self.assertEqual(occupancy_differences(), [])
+
+    def test_partly_booked_slot_stays_available(self):
+        self.add_resources(2)
+        self.book(time(10, 0), duration=60)
+        self.assertEqual(booked_times(self.business, self.day, 'barber'), frozenset())
+        self.assertEqual(DayOccupancy.objects.get(business=self.business).mask, 0)
+
+    def test_booking_gets_a_resource_free_for_its_whole_length(self):
+        first, second = self.add_resources(2)
+        for resource, slot in ((first, time(10, 0)), (second, time(10, 30))):
+            Appointment.objects.create(
+                business=self.business, service_type='barber', name='Admin', phone='+36 30 123 4567',
+                email='admin@example.com', date=self.day, time=slot, resource=resource,
+            )
+        # Neither slot is full, but no one chair is free for the whole hour
+        with self.assertRaises(SlotAlreadyBooked):
+            self.book(time(10, 0), duration=60)
+        self.assertEqual(self.book(time(10, 0)).resource, second)
+        self.assertEqual(self.book(time(9, 0), duration=60).resource, first)
+
+    def test_query_count_does_not_depend_on_the_number_of_resources(self):
+        small = make_business(slug='kicsi', time_interval=30)
+        self.add_resources(1, small)
+        self.add_resources(6)
+        counts = []
+        for business in (small, self.business):
+            self.book(time(9, 0), business=business)
+            get_resources(business)
+            with CaptureQueriesContext(connection) as queries:
+                self.book(time(10, 0), business=business)
+            counts.append(len(queries))
+            with self.assertNumQueries(1):
+                booked_times(business, self.day, 'barber')
+        self.assertEqual(counts[0], counts[1])
+
+    def test_batch_assigns_resources(self):
+        self.add_resources(2)
+        get_resources(self.business)
+        items = [booking_payload(self.business, self.day, '10:00', service_type='barber') for _ in range(3)]
+        results = create_appointments_batch(items, atomic=False)
+        self.assertEqual([r['status'] for r in results], ['created', 'created', 'conflict'])
+        self.assertEqual(Appointment.objects.values('resource').distinct().count(), 2)
+        self.assertEqual(booked_times(self.business, self.day, 'barber'), {time(10, 0)})
+        self.assertEqual(occupancy_differences(), [])
+
+    def test_batch_rechecks_resources_in_its_transaction(self):
+        self.add_resources(1)
+        get_resources(self.business)
+        service = Service.objects.create(business=self.business, name='Hosszú vágás', duration=60)
+        claim_slots = booking._claim_slots
+
+        def booked_meanwhile(pending, shared):
+            # Overlaps the item with another start time, so no unique constraint catches it
+            self.book(time(10, 30))
+            return claim_slots(pending, shared)
+
+        items = [booking_payload(self.business, self.day, '10:00', service_type='barber', service=service.pk)]
+        with mock.patch('foglalas.booking._claim_slots', booked_meanwhile):
+            results = create_appointments_batch(items, atomic=False)
+        self.assertEqual(results[0]['status'], 'conflict')
+        self.assertEqual(Appointment.objects.count(), 1)
+        self.assertEqual(occupancy_differences(), [])
+
+    def test_events_only_when_a_slot_fills_up_or_frees(self):
+        self.add_resources(2)
+        with mock.patch('foglalas.signals.publish_slot_change') as publish:
+            first = self.book(time(10, 0))
+            publish.assert_not_called()
+            second = self.book(time(10, 0))
+            self.assertEqual([c.args[0] for c in publish.call_args_list], [SLOT_TAKEN])
+            second.delete()
+            self.assertEqual([c.args[0] for c in publish.call_args_list], [SLOT_TAKEN, SLOT_FREED])
+            # Both chairs were free again already
+            first.delete()
+            self.assertEqual(len(publish.call_args_list), 2)
+
+    def test_batch_announces_only_full_slots(self):
+        self.add_resources(2)
+        get_resources(self.business)
+        items = [booking_payload(self.business, self.day, slot, service_type='barber') for slot in ('10:00', '10:00', '11:00')]
+        with mock.patch('foglalas.booking.publish_slot_change') as publish:
+            create_appointments_batch(items)
+        # One event for the filled 10:00 slot, none for 11:00 with a chair still free
+        self.assertEqual([c.args[4] for c in publish.call_args_list], [time(10, 0)])
+
+    def test_deactivating_a_resource_rebuilds_the_masks(self):
+        first, second = self.add_resources(2)
+        self.book(time(10, 0))
+        self.assertEqual(booked_times(self.business, self.day, 'barber'), frozenset())
+        second.is_active = False
+        second.save()
+        self.assertEqual(booked_times(self.business, self.day, 'barber'), {time(10, 0)})
+        with self.assertRaises(SlotAlreadyBooked):
+            self.book(time(10, 0))
+        self.assertEqual(occupancy_differences(), [])
+
+
+def _stress_worker(business_id, day, slots, barrier, results):
+    """Child process: race every other worker for the same slots"""
+    business = Business.objects.get(pk=business_id)
+    slots = list(slots)
+    random.shuffle(slots)
+    booked = conflicts = errors = 0
+    barrier.wait()
+    for slot in slots:
+        try:
+            create_appointment(
+                business=business, service_type='personal', name='Stressz Teszt',
+                phone='+36 30 123 4567', email='stressz@example.com', date=day, time=slot,
+            )
+            booked += 1
+        except SlotAlreadyBooked:
+            conflicts += 1
+        except Exception:
+            errors += 1
+    connections.close_all()
+    results.put((booked, conflicts, errors))
+
+
+@skipIf(
+    'fork' not in multiprocessing.get_all_start_methods(),
+    'Multi-process stress test needs the fork start method',
+)
+class ConcurrentBookingStressTest(TransactionTestCase):
+    """Several processes book the same slots at once - the database must let exactly one win"""
+
+    workers = 8
+    slot_count = 32
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Needs a shared database: set DB_TEST_NAME or use PostgreSQL')
+
+    def test_no_double_bookings_under_concurrency(self):
+        business = make_business(time_interval=30)
+        day = date.today() + timedelta(days=1)
+        slots = [time(hour=8 + i // 2, minute=(i % 2) * 30) for i in range(self.slot_count)]
+
+        # Children must open their own connections
+        connections.close_all()
+        ctx = multiprocessing.get_context('fork')
+        barrier = ctx.Barrier(self.workers + 1)
+        results = ctx.Queue()
+        processes = [
+            ctx.Process(target=_stress_worker, args=(business.pk, day, slots, barrier, results))
+            for _ in range(self.workers)
+        ]
+        for process in processes:
+            process.start()
+        barrier.wait()
+        started = time_module.perf_counter()
+        outcomes = [results.get(timeout=120) for _ in processes]
+        elapsed = time_module.perf_counter() - started
+        for process in processes:
+            process.join()
+
+        booked = sum(o[0] for o in outcomes)
+        attempts = self.workers * self.slot_count
+        duplicates = (
+            Appointment.objects
+            .values('business', 'date', 'time', 'service_type')
+            .annotate(n=Count('id'))
+            .filter(n__gt=1)
+        )
+        self.assertFalse(duplicates.exists())
+        self.assertEqual(Appointment.objects.count(), booked)
+        self.assertEqual(occupancy_differences(), [])
+        self.assertLessEqual(booked, self.slot_count)
+        print(
+            f"\n{attempts} attempts from {self.workers} processes in {elapsed:.2f}s: "
+            f"{booked} booked, {sum(o[1] for o in outcomes)} conflicts, "
+            f"{sum(o[2] for o in outcomes)} errors ({attempts / elapsed:.0f} attempts/s, "
+            f"{booked / elapsed:.0f} bookings/s)"
+        )
@@ -1,6 +1,21 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Under ASGI the API is served by the native async views (settings.ASYNC_VIEWS)
+if settings.ASYNC_VIEWS:
+    book_appointment = views.abook_appointment
+    available_times = views.aget_available_times
+    available_times_range = views.aget_available_times_range
+    slot_events = views.aslot_events
+    get_slots = views.aget_slots
+else:
+    book_appointment = views.book_appointment
+    available_times = views.get_available_times
+    available_times_range = views.get_available_times_range
+    slot_events = views.slot_events
+    get_slots = views.get_slots
+
 urlpatterns = [
     # Main website pages
     path('', views.index, name='index'),
@@ -9,7 +24,11 @@ urlpatterns = [
     path('idopont-foglalas/', views.foglalas_form, name='foglalas_form'),
     
     # API endpoints  
-    path('api/book-appointment/', views.book_appointment, name='book_appointment'),
-    path('api/available-times/', views.get_available_times, name='available_times'),
-    path('api/slots/', views.get_slots, name='get_slots'),
+    path('api/book-appointment/', book_appointment, name='book_appointment'),
+    path('api/book-appointments/batch/', views.book_appointments_batch, name='book_appointments_batch'),
+    path('api/available-times/', available_times, name='available_times'),
+    path('api/available-times/range/', available_times_range, name='available_times_range'),
+    path('api/slot-events/', slot_events, name='slot_events'),
+    path('api/slots/', get_slots, name='get_slots'),
+    path('api/appointments/export/', views.export_appointments, name='export_appointments'),
 ]
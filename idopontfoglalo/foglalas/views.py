@@ -1,91 +1,65 @@
-from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.shortcuts import render
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
 from rest_framework.decorators import api_view
-from .models import Appointment, Business, Service
-from datetime import time
+from .models import Business, Service
+from .booking import MAX_BATCH_SIZE, SlotAlreadyBooked, acreate_appointment, create_appointment, create_appointments_batch
+from .slots import get_slot_grid
+from .export import EXPORT_FORMATS, export_rows, iter_export
+from .events import aslot_events_response, slot_events_response
+from .metrics import REGISTRY, booking_labels, count_booking
+from .pages import cached_page, fragment_context
+from .availability import (
+    DayAvailability, aavailable_times_range_response, aavailable_times_response, aget_day_availability, aservice_length,
+    availability_etag, available_times_range_response, available_times_response, conditional_response,
+    get_day_availability, service_length,
+)
+from .registry import (
+    afirst_business, aget_business, aget_service, find_business, first_business, get_business, get_service,
+    get_services,
+)
+import hmac
 import json
 import logging
-from datetime import time, datetime
-from django.db import transaction
+from datetime import datetime
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-
-def ensure_businesses_exist():
-    """Ensure basic businesses exist in the database, create them if missing"""
-    if Business.objects.exists():
-        return  # Businesses already exist
-    
-    logger.info("No businesses found in database, creating initial businesses...")
-    
-    businesses_data = [
-        {
-            'name': 'Stílus Fodrászat',
-            'slug': 'stilus-fodraszat',
-            'description': 'Professzionális fodrász szolgáltatások minden korosztály számára.',
-            'address': '1052 Budapest, Váci utca 15.',
-            'phone': '+36 1 234 5678',
-            'email': 'info@stilusfodraszat.hu',
-            'time_interval': 30,
-        },
-        {
-            'name': 'Harmónia Masszázs Szalon',
-            'slug': 'harmonia-masszazs',
-            'description': 'Relaxáló masszázs és wellness szolgáltatások a belvárosban.',
-            'address': '1051 Budapest, József Attila utca 12.',
-            'phone': '+36 1 345 6789',
-            'email': 'info@harmoniamasszazs.hu',
-            'time_interval': 60,
-        },
-        {
-            'name': 'Szakértői Tanácsadás',
-            'slug': 'szakertoi-tanacsadas',
-            'description': 'Személyre szabott konzultáció és szakértői tanácsadás.',
-            'address': '1053 Budapest, Kossuth Lajos utca 8.',
-            'phone': '+36 1 456 7890',
-            'email': 'info@szakertoi-tanacsadas.hu',
-            'time_interval': 60,
-        }
-    ]
-    
-    try:
-        with transaction.atomic():
-            for business_data in businesses_data:
-                Business.objects.create(**business_data)
-        logger.info(f"Successfully created {len(businesses_data)} businesses")
-    except Exception as e:
-        logger.error(f"Failed to create businesses: {e}")
+# Batch item status -> foglalas_bookings_total outcome ('skipped' items are not attempts)
+BATCH_OUTCOMES = {'created': 'success', 'conflict': 'conflict', 'invalid': 'validation_error'}
 
 
 # Homepage view
 def index(request):
     """Homepage - Hero section with service overview for personal consultation"""
-    ensure_businesses_exist()
-    business = Business.objects.filter(slug='szakertoi-tanacsadas').first()
-    services = Service.objects.filter(business=business)[:4] if business else []
+    business = find_business('szakertoi-tanacsadas')
+    services = get_services(business)[:4]
+    # The service list is a cached fragment (see the template)
     return render(request, 'foglalas/index.html', {
         'business': business,
-        'services': services
+        'services': services,
+        **fragment_context(),
     })
 
 # About page view  
+@cached_page
 def about(request):
     """About page - Personal consultation details, philosophy, services with prices"""
-    ensure_businesses_exist()
-    business = Business.objects.filter(slug='szakertoi-tanacsadas').first()
-    services = Service.objects.filter(business=business) if business else []
+    business = find_business('szakertoi-tanacsadas')
+    services = get_services(business)
     return render(request, 'foglalas/about.html', {
         'business': business,
         'services': services
     })
 
 # Contact page view
+@cached_page
 def contact(request):
     """Contact page - Contact info, hours, map, contact form"""
-    ensure_businesses_exist()
-    business = Business.objects.filter(slug='szakertoi-tanacsadas').first()
+    business = find_business('szakertoi-tanacsadas')
     return render(request, 'foglalas/contact.html', {
         'business': business
     })
@@ -93,347 +67,453 @@ def contact(request):
 # Updated booking form view
 def foglalas_form(request):
     """Booking form for personal consultation"""
-    business = Business.objects.filter(slug='szakertoi-tanacsadas').first()
+    business = find_business('szakertoi-tanacsadas')
     return render(request, 'foglalas/book.html', {
         'business': business
     })
 
 
 
+def _booking_error(message, status=400):
+    return JsonResponse({'status': 'error', 'message': message}, status=status)
+
+
+def _parse_booking(data):
+    """Validated book_appointment fields (without business and duration), or the error response"""
+    # Validate required fields
+    required_fields = ['business', 'name', 'phone', 'email', 'date', 'time']
+    for field in required_fields:
+        if not data.get(field):
+            logger.warning("Missing required field: %s", field)
+            return _booking_error(f'A {field} mező kitöltése kötelező')
+
+    # Validate date format
+    try:
+        appointment_date = datetime.strptime(data['date'], '%Y-%m-%d').date()
+        if appointment_date < datetime.now().date():
+            return _booking_error('Múltbeli dátumra nem lehet időpontot foglalni')
+    except ValueError:
+        return _booking_error('Érvénytelen dátum formátum')
+
+    # Validate time format
+    try:
+        appointment_time = datetime.strptime(data['time'], '%H:%M').time()
+    except ValueError:
+        return _booking_error('Érvénytelen idő formátum')
+
+    return {
+        'service_type': data.get('service_type', 'personal'),  # Default to personal for foglalas app
+        'name': data['name'].strip(),
+        'phone': data['phone'].strip(),
+        'email': data['email'].strip(),
+        'date': appointment_date,
+        'time': appointment_time,
+    }
+
+
+def _booking_request(request):
+    """(data, fields) of a book_appointment request, or the error response - shared by the sync and async view.
+
+    Rejected requests are counted here, before any business lookup, so
+    their business label is 'unknown'.
+    """
+    if request.method != 'POST':
+        return _booking_error('Csak POST kérés engedélyezett', status=405)
+    logger.info("book_appointment called")
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError as e:
+        logger.error("Invalid JSON in request: %s", e)
+        count_booking('validation_error')
+        return _booking_error('Érvénytelen JSON formátum')
+    if not isinstance(data, dict):
+        count_booking('validation_error')
+        return _booking_error('Érvénytelen JSON formátum')
+    try:
+        fields = _parse_booking(data)
+    except Exception as e:
+        logger.error("Unexpected error in book_appointment: %s", e)
+        count_booking('server_error', service_type=data.get('service_type', 'personal'))
+        return _booking_error('Váratlan hiba történt', status=500)
+    if isinstance(fields, JsonResponse):
+        count_booking('validation_error', service_type=data.get('service_type', 'personal'))
+        return fields
+    return data, fields
+
+
+def _booking_failure(error, data, fields, business):
+    """Error response (and count) for what the business/service lookup or create_appointment raised"""
+    if isinstance(error, Business.DoesNotExist):
+        logger.warning("Business not found with slug: %s", data['business'])
+        count_booking('validation_error', None, fields['service_type'])
+        return _booking_error('Nincs ilyen vállalkozás')
+    if isinstance(error, Service.DoesNotExist):
+        logger.warning("Unknown service %s for business %s", data['service'], data['business'])
+        count_booking('validation_error', business, fields['service_type'])
+        return _booking_error('Ismeretlen szolgáltatás')
+    if isinstance(error, SlotAlreadyBooked):
+        logger.warning(
+            "Time slot already booked: %s %s", fields['date'], fields['time'],
+            extra={'business': data['business'], 'service_type': fields['service_type']},
+        )
+        count_booking('conflict', business, fields['service_type'])
+        return _booking_error('Ez az időpont már foglalt')
+    logger.error("Error creating appointment: %s", error)
+    count_booking('server_error', business, fields['service_type'])
+    return _booking_error('Hiba a foglalás létrehozásakor', status=500)
+
+
+def _booking_created(appointment):
+    count_booking('success', appointment.business, appointment.service_type)
+    logger.info(
+        "Appointment created: %s", appointment,
+        extra={'business': appointment.business.slug, 'service_type': appointment.service_type, 'appointment_id': appointment.pk},
+    )
+    return JsonResponse({'status': 'success', 'message': 'Foglalás sikeresen létrehozva'})
+
+
 # 📅 Időpont foglalása
 @csrf_exempt
 def book_appointment(request):
-    if request.method == 'POST':
-        try:
-            logger.info(f"book_appointment called")
-            data = json.loads(request.body)
-            slug = data.get('business')
-            service_type = data.get('service_type', 'personal')  # Default to personal for foglalas app
-
-            # Validate required fields
-            required_fields = ['business', 'name', 'phone', 'email', 'date', 'time']
-            for field in required_fields:
-                if not data.get(field):
-                    logger.warning(f"Missing required field: {field}")
-                    return JsonResponse({
-                        'status': 'error', 
-                        'message': f'A {field} mező kitöltése kötelező'
-                    }, status=400)
-
-            # Validate date format
-            try:
-                appointment_date = datetime.strptime(data['date'], '%Y-%m-%d').date()
-                if appointment_date < datetime.now().date():
-                    return JsonResponse({
-                        'status': 'error',
-                        'message': 'Múltbeli dátumra nem lehet időpontot foglalni'
-                    }, status=400)
-            except ValueError:
-                return JsonResponse({
-                    'status': 'error',
-                    'message': 'Érvénytelen dátum formátum'
-                }, status=400)
-
-            # Validate time format
-            try:
-                appointment_time = datetime.strptime(data['time'], '%H:%M').time()
-            except ValueError:
-                return JsonResponse({
-                    'status': 'error',
-                    'message': 'Érvénytelen idő formátum'
-                }, status=400)
-
-            # 🔍 Lekérjük a Business példányt slug alapján
-            try:
-                business = Business.objects.get(slug=slug)
-                logger.info(f"Found business: {business.name}")
-            except Business.DoesNotExist:
-                logger.warning(f"Business not found with slug: {slug}")
-                return JsonResponse({
-                    'status': 'error', 
-                    'message': 'Nincs ilyen vállalkozás'
-                }, status=400)
-
-            # Check if time slot is already booked
-            try:
-                existing_appointment = Appointment.objects.filter(
-                    business=business,
-                    date=appointment_date,
-                    time=appointment_time
-                ).first()
-                
-                if existing_appointment:
-                    logger.warning(f"Time slot already booked: {appointment_date} {appointment_time}")
-                    return JsonResponse({
-                        'status': 'error',
-                        'message': 'Ez az időpont már foglalt'
-                    }, status=400)
-            except Exception as e:
-                logger.error(f"Error checking existing appointments: {e}")
+    parsed = _booking_request(request)
+    if isinstance(parsed, JsonResponse):
+        return parsed
+    data, fields = parsed
+    business = None
+    try:
+        # 🔍 A Business a slug alapján, a szolgáltatás hossza határozza meg, meddig tart
+        business = get_business(data['business'])
+        duration = get_service(business, data['service']).duration if data.get('service') else None
+        # 📝 Létrehozzuk a foglalást - az ütközést az adatbázis jelzi
+        appointment = create_appointment(business=business, duration=duration, **fields)
+    except Exception as e:
+        return _booking_failure(e, data, fields, business)
+    return _booking_created(appointment)
 
-            # 📝 Létrehozzuk a foglalást
-            try:
-                appointment = Appointment.objects.create(
-                    business=business,
-                    service_type=service_type,
-                    name=data['name'].strip(),
-                    phone=data['phone'].strip(),
-                    email=data['email'].strip(),
-                    date=appointment_date,
-                    time=appointment_time
-                )
-                logger.info(f"Appointment created: {appointment}")
-                return JsonResponse({'status': 'success', 'message': 'Foglalás sikeresen létrehozva'})
-            except Exception as e:
-                logger.error(f"Error creating appointment: {e}")
-                return JsonResponse({
-                    'status': 'error',
-                    'message': 'Hiba a foglalás létrehozásakor'
-                }, status=500)
-                
-        except json.JSONDecodeError as e:
-            logger.error(f"Invalid JSON in request: {e}")
-            return JsonResponse({
-                'status': 'error', 
-                'message': 'Érvénytelen JSON formátum'
-            }, status=400)
-        except Exception as e:
-            logger.error(f"Unexpected error in book_appointment: {e}")
-            return JsonResponse({
-                'status': 'error', 
-                'message': 'Váratlan hiba történt'
-            }, status=500)
 
+@csrf_exempt
+async def abook_appointment(request):
+    """book_appointment for ASGI - only the INSERT transaction leaves the event loop"""
+    parsed = _booking_request(request)
+    if isinstance(parsed, JsonResponse):
+        return parsed
+    data, fields = parsed
+    business = None
+    try:
+        business = await aget_business(data['business'])
+        duration = (await aget_service(business, data['service'])).duration if data.get('service') else None
+        appointment = await acreate_appointment(business=business, duration=duration, **fields)
+    except Exception as e:
+        return _booking_failure(e, data, fields, business)
+    return _booking_created(appointment)
+
+# 📅 Több időpont foglalása egyszerre (recepció, partner integrációk)
+@csrf_exempt
+def book_appointments_batch(request):
+    """Book a list of slots in one transaction.
+
+    Body: {"mode": "atomic" | "best-effort", "bookings": [{...book_appointment fields...}]}.
+    In atomic mode (default) nothing is booked unless every item can be.
+    """
+    if request.method != 'POST':
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Csak POST kérés engedélyezett'
+        }, status=405)
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError as e:
+        logger.error("Invalid JSON in batch request: %s", e)
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Érvénytelen JSON formátum'
+        }, status=400)
+
+    bookings = data.get('bookings') if isinstance(data, dict) else None
+    mode = data.get('mode', 'atomic') if isinstance(data, dict) else None
+    if not isinstance(bookings, list) or not bookings:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'A bookings lista megadása kötelező'
+        }, status=400)
+    if len(bookings) > MAX_BATCH_SIZE:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Egyszerre legfeljebb {MAX_BATCH_SIZE} foglalás küldhető'
+        }, status=400)
+    if mode not in ('atomic', 'best-effort'):
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Ismeretlen mód (atomic vagy best-effort)'
+        }, status=400)
+
+    try:
+        results = create_appointments_batch(bookings, atomic=(mode == 'atomic'))
+    except Exception as e:
+        logger.error("Unexpected error in book_appointments_batch: %s", e)
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Váratlan hiba történt'
+        }, status=500)
+
+    created = sum(1 for result in results if result['status'] == 'created')
+    logger.info("Batch booking (%s): %s/%s created", mode, created, len(results))
+    for result in results:
+        outcome = BATCH_OUTCOMES.get(result['status'])
+        if outcome:
+            count_booking(outcome, *booking_labels(bookings[result['index']]))
+    if created == len(results):
+        status, http_status = 'success', 200
+    elif created:
+        status, http_status = 'partial', 207
+    else:
+        status, http_status = 'error', 409
     return JsonResponse({
-        'status': 'error', 
-        'message': 'Csak POST kérés engedélyezett'
-    }, status=405)
+        'status': status,
+        'created': created,
+        'results': results
+    }, status=http_status)
 
 def get_available_times(request):
-    """API endpoint to get available appointment times - Simple 8-16 hourly slots"""
-    logger.info(f"get_available_times called with params: {dict(request.GET)}")
-    
-    slug = request.GET.get('business')
-    date_str = request.GET.get('date')
+    """API endpoint to get available appointment times - 8-17 slots, ?service= limits them to starts where it fits"""
+    return available_times_response(request, 8, 17)
 
-    if not slug or not date_str:
-        logger.warning(f"Missing parameters - business: {slug}, date: {date_str}")
-        return JsonResponse({'times': [], 'error': 'missing-params', 'message': 'Hiányozó paraméterek'}, status=400)
+async def aget_available_times(request):
+    """get_available_times for ASGI"""
+    return await aavailable_times_response(request, 8, 17)
 
-    try:
-        business = Business.objects.get(slug=slug)
-        logger.info(f"Found business: {business.name}")
-    except Business.DoesNotExist:
-        logger.warning(f"Business not found with slug: {slug}")
-        return JsonResponse({'times': [], 'error': 'unknown-business', 'message': 'Ismeretlen vállalkozás'}, status=404)
+def get_available_times_range(request):
+    """API endpoint to get available times for every day of a date range - one query per range"""
+    return available_times_range_response(request, 8, 17)
+
+async def aget_available_times_range(request):
+    """get_available_times_range for ASGI"""
+    return await aavailable_times_range_response(request, 8, 17)
+
+def slot_events(request):
+    """Server-Sent Events of the slots taken and freed on ?business=&date="""
+    return slot_events_response(request)
+
+async def aslot_events(request):
+    """slot_events for ASGI"""
+    return await aslot_events_response(request)
+
+def _slots_params(request):
+    """(date, service id) of a get_slots request, or the error response"""
+    logger.info("get_slots called with params: %s", request.GET)
+
+    # Get query parameters
+    date_str = request.GET.get('date')
+    service_id = request.GET.get('service')
+
+    # Validate required parameters
+    if not date_str:
+        logger.warning("Missing date parameter in get_slots request")
+        return JsonResponse({
+            'error': 'missing-date',
+            'message': 'A dátum megadása kötelező',
+            'slots': []
+        }, status=400)
 
+    # Parse and validate date
     try:
         target_date = datetime.strptime(date_str, '%Y-%m-%d').date()
         # Check if date is in the past
         if target_date < datetime.now().date():
-            logger.warning(f"Past date requested: {date_str}")
-            return JsonResponse({'times': [], 'error': 'past-date', 'message': 'Múltbeli dátumra nem lehet időpontot foglalni'}, status=400)
+            logger.warning("Past date requested: %s", date_str)
+            return JsonResponse({
+                'error': 'past-date',
+                'message': 'Múltbeli dátumra nem lehet időpontot foglalni',
+                'slots': []
+            }, status=400)
     except ValueError as e:
-        logger.warning(f"Invalid date format: {date_str}, error: {e}")
-        return JsonResponse({'times': [], 'error': 'bad-date', 'message': 'Érvénytelen dátum formátum'}, status=400)
-
-    try:
-        # Generate time slots based on business time_interval setting
-        all_times = []
-        interval_minutes = business.time_interval  # 30 or 60 minutes
-        start_hour = 8  # 8:00 AM
-        end_hour = 17   # 5:00 PM (17:00)
-        
-        current_hour = start_hour
-        current_minute = 0
-        
-        while current_hour < end_hour or (current_hour == end_hour and current_minute == 0):
-            all_times.append(time(hour=current_hour, minute=current_minute))
-            
-            # Add interval
-            current_minute += interval_minutes
-            if current_minute >= 60:
-                current_hour += 1
-                current_minute = 0
-
-        # Get booked times for this business and date
-        booked_times = set(
-            Appointment.objects
-            .filter(business=business, date=target_date)
-            .values_list('time', flat=True)
-        )
-        
-        logger.info(f"Found {len(booked_times)} booked appointments for {target_date}")
-
-        # Filter out booked times
-        available = [t.strftime('%H:%M') for t in all_times if t not in booked_times]
-        
-        logger.info(f"Returning {len(available)} available times")
-        
-        return JsonResponse({
-            'times': available,
-            'message': f'{len(available)} szabad időpont található'
-        })
-        
-    except Exception as e:
-        logger.error(f"Error generating available times: {e}")
+        logger.warning("Invalid date format: %s, error: %s", date_str, e)
         return JsonResponse({
-            'times': [], 
-            'error': 'server-error', 
-            'message': 'Szerver hiba történt'
-        }, status=500)
+            'error': 'invalid-date',
+            'message': 'Érvénytelen dátum formátum',
+            'slots': []
+        }, status=400)
+
+    return target_date, service_id
+
+def _mock_slots_response():
+    logger.warning("No business found in database - run migrate or setup_businesses")
+    # Return mock data with warning if no business exists
+    mock_slots = [
+        {"start": "09:00", "end": "09:30"},
+        {"start": "09:30", "end": "10:00"},
+        {"start": "10:00", "end": "10:30"},
+        {"start": "10:30", "end": "11:00"},
+        {"start": "11:00", "end": "11:30"},
+        {"start": "14:00", "end": "14:30"},
+        {"start": "14:30", "end": "15:00"},
+        {"start": "15:00", "end": "15:30"},
+        {"start": "15:30", "end": "16:00"},
+        {"start": "16:00", "end": "16:30"}
+    ]
+    return JsonResponse({
+        'slots': mock_slots,
+        'warning': 'mock-data',
+        'message': 'Teszt adatok használata'
+    })
+
+def _slots_response(slots):
+    return JsonResponse({
+        'slots': slots,
+        'message': f'{len(slots)} szabad időpont található'
+    })
+
+def _slots_error(e):
+    logger.error("Unexpected error in get_slots: %s", e)
+    return JsonResponse({
+        'error': 'server-error',
+        'message': 'Szerver hiba történt',
+        'slots': []
+    }, status=500)
+
+def _free_slots(grid, day, length):
+    slots = day.free_slots(grid, length, latest_end=17 * 60)
+    logger.info("Returning %s available slots", len(slots))
+    return slots
 
 @api_view(["GET"])
 def get_slots(request):
     """API endpoint to get available time slots for appointment booking"""
     try:
-        logger.info(f"get_slots called with params: {dict(request.GET)}")
-        
-        # Get query parameters
-        date_str = request.GET.get('date')
-        service_id = request.GET.get('service')
-        location_id = request.GET.get('location')
-        
-        # Validate required parameters
-        if not date_str:
-            logger.warning("Missing date parameter in get_slots request")
-            return JsonResponse({
-                'error': 'missing-date',
-                'message': 'A dátum megadása kötelező',
-                'slots': []
-            }, status=400)
-        
-        # Parse and validate date
-        try:
-            target_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            # Check if date is in the past
-            if target_date < datetime.now().date():
-                logger.warning(f"Past date requested: {date_str}")
-                return JsonResponse({
-                    'error': 'past-date',
-                    'message': 'Múltbeli dátumra nem lehet időpontot foglalni',
-                    'slots': []
-                }, status=400)
-        except ValueError as e:
-            logger.warning(f"Invalid date format: {date_str}, error: {e}")
-            return JsonResponse({
-                'error': 'invalid-date',
-                'message': 'Érvénytelen dátum formátum',
-                'slots': []
-            }, status=400)
-        
+        params = _slots_params(request)
+        if isinstance(params, JsonResponse):
+            return params
+        target_date, service_id = params
+
         # Try to get business from database
         try:
-            # Ensure businesses exist before trying to get them
-            ensure_businesses_exist()
-            business = Business.objects.first()  # Use first available business
+            business = first_business()  # Use first available business
             if not business:
-                logger.warning("No business found in database even after initialization attempt")
-                # Return mock data with warning if no business exists
-                mock_slots = [
-                    {"start": "09:00", "end": "09:30"},
-                    {"start": "09:30", "end": "10:00"},
-                    {"start": "10:00", "end": "10:30"},
-                    {"start": "10:30", "end": "11:00"},
-                    {"start": "11:00", "end": "11:30"},
-                    {"start": "14:00", "end": "14:30"},
-                    {"start": "14:30", "end": "15:00"},
-                    {"start": "15:00", "end": "15:30"},
-                    {"start": "15:30", "end": "16:00"},
-                    {"start": "16:00", "end": "16:30"}
-                ]
-                return JsonResponse({
-                    'slots': mock_slots,
-                    'warning': 'mock-data',
-                    'message': 'Teszt adatok használata'
-                })
-            
+                return _mock_slots_response()
             interval_minutes = business.time_interval
-            logger.info(f"Using business: {business.name} with {interval_minutes}min intervals")
-            
+            logger.info("Using business: %s with %smin intervals", business.name, interval_minutes)
         except Exception as e:
-            logger.error(f"Database error getting business: {e}")
+            logger.error("Database error getting business: %s", e)
             # Fallback to default interval
             interval_minutes = 30
             business = None
-            
-        # Generate time slots
-        try:
-            all_times = []
-            start_hour = 9  # 9:00 AM
-            end_hour = 17   # 5:00 PM (17:00)
-            
-            current_hour = start_hour
-            current_minute = 0
-            
-            while current_hour < end_hour:
-                start_time = time(hour=current_hour, minute=current_minute)
-                
-                # Calculate end time
-                end_minute = current_minute + interval_minutes
-                end_hour_calc = current_hour
-                if end_minute >= 60:
-                    end_hour_calc += 1
-                    end_minute = end_minute % 60
-                
-                # Don't add slots that would end after business hours
-                if end_hour_calc < end_hour or (end_hour_calc == end_hour and end_minute == 0):
-                    all_times.append({
-                        "start": start_time.strftime('%H:%M'),
-                        "end": time(hour=end_hour_calc, minute=end_minute).strftime('%H:%M')
-                    })
-                
-                # Move to next slot
-                current_minute += interval_minutes
-                if current_minute >= 60:
-                    current_hour += 1
-                    current_minute = 0
-            
-            logger.info(f"Generated {len(all_times)} time slots")
-            
-        except Exception as e:
-            logger.error(f"Error generating time slots: {e}")
-            return JsonResponse({
-                'error': 'slot-generation-failed',
-                'message': 'Hiba az időpontok generálásakor',
-                'slots': []
-            }, status=500)
-        
+
+        # Precomputed 9:00-17:00 slot grid, every slot ends by closing time
+        grid = get_slot_grid(interval_minutes, 9, 17, include_closing_time=False)
+        logger.info("Using %s time slots", len(grid.times))
+
         # Get booked times if business exists
-        available_slots = all_times
         if business:
             try:
-                booked_times = set(
-                    Appointment.objects
-                    .filter(business=business, date=target_date)
-                    .values_list('time', flat=True)
+                # With a service only the starts where all of it fits are free
+                try:
+                    length = service_length(business, service_id)
+                except Service.DoesNotExist:
+                    logger.warning("Unknown service %s, using one slot", service_id)
+                    length = interval_minutes
+                day = get_day_availability(business, target_date)
+                # Unchanged day: 304 without building the slot list
+                return conditional_response(
+                    request, availability_etag(business, day, 'slots', length),
+                    lambda: _slots_response(_free_slots(grid, day, length)),
                 )
-                
-                logger.info(f"Found {len(booked_times)} booked appointments for {target_date}")
-                
-                # Filter out booked times
-                available_slots = []
-                for slot in all_times:
-                    start_time = datetime.strptime(slot["start"], '%H:%M').time()
-                    if start_time not in booked_times:
-                        available_slots.append(slot)
-                        
-                logger.info(f"Returning {len(available_slots)} available slots")
-                        
             except Exception as e:
-                logger.error(f"Error filtering booked times: {e}")
+                logger.error("Error filtering booked times: %s", e)
                 # Return all generated slots if there's an error checking bookings
                 logger.warning("Returning all slots due to booking check error")
-        
-        return JsonResponse({
-            'slots': available_slots,
-            'message': f'{len(available_slots)} szabad időpont található'
-        })
-        
+
+        return _slots_response(DayAvailability().free_slots(grid, interval_minutes))
+
     except Exception as e:
-        logger.error(f"Unexpected error in get_slots: {e}")
-        return JsonResponse({
-            'error': 'server-error',
-            'message': 'Szerver hiba történt',
-            'slots': []
-        }, status=500)
\ No newline at end of file
+        return _slots_error(e)
+
+@require_GET
+async def aget_slots(request):
+    """get_slots for ASGI - a plain async view, DRF's @api_view only runs synchronously"""
+    try:
+        params = _slots_params(request)
+        if isinstance(params, JsonResponse):
+            return params
+        target_date, service_id = params
+
+        try:
+            business = await afirst_business()
+            if not business:
+                return _mock_slots_response()
+            interval_minutes = business.time_interval
+            logger.info("Using business: %s with %smin intervals", business.name, interval_minutes)
+        except Exception as e:
+            logger.error("Database error getting business: %s", e)
+            interval_minutes = 30
+            business = None
+
+        grid = get_slot_grid(interval_minutes, 9, 17, include_closing_time=False)
+        logger.info("Using %s time slots", len(grid.times))
+
+        if business:
+            try:
+                try:
+                    length = await aservice_length(business, service_id)
+                except Service.DoesNotExist:
+                    logger.warning("Unknown service %s, using one slot", service_id)
+                    length = interval_minutes
+                day = await aget_day_availability(business, target_date)
+                return conditional_response(
+                    request, availability_etag(business, day, 'slots', length),
+                    lambda: _slots_response(_free_slots(grid, day, length)),
+                )
+            except Exception as e:
+                logger.error("Error filtering booked times: %s", e)
+                logger.warning("Returning all slots due to booking check error")
+
+        return _slots_response(DayAvailability().free_slots(grid, interval_minutes))
+
+    except Exception as e:
+        return _slots_error(e)
+
+
+def metrics(request):
+    """Metrics of this process in the Prometheus text format; needs `Bearer <METRICS_TOKEN>` if that is set"""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse('Forbidden\n', status=403, content_type='text/plain')
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _export_authorized(request):
+    """Staff users, or a client sending `Authorization: Bearer <EXPORT_API_TOKEN>`"""
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    token = getattr(settings, 'EXPORT_API_TOKEN', None)
+    header = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(header, f'Bearer {token}')
+
+
+def export_appointments(request):
+    """Stream every matching appointment as CSV or NDJSON - memory use doesn't grow with the table.
+
+    Query parameters: format (csv|ndjson), business, from, to, service_type.
+    """
+    if not _export_authorized(request):
+        return JsonResponse({'error': 'forbidden', 'message': 'Nincs jogosultság'}, status=403)
+
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({'error': 'bad-format', 'message': 'Ismeretlen formátum (csv vagy ndjson)'}, status=400)
+    try:
+        date_from = datetime.strptime(request.GET['from'], '%Y-%m-%d').date() if request.GET.get('from') else None
+        date_to = datetime.strptime(request.GET['to'], '%Y-%m-%d').date() if request.GET.get('to') else None
+    except ValueError:
+        return JsonResponse({'error': 'bad-date', 'message': 'Érvénytelen dátum formátum'}, status=400)
+
+    rows = export_rows(
+        business=request.GET.get('business'),
+        date_from=date_from,
+        date_to=date_to,
+        service_type=request.GET.get('service_type'),
+    )
+    content_type = 'text/csv; charset=utf-8' if export_format == 'csv' else 'application/x-ndjson; charset=utf-8'
+    response = StreamingHttpResponse(iter_export(export_format, rows), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="appointments.{export_format}"'
+    return response
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'idopontfoglalo.settings')
+# Serve the availability and booking API with the async views (see settings.ASYNC_VIEWS)
+os.environ.setdefault('ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
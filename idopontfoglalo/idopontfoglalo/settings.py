@@ -46,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timing covers the rest of the stack
+    'foglalas.middleware.QueryCountMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -62,8 +64,15 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compiled templates are kept in memory; runserver's autoreloader
+            # resets them when a template file changes
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -106,14 +115,50 @@ if os.environ.get('DATABASE_URL') or all([
                 'PORT': os.environ.get('DB_PORT', '5432'),
             }
         }
+
+    # Reuse connections instead of a TCP + auth handshake per request.
+    # DB_POOL=1: psycopg's pool (needs psycopg[pool]); every worker process
+    # keeps DB_POOL_MIN_SIZE..DB_POOL_MAX_SIZE connections, so PostgreSQL
+    # sees at most workers x DB_POOL_MAX_SIZE - keep that under max_connections.
+    # Otherwise each worker thread keeps its connection for DB_CONN_MAX_AGE
+    # seconds. Either way a reused connection is checked first.
+    if os.environ.get('DB_POOL', '0') == '1':
+        from psycopg_pool import ConnectionPool
+        DATABASES['default']['CONN_MAX_AGE'] = 0  # the pool keeps them
+        DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+            # Seconds a request waits for a free connection before failing
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+            'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', '600')),
+            'check': ConnectionPool.check_connection,
+        }
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', '60'))
+        DATABASES['default']['CONN_HEALTH_CHECKS'] = True
 else:
     # Fallback to SQLite for development
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # File-backed test database (e.g. DB_TEST_NAME=test_db.sqlite3) lets
+            # the multi-process booking tests run; default is in-memory
+            'TEST': {'NAME': os.environ.get('DB_TEST_NAME')},
         }
     }
+    if os.environ.get('SQLITE_PERFORMANCE', '0') == '1':
+        # Single-node profile (foglalas.sqlite): applied to every new connection.
+        # Transactions take the write lock when they begin, so two bookings
+        # queue on busy_timeout instead of one failing on lock upgrade.
+        DATABASES['default']['OPTIONS'] = {'transaction_mode': 'IMMEDIATE'}
+        SQLITE_PRAGMAS = {
+            'journal_mode': 'WAL',
+            'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', '5000')),  # ms
+            'synchronous': 'NORMAL',
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -64000,  # negative is KiB: 64 MB per connection
+        }
 
 
 # Password validation
@@ -151,6 +196,17 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = os.environ.get('STATIC_ROOT', BASE_DIR / 'staticfiles')
+
+# Without DEBUG, collectstatic builds hashed, minified and precompressed files
+# (foglalas.storage) and {% static %} links to the hashed names
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+        else 'foglalas.storage.CompressedManifestStaticFilesStorage',
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -181,3 +237,96 @@ REST_FRAMEWORK = {
         'rest_framework.renderers.JSONRenderer',
     ],
 }
+
+# Cache - any Django backend works, e.g. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'idopontfoglalo'),
+    }
+}
+
+# Availability lookups (foglalas.availability) - entries are invalidated by
+# Appointment signals, the timeout is only a safety net
+AVAILABILITY_CACHE_ALIAS = 'default'
+AVAILABILITY_CACHE_TIMEOUT = 300
+
+# Public pages and service-list fragments (foglalas.pages) - Business/Service
+# signals invalidate them, the timeout is only a safety net
+PAGE_CACHE_ALIAS = 'default'
+PAGE_CACHE_TIMEOUT = 3600
+
+# Seconds a worker keeps its in-process Business/Service snapshot
+# (foglalas.registry) before reloading it to see changes made by other workers
+BUSINESS_REGISTRY_TTL = 60
+
+# Bearer token for non-staff clients of the appointment export API
+# (foglalas.views.export_appointments); unset means staff users only
+EXPORT_API_TOKEN = os.environ.get('EXPORT_API_TOKEN')
+
+# Route the availability and booking endpoints to their native async views.
+# asgi.py turns this on; under WSGI the sync views avoid a per-request event loop
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', '0') == '1'
+
+# Live slot changes (foglalas.events). The local broker only reaches streams of
+# the same process - run one ASGI process, or point this at a shared broker
+SLOT_EVENTS_BROKER = 'foglalas.events.LocalBroker'
+SLOT_EVENTS_QUEUE_SIZE = 100
+# Keepalive comment every HEARTBEAT seconds; streams close after MAX_AGE and
+# the browser reconnects (and refetches the day). Sync (WSGI) streams hold a
+# worker thread each, so they close after the much shorter SYNC_MAX_AGE
+SLOT_EVENTS_HEARTBEAT = 15
+SLOT_EVENTS_MAX_AGE = 300
+SLOT_EVENTS_SYNC_MAX_AGE = 20
+
+# Per-request query and latency budgets (foglalas.middleware), by URL name.
+# Requests over either limit are logged as warnings
+REQUEST_BUDGETS = {
+    'default': {'queries': 20, 'ms': 500},
+    'book_appointment': {'queries': 12, 'ms': 300},
+    'book_appointments_batch': {'queries': 20, 'ms': 2000},
+    'available_times': {'queries': 4, 'ms': 200},
+    'available_times_range': {'queries': 4, 'ms': 300},
+    'get_slots': {'queries': 4, 'ms': 200},
+    'export_appointments': {'queries': 50, 'ms': 30000},
+}
+
+# Bearer token Prometheus has to send to /metrics; unset leaves it open
+# (restrict it at the proxy then)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Logging runs on a background thread (foglalas.log): handlers below sit
+# behind a QueueHandler, so requests never wait for a write. LOG_LEVEL=INFO
+# turns on the per-request lines; "sampling" keeps 1 in n INFO records of
+# the chattiest loggers
+LOGGING_CONFIG = 'foglalas.log.configure_logging'
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'WARNING')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'structured': {'()': 'foglalas.log.StructuredFormatter'},
+        'text': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': os.environ.get('LOG_FORMAT', 'structured'),
+        },
+    },
+    'root': {'handlers': ['console'], 'level': 'WARNING'},
+    'loggers': {
+        # 4xx answers are part of normal booking traffic; 5xx still get through
+        'django.request': {'level': 'ERROR'},
+        'foglalas': {'level': LOG_LEVEL},
+        'barber': {'level': LOG_LEVEL},
+        'massage': {'level': LOG_LEVEL},
+    },
+    'queue': {
+        'maxsize': 10000,
+        'sampling': {
+            'foglalas.views': int(os.environ.get('LOG_SAMPLE_VIEWS', '10')),
+            'foglalas.availability': int(os.environ.get('LOG_SAMPLE_AVAILABILITY', '10')),
+        },
+    },
+}
@@ -16,6 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from foglalas import views as foglalas_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -24,6 +25,7 @@ urlpatterns = [
     path('massage/', include('massage.urls')),  # Dedicated massage service
     path('personal/', include('personal.urls')),  # Personal introduction website
     path('barber/', include('barber.urls')),  # Barber residence website
+    path('metrics', foglalas_views.metrics, name='metrics'),  # Prometheus scrape endpoint
 ]
 
 
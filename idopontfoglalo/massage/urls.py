@@ -1,6 +1,19 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Under ASGI the API is served by the native async views (settings.ASYNC_VIEWS)
+if settings.ASYNC_VIEWS:
+    book_appointment = views.abook_appointment
+    available_times = views.aget_available_times
+    available_times_range = views.aget_available_times_range
+    slot_events = views.aslot_events
+else:
+    book_appointment = views.book_appointment
+    available_times = views.get_available_times
+    available_times_range = views.get_available_times_range
+    slot_events = views.slot_events
+
 app_name = 'massage'
 
 urlpatterns = [
@@ -11,6 +24,8 @@ urlpatterns = [
     path('idopont-foglalas/', views.book, name='book'),
     
     # API endpoints  
-    path('api/book-appointment/', views.book_appointment, name='book_appointment'),
-    path('api/available-times/', views.get_available_times, name='available_times'),
+    path('api/book-appointment/', book_appointment, name='book_appointment'),
+    path('api/available-times/', available_times, name='available_times'),
+    path('api/available-times/range/', available_times_range, name='available_times_range'),
+    path('api/slot-events/', slot_events, name='slot_events'),
 ]
\ No newline at end of file
@@ -1,17 +1,22 @@
 from django.shortcuts import render
+from foglalas.pages import cached_page
 
+@cached_page
 def index(request):
     """Personal introduction homepage"""
     return render(request, 'personal/index.html')
 
+@cached_page
 def about(request):
     """About page with detailed biography"""
     return render(request, 'personal/about.html')
 
+@cached_page
 def contact(request):
     """Contact information page"""
     return render(request, 'personal/contact.html')
 
+@cached_page
 def portfolio(request):
     """Portfolio/work examples page"""
     return render(request, 'personal/portfolio.html')